@@ -0,0 +1,63 @@
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from scenarios import load_inputs, toy_scenario
+from spatialModelPkg.simulation import Simulation
+
+def run(chain, distances, numberOfEVs, days, minutesPerStep):
+    """Runs the toy scenario with a chain coarsened to minutesPerStep.
+
+    Returns
+    -------
+    dict
+        The run time, the fleet statistics, the charged energy and the peak
+        of the hourly load.
+
+    """
+    stations, cars = toy_scenario(numberOfEVs, 10)
+    coarseChain = {k: v.coarsen(minutesPerStep) for (k, v) in chain.items()}
+    timeSteps = pd.date_range('2020-03-30', periods = days * 1440 // minutesPerStep,
+                              freq = "{}min".format(minutesPerStep), tz = "CET")
+    simulation = Simulation(stations, cars, coarseChain, distances, timeSteps,
+                            resolution = minutesPerStep / 60)
+    start = time.perf_counter()
+    load = simulation.simulate_model()
+    elapsed = time.perf_counter() - start
+
+    totalLoad = load.sum(1)
+    hourlyLoad = totalLoad.reshape(-1, 60 // minutesPerStep).mean(1) \
+        if minutesPerStep <= 60 else totalLoad
+    return({"time": elapsed,
+            "trips": np.mean([x.trips for x in cars]) / days,
+            "distance": np.mean([x.distance for x in cars]) / days,
+            "energy": totalLoad.sum() * minutesPerStep / 60 / numberOfEVs / days,
+            "peak": hourlyLoad.max()})
+
+if __name__ == "__main__":
+    """Compares the coarse-timestep screening mode against the minute model.
+
+    Example
+    -------
+        $ python3 benchmarks/coarseTimestep.py 1000 7
+    """
+    numberOfEVs = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 7
+    chain, distances = load_inputs()
+
+    reference = run(chain, distances, numberOfEVs, days, 1)
+    print("{:>5} {:>8} {:>12} {:>12} {:>15} {:>12}".format(
+        "step", "speedup", "trips/day", "km/day", "kWh/car/day", "peak kW"))
+    for minutesPerStep in [1, 5, 15, 60]:
+        result = reference if minutesPerStep == 1 else \
+            run(chain, distances, numberOfEVs, days, minutesPerStep)
+        error = {k: 100 * (result[k] / reference[k] - 1) for k in result}
+        print("{:>5} {:>7.1f}x {:>5.2f} {:+5.0f}% {:>5.1f} {:+5.0f}% "
+              "{:>8.2f} {:+5.0f}% {:>5.0f} {:+5.0f}%".format(
+                minutesPerStep, reference["time"] / result["time"],
+                result["trips"], error["trips"],
+                result["distance"], error["distance"],
+                result["energy"], error["energy"],
+                result["peak"], error["peak"]))
@@ -0,0 +1,148 @@
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from scenarios import load_inputs, toy_scenario
+from spatialModelPkg.simulation import Simulation
+from spatialModelPkg.expectedload import ExpectedLoadSimulation
+from spatialModelPkg.randomstreams import RandomStreams
+from spatialModelPkg.chargingcontroller import ChargingController
+from spatialModelPkg.validation import compare_samples, compare_profiles, \
+    compare_exact
+
+NUMBER_OF_PARKING_LOTS = 10
+
+class StateOccupancy:
+    """Counts the cars in every state at every timestep."""
+    def __init__(self, numberOfStates):
+        self.numberOfStates = numberOfStates
+        self.counts = []
+
+    def start(self, simulation):
+        pass
+
+    def update(self, simulation, step, time, load):
+        self.counts.append(np.bincount([x.currentState for x in simulation.cars],
+                                       minlength=self.numberOfStates))
+
+def hourly(x, stepsPerHour):
+    return(x.reshape(-1, stepsPerHour, *x.shape[1:]).mean(1))
+
+def simulation_engine(chainFactor = 1, **options):
+    """Returns an engine running Simulation with the given options."""
+    def engine(seed, numberOfEVs, timeSteps, chain, distances):
+        stations, cars = toy_scenario(numberOfEVs, NUMBER_OF_PARKING_LOTS, seed)
+        occupancy = StateOccupancy(3)
+        engineChain = chain if chainFactor == 1 else \
+            {k: v.coarsen(chainFactor) for (k, v) in chain.items()}
+        steps = timeSteps[::chainFactor]
+        kwargs = {k: v(seed) if callable(v) else v for (k, v) in options.items()}
+        simulation = Simulation(stations, cars, engineChain, distances, steps,
+                                resolution = chainFactor / 60,
+                                observers = [occupancy], **kwargs)
+        start = time.perf_counter()
+        load = simulation.simulate_model()
+        elapsed = time.perf_counter() - start
+        days = len(timeSteps) / 1440
+        return({"time": elapsed,
+                "trips": np.mean([x.trips for x in cars]) / days,
+                "distance": np.mean([x.distance for x in cars]) / days,
+                "occupancy": hourly(np.array(occupancy.counts, dtype=float),
+                                    60 // chainFactor).ravel(),
+                "load": hourly(load.sum(1), 60 // chainFactor)})
+    return(engine)
+
+def expected_engine(seed, numberOfEVs, timeSteps, chain, distances):
+    """The deterministic expected-load model."""
+    stations, cars = toy_scenario(numberOfEVs, NUMBER_OF_PARKING_LOTS, seed)
+    model = ExpectedLoadSimulation(stations, numberOfEVs, chain, distances,
+                                   timeSteps)
+    start = time.perf_counter()
+    load = model.simulate_model()
+    elapsed = time.perf_counter() - start
+    days = len(timeSteps) / 1440
+    return({"time": elapsed,
+            "trips": model.trips.sum() / numberOfEVs / days,
+            "distance": model.distance.sum() / numberOfEVs / days,
+            "occupancy": hourly(model.stateOccupancy, 60).ravel(),
+            "load": hourly(load.sum(1), 60)})
+
+# How every candidate is compared with the reference: "exact" engines draw
+# the same numbers and run on the seeds of the reference, which they should
+# reproduce; "stochastic" engines run on other seeds and are compared
+# statistically; "paired" engines are deterministic and run on the station
+# layout of every seed of the reference, and are compared pair by pair.
+CANDIDATES = {
+    "counter random streams": (simulation_engine(
+        randomStreams = lambda seed: RandomStreams(seed, "counter")),
+        "stochastic"),
+    "vectorized charging": (simulation_engine(
+        chargingController = lambda seed: ChargingController()), "exact"),
+    "coarse 5 min": (simulation_engine(chainFactor = 5), "stochastic"),
+    "expected value": (expected_engine, "paired"),
+}
+
+def run_engine(engine, seeds, numberOfEVs, timeSteps, chain, distances):
+    results = [engine(seed, numberOfEVs, timeSteps, chain, distances)
+               for seed in seeds]
+    return({k: np.array([r[k] for r in results]) for k in results[0]})
+
+if __name__ == "__main__":
+    """Runs the reference object model and the candidate engines over many
+    seeds on the toy scenario, and reports accuracy and speedup.
+
+    Example
+    -------
+        $ python3 benchmarks/equivalence.py 30 200 2
+    """
+    replicates = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    numberOfEVs = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    days = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+    chain, distances = load_inputs()
+    timeSteps = pd.date_range('2020-03-30', periods = days * 1440, freq = "min",
+                              tz = "CET")
+    # Disjoint seeds keep the reference and the stochastic candidates
+    # independent.
+    seeds = range(replicates)
+    candidateSeeds = range(replicates, 2 * replicates)
+
+    reference = run_engine(simulation_engine(), seeds, numberOfEVs, timeSteps,
+                           chain, distances)
+    failed = False
+    for name, (engine, kind) in CANDIDATES.items():
+        candidate = run_engine(engine, candidateSeeds if kind == "stochastic"
+                               else seeds,
+                               numberOfEVs, timeSteps, chain, distances)
+        speedup = reference["time"].mean() / candidate["time"].mean()
+        print("\n{} ({}, speedup {:.1f}x)".format(name, kind, speedup))
+        if kind == "exact":
+            for metric in ["trips", "distance", "occupancy", "load"]:
+                result = compare_exact(reference[metric], candidate[metric])
+                failed |= not result["passed"]
+                print("  {:<10} largest difference {:.3g}  {}".format(
+                    metric, result["maximumDifference"],
+                    "ok" if result["passed"] else "FAIL"))
+            continue
+        paired = kind == "paired"
+        for metric in ["trips", "distance"]:
+            result = compare_samples(reference[metric], candidate[metric],
+                                     paired = paired)
+            failed |= not result["passed"]
+            print("  {:<10} {:8.3f} vs {:8.3f}  diff {:6.1%} (noise {:5.1%})  "
+                  "Welch p {:.3f}  KS p {:.3f}  {}".format(
+                      metric, result["reference"], result["candidate"],
+                      result["relativeDifference"], result["noise"],
+                      result["welchP"], result["ksP"],
+                      "ok" if result["passed"] else "FAIL"))
+        for metric in ["occupancy", "load"]:
+            result = compare_profiles(reference[metric], candidate[metric],
+                                      paired = paired)
+            failed |= not result["passed"]
+            print("  {:<10} normalized RMS {:6.1%} (noise {:5.1%})  "
+                  "significant hours {:5.1%}  {}".format(
+                                metric, result["normalizedRMS"],
+                                result["noiseRMS"], result["significantPoints"],
+                                "ok" if result["passed"] else "FAIL"))
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,77 @@
+import os
+import subprocess
+import sys
+
+# The simulation core has to be importable with NumPy only. These packages
+# must not be pulled in when a worker imports one of the core modules.
+CORE_MODULES = ["spatialModelPkg.ev",
+                "spatialModelPkg.markov",
+                "spatialModelPkg.parkinglot",
+                "spatialModelPkg.simulation",
+                "spatialModelPkg.auxiliary"]
+FORBIDDEN_MODULES = ["osgeo", "matplotlib", "pandas", "scipy"]
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+CHILD_CODE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+loaded = [m for m in {forbidden!r} if m in sys.modules]
+print(elapsed, ",".join(loaded))
+"""
+
+def measure_import(module, repeats=5):
+    """Measures the time needed to import a module in a fresh interpreter.
+
+    Parameters
+    ----------
+    module : str
+        The dotted name of the module to import.
+    repeats : int, optional
+        The number of fresh interpreters to start. The best time is reported.
+        (the default is 5)
+
+    Returns
+    -------
+    (float, list(str))
+        The best import time in seconds, and the forbidden modules that were
+        loaded as a side effect of the import.
+
+    """
+    times = []
+    for i in range(repeats):
+        output = subprocess.run([sys.executable, "-c",
+                                 CHILD_CODE.format(module=module,
+                                                   forbidden=FORBIDDEN_MODULES)],
+                                cwd=REPOSITORY,
+                                check=True,
+                                stdout=subprocess.PIPE,
+                                universal_newlines=True).stdout.split()
+        times.append(float(output[0]))
+        loaded = output[1].split(",") if len(output) > 1 else []
+    return(min(times), loaded)
+
+if __name__ == "__main__":
+    """Guards the import time of the simulation core. Exits with a non-zero
+    status if a core module loads GDAL, matplotlib or pandas, or if it takes
+    longer than the time budget to import.
+
+    Example
+    -------
+        $ python3 benchmarks/importTime.py 0.5
+    """
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+    failed = False
+    for module in CORE_MODULES:
+        elapsed, loaded = measure_import(module)
+        status = "ok"
+        if loaded:
+            status = "FAIL loads " + ", ".join(loaded)
+            failed = True
+        elif elapsed > budget:
+            status = "FAIL slower than {:.3f} s".format(budget)
+            failed = True
+        print("{:<30} {:8.1f} ms  {}".format(module, elapsed * 1000, status))
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,61 @@
+import sys
+import time
+
+import numpy as np
+
+import scenarios # Adds the repository to sys.path.
+from spatialModelPkg.fleet import Fleet, create_fleet
+from spatialModelPkg.chargingcontroller import ChargingController
+
+def step_time(fleet, numberOfStations, steps = 20, seed = 0):
+    """Times the array work of one timestep: driving, the tapered charging
+    power, the allocation of the controller and charging.
+
+    Returns
+    -------
+    float
+        The mean time of a timestep in seconds.
+
+    """
+    rng = np.random.default_rng(seed)
+    numberOfCars = len(fleet)
+    carStation = rng.integers(numberOfStations, size=numberOfCars)
+    stationPower = np.full(numberOfStations, 11.0)
+    controller = ChargingController()
+    resolution = 1/60
+    start = time.perf_counter()
+    for step in range(steps):
+        distance = np.where(rng.random(numberOfCars) < 0.01, 10.0, 0.0)
+        fleet.drive(distance)
+        charging = np.nonzero(fleet.batteryCharge < fleet.carCapacity)[0]
+        deficits = np.minimum(fleet.deficits()[charging],
+                              fleet.accepted_power(charging) * resolution)
+        power = controller.allocate(charging, carStation[charging], deficits,
+                                    stationPower, resolution, step)
+        fleet.charge(charging, power, resolution)
+    return((time.perf_counter() - start) / steps)
+
+if __name__ == "__main__":
+    """Compares the cost per timestep of the battery array work of a
+    uniform and a mixed fleet. The per-car trips of Simulation are not
+    timed.
+
+    Example
+    -------
+        $ python3 benchmarks/mixedFleet.py 1000000
+    """
+    numberOfEVs = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    uniform = Fleet(np.zeros(numberOfEVs, dtype=int), 0.2, 60.0, 11.0)
+    mixed = create_fleet(numberOfEVs, [0.5, 0.3, 0.2], [0.15, 0.2, 0.25],
+                         [40.0, 60.0, 90.0], [3.7, 11.0, 7.4], [0.8, 0.9, 0.7])
+    # Shuffle the classes so that no class is contiguous in memory.
+    mixed = Fleet(np.random.default_rng(1).permutation(mixed.vehicleClass),
+                  mixed.mpg, mixed.batteryCapacity, mixed.maxPower,
+                  mixed.taperStart)
+    for fleet in (uniform, mixed):
+        fleet.batteryCharge *= 0.5
+    uniformTime = step_time(uniform, 1000)
+    mixedTime = step_time(mixed, 1000)
+    print("{} cars: uniform {:.1f} ms/step, mixed {:.1f} ms/step ({:.2f}x)".format(
+        numberOfEVs, 1000 * uniformTime, 1000 * mixedTime,
+        mixedTime / uniformTime))
@@ -0,0 +1,90 @@
+import os
+import random as rnd
+import sys
+from collections import OrderedDict
+
+import numpy as np
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, REPOSITORY)
+
+from spatialModelPkg.ev import EV
+from spatialModelPkg.markov import Markov
+from spatialModelPkg.parkinglot import ParkingLot
+from spatialModelPkg.extractDistances import extractDistances
+from spatialModelPkg.extractFiles import readMatrixfiles
+
+def load_inputs(maxTripDist = 200):
+    """Loads the Markov chains and the trip distances shipped with the
+    repository, the same inputs used in toyExample.py.
+
+    Parameters
+    ----------
+    maxTripDist : float, optional
+        The maximum trip distance to filter at. (the default is 200 km)
+
+    Returns
+    -------
+    (dict[Markov], dict)
+        The chain and distancesDictionary arguments of Simulation, keyed by
+        True for weekdays and False for weekends.
+
+    """
+    distances = {
+        True: extractDistances(os.path.join(REPOSITORY, "distanceData",
+                                            "*day*.txt"), maxTripDist),
+        False: extractDistances(os.path.join(REPOSITORY, "distanceData",
+                                             "*end*.txt"), maxTripDist)}
+    chain = {
+        True: Markov(readMatrixfiles(os.path.join(REPOSITORY,
+                                                  "TransitionMatrix",
+                                                  "*weekday*.txt"))),
+        False: Markov(readMatrixfiles(os.path.join(REPOSITORY,
+                                                   "TransitionMatrix",
+                                                   "*weekend*.txt")))}
+    return(chain, distances)
+
+def toy_scenario(numberOfEVs, numberOfparkingloc, seed = 10, mpg = 0.2):
+    """Creates the stations and cars of toyExample.py.
+
+    Parameters
+    ----------
+    numberOfEVs : int
+        The number of cars.
+    numberOfparkingloc : int
+        The number of charging parking lots. Three parking lots without
+        charging, one per state, are added.
+    seed : int, optional
+        The seed of the random module, which places the cars and picks the
+        states of the parking lots. (the default is 10)
+    mpg : float, optional
+        The consumption of the cars in kWh/km. (the default is 0.2)
+
+    Returns
+    -------
+    (OrderedDict(ParkingLot), list(EV))
+        The stations and the cars, with the cars parked in state zero.
+
+    """
+    rnd.seed(seed)
+    np.random.seed(seed)
+    stationTypes = rnd.choices(range(3), k = numberOfparkingloc)
+    stationsList = [(i, ParkingLot(ID = i,
+                                   state = stationTypes[i],
+                                   chargingPower = 3.7,
+                                   maximumOccupancy = numberOfEVs,
+                                   currentOccupancy = 0))
+                    for i in range(numberOfparkingloc)]
+    stationsList += [(str(i*1000), ParkingLot(ID = str(i*1000),
+                                              state = i,
+                                              chargingPower = 0.0,
+                                              maximumOccupancy = numberOfEVs,
+                                              currentOccupancy = 0,
+                                              chargingStatus = False))
+                     for i in range(3)]
+    stations = OrderedDict(stationsList)
+
+    cars = [EV(currentLocation = None, currentState = None, mpg = mpg)
+            for i in range(numberOfEVs)]
+    [x.inital_conditions(stations, 0) for x in cars]
+    return(stations, cars)
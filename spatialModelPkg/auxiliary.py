@@ -1,10 +1,10 @@
-from osgeo import ogr, osr
+# GDAL (osgeo) and matplotlib are imported inside the functions that need
+# them, so that this module can be imported on nodes without GDAL and so that
+# simulation workers do not pay for the import.
 import numpy as np
-import matplotlib.pyplot as plt
 import os
-from parkinglot import ParkingLot
-from math import ceil
-from collections import OrderedDict
+from stationtable import create_station_table
+from layerarrays import read_layer
 
 def list_of_layers(mapFile):
     """Lists the layers in a geographical information systems (GIS) file.
@@ -19,10 +19,10 @@ def list_of_layers(mapFile):
     list(Unique Layers)
         A list containing the names of the layers in the GIS file.
     """
-    # get layer list
+    # get layer list, the names are read without iterating the features
     layerList = []
-    for i in mapFile:
-        daLayer = i.GetName()
+    for i in range(mapFile.GetLayerCount()):
+        daLayer = mapFile.GetLayerByIndex(i).GetName()
         if not daLayer in layerList:
             layerList.append(daLayer)
     return(layerList)
@@ -73,23 +73,63 @@ def get_field_tags(layer, field, unique = True):
         A list of tags for the tags stored for this layer.
 
     '''
-    tagsList = []
-    for feature in layer:# and feature is not None:
-        tagsList.append( feature.GetField(field) )
-    layer.ResetReading()
+    tagsList = read_layer(layer, [field])[field].tolist()
     return {
         True : set(tagsList),
         False: tagsList,
     }.get(unique)
 
-def plot_features(layer, color, scale=1/1000):
+def get_features_rings(layer, scale=1/1000, tolerance=0.0):
+    """Extracts the exterior rings of the polygons of a layer as arrays.
+
+    Parameters
+    ----------
+    layer :  ogr layer
+        A vector layer of polygons or multipolygons.
+    scale : float, optional
+        A scale applied to the coordinates. (the default is 1/1000, i.e.,
+        meters to kms)
+    tolerance : float, optional
+        If positive, the geometries are simplified with this tolerance, in
+        the units of the layer, before extraction. (the default is 0.0)
+
+    Returns
+    -------
+    list(numpy.array(float))
+        The coordinates of every ring, of shape (points, 2).
+
+    """
+    from osgeo import ogr
+
+    rings = []
+    for feature in layer:
+        geometry = feature.GetGeometryRef()
+        if geometry is None:
+            continue
+        if tolerance > 0:
+            geometry = geometry.SimplifyPreserveTopology(tolerance)
+        if ogr.GT_Flatten(geometry.GetGeometryType()) == ogr.wkbMultiPolygon:
+            polygons = [geometry.GetGeometryRef(i)
+                        for i in range(geometry.GetGeometryCount())]
+        else:
+            polygons = [geometry]
+        for polygon in polygons:
+            points = polygon.GetGeometryRef(0).GetPoints()
+            if points:
+                rings.append(np.array(points)[:, :2] * scale)
+    layer.ResetReading()
+    return(rings)
+
+def plot_features(layer, color, scale=1/1000, tolerance=0.0, ax=None):
     """Plot the features of a layer
     This is an auxiliary function. Users are encouraged to use their own plotting
     funtions. The reason is that every GIS data provider stores the feature
     coordinates at differnt depths. This makes this function non-generalizable.
     Use this function as inspiration instead.
 
-    Note: TODO depth of the geometry.
+    The rings of all features are extracted once with get_features_rings()
+    and drawn as a single matplotlib PolyCollection, which keeps city-scale
+    layers fast to render.
 
     Plotting listing 13.1 in "Geoprocessing with Python" "Geospatial Development By Example with Python "
     thanks to http://geoinformaticstutorial.blogspot.se/2012/10/
@@ -103,26 +143,67 @@ def plot_features(layer, color, scale=1/1000):
     scale : float
         A scale to use for the plot. Default 1:1000, i.e., converts meters to
         kms in the x and y axes.
+    tolerance : float, optional
+        If positive, the polygons are simplified with this tolerance, in the
+        units of the layer. (the default is 0.0)
+    ax : matplotlib.axes.Axes, optional
+        The axes to draw in. (the default is None, the current axes)
 
     Returns
     -------
-    None
-        This function returns a plot.
+    matplotlib.collections.PolyCollection
+        The drawn polygons.
 
     """
+    import matplotlib.pyplot as plt
+    from matplotlib.collections import PolyCollection
 
+    ax = plt.gca() if ax is None else ax
+    polygons = PolyCollection(get_features_rings(layer, scale, tolerance),
+                              facecolors=color, edgecolors=color)
+    ax.add_collection(polygons)
+    ax.autoscale_view()
+    return(polygons)
 
-    for feature in layer:
-        ring = feature.GetGeometryRef()
-        coord = ring.GetGeometryRef(0)
-        #coord1 = coord.GetGeometryRef(0)
-        points = coord.GetPoints()
-        x, y = zip(*points)
-        x = [i * scale for i in x]
-        y = [i * scale for i in y]
-        plt.fill(x, y, color)
+def decimate_min_max(ts, maxPoints=4000):
+    """Selects the points of a time series to plot, keeping its extremes.
 
-    layer.ResetReading()
+    The series is split into maxPoints/2 buckets and the minimum and the
+    maximum of every bucket are kept in their original order, so a plot of
+    the selected points shows the same envelope, e.g., the same peaks, as
+    the whole series.
+
+    Parameters
+    ----------
+    ts : numpy 1D array
+        The time series.
+    maxPoints : int, optional
+        The maximum number of points to keep. (the default is 4000)
+
+    Returns
+    -------
+    numpy 1D array
+        The sorted indices of the selected points.
+
+    Examples
+    --------
+    >>> x = np.array([0, 5, 1, 1, 2, 0, 3, 9])
+    >>> decimate_min_max(x, 4)
+    array([0, 1, 5, 7])
+
+    """
+    ts = np.asarray(ts)
+    length = ts.shape[0]
+    if length <= maxPoints:
+        return(np.arange(length))
+    buckets = maxPoints // 2
+    bucketSize = -(-length // buckets)
+    padded = np.pad(ts, (0, buckets * bucketSize - length), mode='edge')
+    padded = padded.reshape(buckets, bucketSize)
+    first = np.arange(buckets) * bucketSize
+    indices = np.concatenate((first + padded.argmin(1),
+                              first + padded.argmax(1)))
+    return(np.unique(np.minimum(indices, length - 1)))
 
 def create_buffer_and_projectLayer(inLayer,
                                    inputCoordinateSystem,
@@ -160,6 +241,7 @@ def create_buffer_and_projectLayer(inLayer,
         This function saves the buffered layer into a file
 
     """
+    from osgeo import ogr, osr
 
     InputLayerGeomType = inLayer.GetGeomType()
 
@@ -289,14 +371,24 @@ def get_features_areas(Layer):
         A list containing the area of features inside the layer
 
     """
-    areas = [0 for i in range(Layer.GetFeatureCount())]
-    i = 0
-    for feature in Layer:
-        geom = feature.GetGeometryRef()
-        areas[i] = geom.GetArea()
-        i += 1
-    Layer.ResetReading()
-    return(areas)
+    return(read_layer(Layer, [], "area")["area"].tolist())
+
+def get_features_centroids(Layer):
+    """Returns the centroids of the features of a layer.
+
+    Parameters
+    ----------
+    Layer : ogr layer
+        A layer that we want to find the centroids of it's features
+
+    Returns
+    -------
+    numpy.array(float)
+        An array of shape (features, 2) with the x and y coordinates of the
+        centroid of every feature.
+
+    """
+    return(read_layer(Layer, [], "centroid")["centroid"])
 
 def create_charging_stations(identitiesArray,
                              areas,
@@ -325,47 +417,27 @@ def create_charging_stations(identitiesArray,
         A float encoding the ground area needed to fit a car in a parking lot.
         This area should take into account the manuevering area and landscaping
         area.
-    charging_status : list(bool), optional
+    charging_status : bool or list(bool), optional
         Which stations will only be considered parking lots and no charging will
         be enabled in. Default True.
-    charging_power : float, optional
+    charging_power : float or list(float), optional
         The charging power of the stations. Default 3.7 kW.
 
     Returns
     -------
     OrderedDict(ParkingLot)
         An orderedDict of parking lots representing charging stations and or parking lots
-        without charging.
+        without charging. Use create_station_table() directly to keep the
+        stations as arrays for large cities.
 
     """
-    if type(charging_status) is bool:
-        charging_status = [charging_status for i in range(len(identitiesArray))]
-    if type(charging_power) is int or type(charging_power) is float:
-        charging_power = [charging_power for i in range(len(identitiesArray))]
-    if type(areaPerCar) is int or type(areaPerCar) is float:
-        areaPerCar = [areaPerCar for i in range(len(identitiesArray))]
-
-    ids = list(identitiesArray)
-    stations = []
-    for st in range(percentageOfStates.shape[1]):
-
-        stations_temp = [(str(ids[i]) + "-" + str(st), ParkingLot(
-                               ID = str(ids[i]) + "-" + str(st),
-                               state = st,
-                               chargingPower = charging_power[i],
-                               maximumOccupancy = ceil(
-                                   1.0/areaPerCar[i] * percentageOfStates[i,st]
-                                   * areas[i]),
-                               currentOccupancy = 0,
-                               chargingStatus = charging_status,
-                               currentLoad = 0.0))
-                    for i in range(len(identitiesArray)) if
-                    percentageOfStates[i,st] != 0
-                    ]
-
-        stations.extend(stations_temp)
-    stationsDict = OrderedDict(stations)
-    return(stationsDict)
+    stationTable = create_station_table(identitiesArray,
+                                        areas,
+                                        percentageOfStates,
+                                        areaPerCar,
+                                        charging_status,
+                                        charging_power)
+    return(stationTable.to_parking_lots())
 
 def collect_stations_results(ID, results, stations):
     """Collects the results of subsets of charging stations into one station.
@@ -466,13 +538,13 @@ def create_spatial_grid(initialXCoord,
 
     Parameters
     ----------
-    initialXCoord : int
+    initialXCoord : float, int
         The starting x coordinate of the grid.
-    initialYCoord : int
+    initialYCoord : float, int
         The starting y coordinate of the grid.
-    spacingX : int
+    spacingX : float, int
         The width of the grid-along the x axis.
-    spacingY : int
+    spacingY : float, int
         The height of the grid-along the y axis.
     numberOfXGridCells : int
         The number of horizontal grid cells-along the x axis.
@@ -481,16 +553,14 @@ def create_spatial_grid(initialXCoord,
 
     Returns
     -------
-    list(list(int, int))
+    list(list(float, float))
         A list containing a list of the coordinates of the vertices of each
         grid cell.
 
     """
-    endX = initialXCoord + spacingX * numberOfXGridCells
-    xs = range(initialXCoord, endX, spacingX)
-
-    endY = initialYCoord + spacingY * numberOfYGridCells
-    ys = range(initialYCoord, endY, spacingY)
+    # Multiples of the spacing, so float spacings do not accumulate errors.
+    xs = (initialXCoord + spacingX * np.arange(numberOfXGridCells)).tolist()
+    ys = (initialYCoord + spacingY * np.arange(numberOfYGridCells)).tolist()
 
     connPoints = [create_rectangle(x, spacingX, y, spacingY) for x in xs for y in ys]
 
@@ -511,6 +581,7 @@ def create_polygon(coordinates):
         A polygon
 
     """
+    from osgeo import ogr
     ring = ogr.Geometry(ogr.wkbLinearRing)
     [ring.AddPoint(i[0], i[1]) for i in coordinates]
     poly = ogr.Geometry(ogr.wkbPolygon)
@@ -538,6 +609,7 @@ def save_grid_into_layer(fileName,
         Saves a file.
     TODO test this I think there is a problem with fileName with and without extenstions.
     """
+    from osgeo import ogr
     outDriver = ogr.GetDriverByName("ESRI Shapefile")
     fileNameWithExt = fileName
     if os.path.exists(fileNameWithExt):
@@ -576,6 +648,7 @@ def create_projection_file(fileName,
         Saves a file.
 
     """
+    from osgeo import osr
     coordSys = osr.SpatialReference()
     coordSys.ImportFromEPSG(outputCoordinateSystem)
     coordSys.MorphToESRI()
@@ -0,0 +1,220 @@
+import numpy as np
+
+
+class ChargingController:
+    """Allocates the charging power of the charging cars in one timestep.
+
+    The controller is called once per timestep by the Simulation class with
+    the arrays of all the cars that want to charge, and returns the power of
+    every car in one vectorized call. This base class reproduces the
+    behaviour of EV.charge_EV(): every car charges at the power of its
+    station, or at the power needed to top off the battery.
+
+    Subclass it and override allocate() to implement load-management
+    policies.
+    """
+
+    def requested_power(self, stationIndex, deficits, chargingPower, duration):
+        """Returns the power every car would draw without any limitation.
+
+        Parameters
+        ----------
+        stationIndex : numpy.array(int)
+            The index of the station of every charging car.
+        deficits : numpy.array(float)
+            The energy needed to fill the battery of every charging car.
+        chargingPower : numpy.array(float)
+            The charging power of every station.
+        duration : float
+            The duration of the timestep in units of time, e.g., (h).
+
+        Returns
+        -------
+        numpy.array(float)
+            The requested power of every charging car.
+
+        """
+        return(np.minimum(chargingPower[stationIndex], deficits / duration))
+
+    def allocate(self,
+                 carIndex,
+                 stationIndex,
+                 deficits,
+                 chargingPower,
+                 duration,
+                 timestep):
+        """Allocates the charging power of the charging cars.
+
+        Parameters
+        ----------
+        carIndex : numpy.array(int)
+            The index of every charging car in the fleet.
+        stationIndex : numpy.array(int)
+            The index of the station of every charging car.
+        deficits : numpy.array(float)
+            The energy needed to fill the battery of every charging car.
+        chargingPower : numpy.array(float)
+            The charging power of every station.
+        duration : float
+            The duration of the timestep in units of time, e.g., (h).
+        timestep : int
+            The time of the day of the timestep, the same index used for the
+            Markov chain.
+
+        Returns
+        -------
+        numpy.array(float)
+            The power allocated to every charging car.
+
+        """
+        return(self.requested_power(stationIndex, deficits, chargingPower,
+                                    duration))
+
+
+def allocate_under_caps(groups, demand, caps, priority = None):
+    """Limits the demand of cars so that the sum in every group is under a cap.
+
+    Parameters
+    ----------
+    groups : numpy.array(int)
+        The group (station, feeder) of every car.
+    demand : numpy.array(float)
+        The power requested by every car.
+    caps : numpy.array(float)
+        The maximum power of every group. Use np.inf for no cap.
+    priority : numpy.array, optional
+        If None (default) the demand of a group over its cap is scaled down
+        proportionally. Else the cars of a group are served in increasing
+        order of priority at their full demand until the cap is reached.
+
+    Returns
+    -------
+    numpy.array(float)
+        The allocated power of every car.
+
+    """
+    if demand.shape[0] == 0:
+        return(demand)
+    if priority is None:
+        groupDemand = np.bincount(groups, weights=demand, minlength=caps.shape[0])
+        factor = np.ones(caps.shape[0])
+        over = groupDemand > caps
+        factor[over] = caps[over] / groupDemand[over]
+        return(demand * factor[groups])
+
+    order = np.lexsort((priority, groups))
+    sortedGroups = groups[order]
+    sortedDemand = demand[order]
+    servedBefore = np.cumsum(sortedDemand) - sortedDemand
+    firstOfGroup = np.ones(sortedGroups.shape[0], dtype=bool)
+    firstOfGroup[1:] = sortedGroups[1:] != sortedGroups[:-1]
+    groupStart = servedBefore[firstOfGroup][np.cumsum(firstOfGroup) - 1]
+    servedBefore -= groupStart
+    allocation = np.empty_like(demand)
+    allocation[order] = np.clip(caps[sortedGroups] - servedBefore,
+                                0.0, sortedDemand)
+    return(allocation)
+
+
+class CappedChargingController(ChargingController):
+    """Limits the charging power per station and per feeder.
+
+    Attributes
+    ----------
+    stationCaps : numpy.array(float), optional
+        The maximum power of every station. (the default is None, no cap)
+    feederOfStation : numpy.array(int), optional
+        The feeder every station is connected to. Needed for the feeder caps.
+        (the default is None)
+    feederCaps : numpy.array(float), optional
+        The maximum power of every feeder. (the default is None, no cap)
+    policy : str, optional
+        How the power is shared when a cap is reached, either "proportional"
+        (every car gets the same share of its request) or "round_robin" (the
+        cars which waited longest since they last charged are served first at
+        full power). (the default is "proportional")
+    """
+
+    def __init__(self,
+                 stationCaps = None,
+                 feederOfStation = None,
+                 feederCaps = None,
+                 policy = "proportional"):
+        assert policy in ("proportional", "round_robin"), "policy should be " \
+            + "proportional or round_robin."
+        assert (feederCaps is None) == (feederOfStation is None), "feederCaps " \
+            + "and feederOfStation should be given together."
+        self.stationCaps = None if stationCaps is None else \
+            np.asarray(stationCaps, dtype=float)
+        self.feederOfStation = None if feederOfStation is None else \
+            np.asarray(feederOfStation)
+        self.feederCaps = None if feederCaps is None else \
+            np.asarray(feederCaps, dtype=float)
+        self.policy = policy
+        self.lastServed = np.zeros(0)
+        self.calls = 0
+
+    def priority(self, carIndex):
+        """Returns the priority of the cars, lower is served first."""
+        if self.policy == "proportional":
+            return(None)
+        if carIndex.shape[0] and carIndex.max() >= self.lastServed.shape[0]:
+            grown = np.full(carIndex.max() + 1, -np.inf)
+            grown[:self.lastServed.shape[0]] = self.lastServed
+            self.lastServed = grown
+        return(self.lastServed[carIndex])
+
+    def allocate(self,
+                 carIndex,
+                 stationIndex,
+                 deficits,
+                 chargingPower,
+                 duration,
+                 timestep):
+        power = self.requested_power(stationIndex, deficits, chargingPower,
+                                     duration)
+        priority = self.priority(carIndex)
+        if self.stationCaps is not None:
+            power = allocate_under_caps(stationIndex, power, self.stationCaps,
+                                        priority)
+        if self.feederCaps is not None:
+            power = allocate_under_caps(self.feederOfStation[stationIndex],
+                                        power, self.feederCaps, priority)
+        if priority is not None:
+            self.lastServed[carIndex[power > 0]] = self.calls
+        self.calls += 1
+        return(power)
+
+
+class PriceResponsiveChargingController(ChargingController):
+    """Charges only when the electricity price is under a threshold.
+
+    Attributes
+    ----------
+    prices : numpy.array(float)
+        The electricity price at every time of the day, indexed like the
+        Markov chain, e.g., 1440 prices for a minute resolution.
+    maxPrice : float
+        The cars do not charge when the price is above maxPrice.
+    controller : ChargingController, optional
+        A controller which allocates the power when charging is allowed, e.g.,
+        a CappedChargingController. (the default is None, uncapped charging)
+    """
+
+    def __init__(self, prices, maxPrice, controller = None):
+        self.prices = np.asarray(prices, dtype=float)
+        self.maxPrice = maxPrice
+        self.controller = ChargingController() if controller is None \
+            else controller
+
+    def allocate(self,
+                 carIndex,
+                 stationIndex,
+                 deficits,
+                 chargingPower,
+                 duration,
+                 timestep):
+        if self.prices[timestep] > self.maxPrice:
+            return(np.zeros(deficits.shape[0]))
+        return(self.controller.allocate(carIndex, stationIndex, deficits,
+                                        chargingPower, duration, timestep))
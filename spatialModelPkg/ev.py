@@ -25,7 +25,8 @@ class EV:
         initial value is 0.0)
         NOT FULLY TESTED. NOW IT IS ALWAYS ZERO WHICH MEANS THAT THE
         ELECTRIC VEHICLE HAS INFINTIE RANGE, AND THAT THE ENERGY DEPLETION WAS
-        WAS MEASURED.
+        WAS MEASURED. See the Fleet class for mixed fleets with real
+        capacities.
     trips : int, optional
         The number of trips perfromed by the electric vehilce.( the default
         initial value is 0.0)
@@ -35,6 +36,12 @@ class EV:
     rnd : float, optional
         Random number used to sample for the next Markov state of the vehicle.
         (the default is 0.0)
+    blockedMoves : int, optional
+        The number of state changes which did not happen because no parking
+        lot of the new state was free. (the default is 0)
+    blockedState : int, optional
+        The state the vehicle could not move to at its last blocked move.
+        (the default is None)
 
     '''
     def __init__(self,
@@ -45,7 +52,9 @@ class EV:
                  batteryCapacity = 0.0,
                  trips = 0,
                  distance = 0,
-                 rnd = 0.0):
+                 rnd = 0.0,
+                 blockedMoves = 0,
+                 blockedState = None):
 
         self.batteryCapacity = batteryCapacity
         self.currentLocation = currentLocation
@@ -55,6 +64,8 @@ class EV:
         self.distance = distance
         self.mpg = mpg
         self.rnd = rnd
+        self.blockedMoves = blockedMoves
+        self.blockedState = blockedState
 
     def find_free_stations(self, stations):
         """Finds the vacant ParkingLots which the electric vehicle can occupy.
@@ -153,7 +164,14 @@ class EV:
         self.distance += distance
         return(True)
 
-    def find_state(self, chain, time_step, stations, distances):
+    def find_state(self,
+                   chain,
+                   time_step,
+                   stations,
+                   distances,
+                   rndDistance = None,
+                   rndStation = None,
+                   neighbors = None):
         '''Estimates the state of the electric vehicle updates the state, changes the location, occupies the new location.
 
         Parameters
@@ -173,32 +191,93 @@ class EV:
             ex. distance = {'01': [9.3, 20.0, 13.5]} means that the distances
             from state 0 to state 1 are in the list [9.3, 20.0, 13.5]. This
             dictionary is used to sample driving distances from.
+        rndDistance : float, optional
+            A uniform random number used to sample the driving distance. (the
+            default is None, which uses the random module)
+        rndStation : float, optional
+            A uniform random number used to pick the new parking lot. (the
+            default is None, which uses the random module)
+        neighbors : NeighborIndex, optional
+            If given, the new parking lot is drawn with the distance-decay
+            model of the index, and the trip distance is the distance between
+            the parking lots instead of a sample from distances. (the default
+            is None)
 
         Returns
         -------
         bool
-            True if a change in the state occurs.
+            True if a change in the state occurs. If no parking lot of the
+            new state is free, the vehicle keeps its state and location, the
+            move is counted in blockedMoves and False is returned.
 
         '''
         futureState = chain.next_state(self.currentState, self.rnd, time_step)
         if (futureState != self.currentState):
-            distancesList = distances[str(self.currentState)+str(futureState)]
-            distance = rnd.choice(distancesList)
+            if neighbors is None:
+                distancesList = distances[str(self.currentState)+str(futureState)]
+                if rndDistance is None:
+                    distance = rnd.choice(distancesList)
+                else:
+                    distance = distancesList[int(rndDistance * len(distancesList))]
+            previousState = self.currentState
             self.currentState = futureState
-            self.change_location(stations)
+            destination = self.find_destination(stations, rndStation, neighbors)
+            if destination is None:
+                self.currentState = previousState
+                self.blockedMoves += 1
+                self.blockedState = futureState
+                return(False)
+            self.move_to(stations, destination[0])
+            if neighbors is not None:
+                distance = destination[1]
             self.trips += 1
             self.drive_EV(distance)
             return(True)
         else:
             return(False)
 
-    def change_location(self, stations):
-        '''Changes the location.
+    def find_destination(self, stations, rndStation = None, neighbors = None):
+        '''Picks a free parking lot matching the current state.
+
+        Parameters
+        ----------
+        stations : OrderedDict(ParkingLot)
+            An OrderedDict of the parking lots.
+        rndStation : float, optional
+            A uniform random number used to pick the new parking lot. (the
+            default is None, which uses the random module)
+        neighbors : NeighborIndex, optional
+            If given, the new parking lot is drawn with the distance-decay
+            model of the index. (the default is None, uniformly among the free
+            parking lots)
+
+        Returns
+        -------
+        (key, float or None) or None
+            The key of the parking lot and, if neighbors is given, the
+            distance to it. None if no parking lot is free.
+        '''
+        if neighbors is not None:
+            return(neighbors.sample(self.currentLocation, self.currentState,
+                                    stations, rndStation))
+        freeStations = self.find_free_stations(stations)
+        if not freeStations:
+            return(None)
+        if rndStation is None:
+            newStationKey = rnd.choice(freeStations)
+        else:
+            newStationKey = freeStations[int(rndStation * len(freeStations))]
+        return(newStationKey, None)
+
+    def move_to(self, stations, newStationKey):
+        '''Leaves the current parking lot and occupies another one.
 
         Parameters
         ----------
         stations : OrderedDict(ParkingLot)
             An OrderedDict of the parking lots.
+        newStationKey : -
+            The key of the new parking lot.
 
         Returns
         -------
@@ -207,12 +286,37 @@ class EV:
         '''
         previousStation = stations[self.currentLocation]
         previousStation.leave_station()
-        freeStations = self.find_free_stations(stations)
-        newStationKey = rnd.choice(freeStations)
         newStation = stations[newStationKey]
         self.currentLocation  = newStation.ID
         newStation.occupy_station()
 
+    def change_location(self, stations, rndStation = None, neighbors = None):
+        '''Changes the location.
+
+        Parameters
+        ----------
+        stations : OrderedDict(ParkingLot)
+            An OrderedDict of the parking lots.
+        rndStation : float, optional
+            A uniform random number used to pick the new parking lot. (the
+            default is None, which uses the random module)
+        neighbors : NeighborIndex, optional
+            If given, the new parking lot is drawn with the distance-decay
+            model of the index. (the default is None, uniformly among the free
+            parking lots)
+
+        Returns
+        -------
+        float or None
+            The distance between the parking lots if neighbors is given, else
+            None. The location is unchanged if no parking lot is free.
+        '''
+        destination = self.find_destination(stations, rndStation, neighbors)
+        if destination is None:
+            return(None)
+        self.move_to(stations, destination[0])
+        return(destination[1])
+
     # def find_station(self, stations):
     #     '''Returns the current location of the electric vehicle.
     #
@@ -0,0 +1,176 @@
+import numpy as np
+
+from markov import minutes_per_step
+
+
+class ExpectedLoadSimulation:
+    """A deterministic model of the expected charging load of a fleet.
+
+    Instead of simulating every car, the distribution of the fleet over the
+    states is propagated through the inhomogenous Markov chain with one
+    matrix-vector product per timestep. The cost is O(states^2 * timesteps)
+    whatever the size of the fleet, which gives instant baselines and a sanity
+    check for the Monte Carlo Simulation.
+
+    The energy deficit of the fleet is followed as a fluid. A car which drives
+    from state i to state j adds the mean trip distance between i and j times
+    mpg to the deficit of state j. Like in the Simulation class, a car parks
+    in one of the parking lots of its state picked uniformly, so a share of the
+    arriving cars equal to the share of charging parking lots in the state
+    can charge. The cars with a deficit in charging parking lots charge at
+    the power of the parking lots until the deficit is covered, assuming
+    exponentially distributed deficits. As in the EV class, the cars charge
+    whenever the battery is depleted, i.e., batteryCapacity is zero.
+
+    Attributes
+    ----------
+    stations : OrderedDict(ParkingLot)
+        An OrderedDict of the parking lots in the city.
+    numberOfCars : float
+        The number of cars in the fleet.
+    chain : dict[Markov]
+        The Markov chains for weekdays (key True) and weekends (key False).
+    distancesDictionary : dict
+        The distances of trips between states for weekdays (key True) and
+        weekends (key False), see the Markov class.
+    timeSteps : pd.DatetimeIndex
+        The timesteps through which the model is to be run.
+    mpg : float, optional
+        The consumption of the cars in kWh/km. (the default is 0.2)
+    initialState : int, optional
+        The state all cars are in at the start. (the default is 0)
+    resolution : float, optional
+        The resolution of the timestep in hours. (the default is 1/60)
+    """
+
+    def __init__(self,
+                 stations,
+                 numberOfCars,
+                 chain,
+                 distancesDictionary,
+                 timeSteps,
+                 mpg = 0.2,
+                 initialState = 0,
+                 resolution = 1/60):
+        self.stations = stations
+        self.numberOfCars = numberOfCars
+        self.chain = chain
+        self.distancesDictionary = distancesDictionary
+        self.timeSteps = timeSteps
+        self.mpg = mpg
+        self.initialState = initialState
+        self.resolution = resolution
+        self.minutesPerStep = minutes_per_step(resolution)
+        self.numberOfStates = chain[True].numberOfStates
+
+        S = self.numberOfStates
+        state = np.array([v.state for (k,v) in stations.items()])
+        self.isCharging = np.array([v.chargingStatus == True for (k,v) in
+                                    stations.items()], dtype=bool)
+        power = np.array([v.chargingPower for (k,v) in stations.items()],
+                         dtype=float)
+        numberOfLots = np.bincount(state, minlength=S)
+        numberOfChargingLots = np.bincount(state[self.isCharging], minlength=S)
+        self.chargingShare = numberOfChargingLots / np.maximum(numberOfLots, 1)
+        self.meanPower = np.bincount(state[self.isCharging],
+                                     weights=power[self.isCharging],
+                                     minlength=S) / \
+            np.maximum(numberOfChargingLots, 1)
+
+        # The load of a state is shared by its charging stations in proportion
+        # to their power.
+        chargingState = state[self.isCharging]
+        statePower = np.bincount(chargingState, weights=power[self.isCharging],
+                                 minlength=S)
+        self.stationState = chargingState
+        self.stationShare = power[self.isCharging] / \
+            np.where(statePower[chargingState] > 0,
+                     statePower[chargingState], 1.0)
+
+        self.tripEnergy = {k: self.mean_trip_energy(v) for (k, v) in
+                           distancesDictionary.items()}
+
+    def mean_trip_energy(self, distances):
+        """Returns the (states, states) matrix of the mean trip energy.
+
+        Parameters
+        ----------
+        distances : dict
+            The distances of trips between states.
+
+        Returns
+        -------
+        numpy.array(float)
+            The mean distance between every two states times mpg.
+
+        """
+        S = self.numberOfStates
+        energy = np.zeros((S, S))
+        for i in range(S):
+            for j in range(S):
+                trips = distances.get(str(i) + str(j))
+                if trips is not None and len(trips) > 0:
+                    energy[i, j] = np.mean(trips) * self.mpg
+        return(energy)
+
+    def simulate_model(self):
+        """Runs the model.
+
+        Returns
+        -------
+        numpy.array(float)
+            The expected load of every charging station, with one column per
+            charging station like Simulation.simulate_model(). The expected
+            load, occupancy, trips and distance per state are stored in the
+            attributes stateLoad, stateOccupancy, trips and distance.
+
+        """
+        S = self.numberOfStates
+        T = len(self.timeSteps)
+        dt = self.resolution
+        share = self.chargingShare
+        offDiagonal = ~np.eye(S, dtype=bool)
+
+        occupancy = np.zeros(S)
+        occupancy[self.initialState] = self.numberOfCars
+        deficitCharging = np.zeros(S)
+        deficitParked = np.zeros(S)
+        carsCharging = np.zeros(S)
+
+        self.stateLoad = np.zeros((T, S))
+        self.stateOccupancy = np.zeros((T, S))
+        self.trips = np.zeros(T)
+        self.distance = np.zeros(T)
+
+        for t, time in enumerate(self.timeSteps):
+            weekday = True if time.weekday() < 5 else False
+            minute = time.minute + 60 * time.hour
+            P = self.chain[weekday].sampled_transition_matrix(
+                    minute // self.minutesPerStep)
+            stay = np.diag(P)
+
+            moving = occupancy[:, np.newaxis] * P * offDiagonal
+            deficit = deficitCharging + deficitParked
+            arrivingEnergy = (deficit[:, np.newaxis] * P * offDiagonal).sum(0) \
+                + (moving * self.tripEnergy[weekday]).sum(0)
+            arrivingCars = moving.sum(0)
+
+            self.trips[t] = moving.sum()
+            self.distance[t] = (moving * self.tripEnergy[weekday]).sum() / self.mpg
+            occupancy = occupancy @ P
+
+            deficitCharging = deficitCharging * stay + share * arrivingEnergy
+            deficitParked = deficitParked * stay + (1 - share) * arrivingEnergy
+            carsCharging = carsCharging * stay + share * arrivingCars
+
+            power = np.minimum(carsCharging * self.meanPower, deficitCharging / dt)
+            delivered = power * dt
+            finished = np.divide(delivered, deficitCharging,
+                                 out=np.zeros(S), where=deficitCharging > 0)
+            carsCharging -= carsCharging * finished
+            deficitCharging -= delivered
+
+            self.stateLoad[t] = power
+            self.stateOccupancy[t] = occupancy
+
+        return(self.stateLoad[:, self.stationState] * self.stationShare)
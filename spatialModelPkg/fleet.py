@@ -0,0 +1,230 @@
+import numpy as np
+
+
+class Fleet:
+    """Array-backed vehicle parameters and battery charge of a mixed fleet.
+
+    Every car belongs to a vehicle class, and the parameters of the classes
+    are gathered once into one array per parameter with one value per car.
+    Driving and charging are then computed for the whole fleet with array
+    operations and masks, so a mixed fleet costs as much per timestep as a
+    uniform one. For per-car parameters, give every car its own class.
+
+    Like in the EV class, the battery is full when batteryCharge equals
+    batteryCapacity. A capacity of zero keeps the original model, where the
+    charge is zero when full and negative when depleted, and such cars are
+    charged without taper.
+
+    Above taperStart, the fraction of the capacity, the power accepted by a
+    car decreases linearly from its full power, the smaller of maxPower and
+    the power of the station, to taperPower times it at full charge, which
+    approximates the constant voltage phase of the charging curve.
+
+    Attributes
+    ----------
+    vehicleClass : numpy.array(int)
+        The vehicle class of every car.
+    mpg : numpy.array(float)
+        The consumption of every class, e.g., (kWh/km).
+    batteryCapacity : numpy.array(float)
+        The battery capacity of every class (kWh).
+    maxPower : numpy.array(float), optional
+        The maximum charging power of every class (kW). (the default is
+        np.inf, the power of the station)
+    taperStart : numpy.array(float), optional
+        The fraction of the capacity from which the charging power tapers, for
+        every class. (the default is 1.0, no taper)
+    taperPower : float, optional
+        The fraction of the full power accepted at full charge. (the default
+        is 0.1)
+    batteryCharge : numpy.array(float), optional
+        The battery charge of every car. (the default is None, all batteries
+        full)
+    """
+
+    def __init__(self,
+                 vehicleClass,
+                 mpg,
+                 batteryCapacity,
+                 maxPower = np.inf,
+                 taperStart = 1.0,
+                 taperPower = 0.1,
+                 batteryCharge = None):
+        self.vehicleClass = np.asarray(vehicleClass, dtype=int)
+        numberOfClasses = max([np.size(x) for x in
+                               (mpg, batteryCapacity, maxPower, taperStart)]
+                              + [self.vehicleClass.max() + 1
+                                 if self.vehicleClass.shape[0] else 0])
+
+        def per_class(x):
+            return(np.broadcast_to(np.asarray(x, dtype=float),
+                                   (numberOfClasses,)).copy())
+
+        self.mpg = per_class(mpg)
+        self.batteryCapacity = per_class(batteryCapacity)
+        self.maxPower = per_class(maxPower)
+        self.taperStart = per_class(taperStart)
+        self.taperPower = taperPower
+        assert np.all((self.taperStart >= 0) & (self.taperStart <= 1)), \
+            "taperStart should be between 0 and 1."
+
+        self.carMpg = self.mpg[self.vehicleClass]
+        self.carCapacity = self.batteryCapacity[self.vehicleClass]
+        self.carMaxPower = self.maxPower[self.vehicleClass]
+        self.carTaperStart = self.taperStart[self.vehicleClass]
+        self.batteryCharge = self.carCapacity.copy() if batteryCharge is None \
+            else np.array(np.broadcast_to(np.asarray(batteryCharge, dtype=float),
+                                          self.vehicleClass.shape))
+
+    def __len__(self):
+        return(self.vehicleClass.shape[0])
+
+    def deficits(self):
+        """Returns the energy needed to fill the battery of every car."""
+        return(self.carCapacity - self.batteryCharge)
+
+    def accepted_power(self, carIndex, stationPower = np.inf):
+        """Returns the maximum charging power of cars, tapered near full.
+
+        Parameters
+        ----------
+        carIndex : numpy.array(int)
+            The index of the cars in the fleet.
+        stationPower : numpy.array(float), optional
+            The power of the station of every car, which limits maxPower
+            before the taper. (the default is np.inf, no limit)
+
+        Returns
+        -------
+        numpy.array(float)
+            The power every car can take at its current charge.
+
+        """
+        carIndex = np.asarray(carIndex, dtype=int)
+        capacity = self.carCapacity[carIndex]
+        # Cars without capacity are never tapered.
+        stateOfCharge = np.divide(self.batteryCharge[carIndex], capacity,
+                                  out=np.zeros(carIndex.shape[0]),
+                                  where=capacity > 0)
+        taperStart = self.carTaperStart[carIndex]
+        tapered = np.clip((stateOfCharge - taperStart)
+                          / np.maximum(1.0 - taperStart, 1e-12), 0.0, 1.0)
+        power = np.minimum(self.carMaxPower[carIndex], stationPower)
+        factor = 1.0 - (1.0 - self.taperPower) * tapered
+        # An unlimited power tapered to zero is zero, not NaN.
+        return(np.multiply(power, factor, out=np.zeros(carIndex.shape[0]),
+                           where=factor > 0))
+
+    def drive(self, distance):
+        """Discharges the batteries of the whole fleet.
+
+        Parameters
+        ----------
+        distance : numpy.array(float)
+            The distance driven by every car.
+
+        Returns
+        -------
+        None
+            Mutates batteryCharge.
+
+        """
+        self.batteryCharge -= distance * self.carMpg
+
+    def charge(self, carIndex, power, duration):
+        """Charges cars, without exceeding their capacity.
+
+        Parameters
+        ----------
+        carIndex : numpy.array(int)
+            The index of the charging cars in the fleet.
+        power : numpy.array(float)
+            The charging power of every charging car.
+        duration : float
+            The charging duration in units of time, e.g., (h).
+
+        Returns
+        -------
+        None
+            Mutates batteryCharge.
+
+        """
+        self.batteryCharge[carIndex] = np.minimum(
+            self.batteryCharge[carIndex] + power * duration,
+            self.carCapacity[carIndex])
+
+    def update_cars(self, cars):
+        """Writes the parameters and the battery charge into EV objects.
+
+        Parameters
+        ----------
+        cars : list(EV)
+            The cars of the fleet, in the same order.
+
+        Returns
+        -------
+        None
+            Mutates the cars.
+
+        """
+        assert len(cars) == len(self), "cars and the fleet should have the " \
+            + "same number of cars."
+        for x, mpg, capacity, charge in zip(cars,
+                                            self.carMpg.tolist(),
+                                            self.carCapacity.tolist(),
+                                            self.batteryCharge.tolist()):
+            x.mpg = mpg
+            x.batteryCapacity = capacity
+            x.batteryCharge = charge
+
+
+def create_fleet(numberOfCars,
+                 shares,
+                 mpg,
+                 batteryCapacity,
+                 maxPower = np.inf,
+                 taperStart = 1.0,
+                 taperPower = 0.1):
+    """Creates a mixed fleet from a table of vehicle classes.
+
+    The number of cars of every class is its share of numberOfCars, rounded
+    with the largest remainder method, and the classes are assigned in
+    contiguous blocks of cars.
+
+    Parameters
+    ----------
+    numberOfCars : int
+        The number of cars.
+    shares : list(float)
+        The share of the fleet of every class. Normalized to sum to one.
+    mpg : list(float)
+        The consumption of every class, e.g., (kWh/km).
+    batteryCapacity : list(float)
+        The battery capacity of every class (kWh).
+    maxPower : float or list(float), optional
+        The maximum charging power of every class (kW). (the default is
+        np.inf)
+    taperStart : float or list(float), optional
+        The fraction of the capacity from which the charging power tapers.
+        (the default is 1.0, no taper)
+    taperPower : float, optional
+        The fraction of the full power accepted at full charge. (the default
+        is 0.1)
+
+    Returns
+    -------
+    Fleet
+        The fleet, with full batteries.
+
+    """
+    shares = np.asarray(shares, dtype=float)
+    shares = shares / shares.sum()
+    counts = np.floor(shares * numberOfCars).astype(int)
+    remainders = shares * numberOfCars - counts
+    counts[np.argsort(-remainders, kind='stable')[:numberOfCars - counts.sum()]] += 1
+    return(Fleet(vehicleClass = np.repeat(np.arange(shares.shape[0]), counts),
+                 mpg = mpg,
+                 batteryCapacity = batteryCapacity,
+                 maxPower = maxPower,
+                 taperStart = taperStart,
+                 taperPower = taperPower))
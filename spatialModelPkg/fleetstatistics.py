@@ -0,0 +1,121 @@
+import numpy as np
+
+# The quantities which are cumulative totals of the cars since the start of
+# the simulation, histogrammed as their increments over every period.
+INCREMENTS = ("trips", "distance")
+
+class FleetStatistics:
+    """Streaming histograms of the battery charge, trips and distance of a
+    fleet.
+
+    Add it to the observers of a Simulation. For every period (by default
+    every hour) it keeps a fixed-bin histogram of every quantity. The battery
+    charge is counted over the cars and the timesteps of the period. The
+    trips and the distance, which the cars accumulate since the start, are
+    counted once per car and period, as the trips made and the distance
+    driven during the period, so the histograms of a period do not depend
+    on the periods before it. The memory depends only on the
+    number of periods and bins, not on the fleet size. Histograms with the
+    same bins and periods, e.g., from parallel replicates or from partitions
+    of a fleet, are merged with merge().
+
+    Attributes
+    ----------
+    bins : dict(str, numpy.array(float))
+        The bin edges of every quantity to follow, keys among
+        "batteryCharge", "trips" and "distance". Values outside the edges are
+        counted in the first or the last bin.
+    stepsPerPeriod : int, optional
+        The number of timesteps aggregated into one histogram. (the default
+        is 60, i.e., one hour at a minute resolution)
+    """
+
+    def __init__(self, bins, stepsPerPeriod = 60):
+        self.bins = {k: np.asarray(v, dtype=float) for (k, v) in bins.items()}
+        self.stepsPerPeriod = stepsPerPeriod
+        self.counts = {k: np.zeros((0, v.shape[0] - 1), dtype=np.int64)
+                       for (k, v) in self.bins.items()}
+
+    def start(self, simulation):
+        self.numberOfSteps = simulation.timeSteps.shape[0]
+        # The totals of the cars at the start of the current period.
+        self.periodStart = {k: np.array([getattr(x, k) for x in
+                                         simulation.cars], dtype=float)
+                            for k in self.bins if k in INCREMENTS}
+
+    def update(self, simulation, step, time, load):
+        period = step // self.stepsPerPeriod
+        periodEnd = (step + 1) % self.stepsPerPeriod == 0 or \
+            step == self.numberOfSteps - 1
+        for k, edges in self.bins.items():
+            if self.counts[k].shape[0] <= period:
+                grown = np.zeros((period + 1, edges.shape[0] - 1), dtype=np.int64)
+                grown[:self.counts[k].shape[0]] = self.counts[k]
+                self.counts[k] = grown
+            if k in INCREMENTS and not periodEnd:
+                continue
+            values = np.array([getattr(x, k) for x in simulation.cars],
+                              dtype=float)
+            if k in INCREMENTS:
+                values, self.periodStart[k] = values - self.periodStart[k], \
+                    values
+            self.counts[k][period] += np.bincount(self.bin_of(k, values),
+                                                  minlength=edges.shape[0] - 1)
+
+    def bin_of(self, quantity, values):
+        """Returns the bin of every value, clipped to the first and last bin."""
+        edges = self.bins[quantity]
+        return(np.clip(np.searchsorted(edges, values, side='right') - 1,
+                       0, edges.shape[0] - 2))
+
+    def merge(self, other):
+        """Adds the histograms of another FleetStatistics with the same bins.
+
+        Parameters
+        ----------
+        other : FleetStatistics
+            The statistics to merge, e.g., from another replicate.
+
+        Returns
+        -------
+        FleetStatistics
+            self, with the merged counts.
+
+        """
+        for k, edges in self.bins.items():
+            assert np.array_equal(edges, other.bins[k]), "the bins of " + k \
+                + " are different."
+            periods = max(self.counts[k].shape[0], other.counts[k].shape[0])
+            merged = np.zeros((periods, edges.shape[0] - 1), dtype=np.int64)
+            merged[:self.counts[k].shape[0]] += self.counts[k]
+            merged[:other.counts[k].shape[0]] += other.counts[k]
+            self.counts[k] = merged
+        return(self)
+
+    def percentiles(self, quantity, q):
+        """Estimates percentiles of a quantity for every period.
+
+        The percentiles are interpolated linearly inside the bins.
+
+        Parameters
+        ----------
+        quantity : str
+            "batteryCharge", "trips" or "distance".
+        q : float or list(float)
+            The percentiles, between 0 and 100.
+
+        Returns
+        -------
+        numpy.array(float)
+            The percentiles, of shape (periods, len(q)).
+
+        """
+        edges = self.bins[quantity]
+        counts = self.counts[quantity]
+        q = np.atleast_1d(np.asarray(q, dtype=float)) / 100
+        cumulative = np.cumsum(counts, axis=1)
+        total = np.maximum(cumulative[:, -1:], 1)
+        fraction = np.concatenate((np.zeros((counts.shape[0], 1)),
+                                   cumulative / total), axis=1)
+        return(np.array([np.interp(q, f, edges) for f in fraction])
+               .reshape(counts.shape[0], q.shape[0]))
@@ -0,0 +1,171 @@
+import glob
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+
+from resultcache import hash_file, scenario_key
+
+# The files of a shapefile besides the .shp file, all read by OGR.
+SHAPEFILE_EXTENSIONS = (".shp", ".shx", ".dbf", ".prj", ".cpg", ".qix")
+
+def layer_files(fileName):
+    """Returns the files a GIS layer is read from.
+
+    Parameters
+    ----------
+    fileName : str
+        The file opened with ogr.Open(), e.g., a shapefile, a GeoPackage or a
+        directory of shapefiles.
+
+    Returns
+    -------
+    list(str)
+        The sorted file names: all the files of a directory, the files with
+        the same name and a shapefile extension for a .shp file, else the file
+        itself.
+
+    """
+    if os.path.isdir(fileName):
+        return(sorted(f for f in glob.glob(os.path.join(fileName, "*"))
+                      if os.path.isfile(f)))
+    stem, extension = os.path.splitext(fileName)
+    if extension.lower() == ".shp":
+        return(sorted(f for f in glob.glob(glob.escape(stem) + ".*")
+                      if os.path.splitext(f)[1].lower() in SHAPEFILE_EXTENSIONS))
+    return([fileName])
+
+
+class GISCache:
+    """A local cache of arrays derived from GIS layers.
+
+    Every entry is a directory of .npy files named after a key made of the
+    hashes of the layer files and the preprocessing parameters, so an entry
+    is invalidated as soon as a layer file or a parameter changes. The
+    arrays are loaded memory-mapped. The hashes of the layer files are
+    remembered with their size and modification time, so unchanged files are
+    not read again.
+
+    Attributes
+    ----------
+    directory : str
+        The directory of the cache. It is created if needed.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.hashesFile = os.path.join(directory, "hashes.json")
+
+    def file_hash(self, fileName):
+        """Returns the SHA-256 hash of a file, read only if the file changed
+        since it was last hashed."""
+        try:
+            with open(self.hashesFile, 'r') as ff:
+                hashes = json.load(ff)
+        except (OSError, ValueError):
+            hashes = {}
+        path = os.path.realpath(fileName)
+        status = os.stat(path)
+        stamp = [status.st_size, status.st_mtime_ns]
+        if path in hashes and hashes[path][:2] == stamp:
+            return(hashes[path][2])
+        digest = hash_file(path)
+        hashes[path] = stamp + [digest]
+        handle, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(handle, 'w') as ff:
+            json.dump(hashes, ff)
+        os.replace(temporary, self.hashesFile)
+        return(digest)
+
+    def key(self, layers, parameters):
+        """Returns the key of arrays derived from layers with parameters.
+
+        Parameters
+        ----------
+        layers : list(str)
+            The files of the layers, see layer_files().
+        parameters : dict
+            The preprocessing parameters, e.g., the layer names, the buffer
+            distance and the coordinate systems.
+
+        Returns
+        -------
+        str
+            The hexadecimal key.
+
+        """
+        hashes = [[self.file_hash(f) for f in layer_files(layer)]
+                  for layer in layers]
+        return(scenario_key({"layers": hashes, "parameters": parameters}))
+
+    def get(self, key):
+        """Returns the cached arrays of a key, memory-mapped, or None."""
+        entry = os.path.join(self.directory, key)
+        if not os.path.isdir(entry):
+            return(None)
+        try:
+            return({os.path.splitext(name)[0]:
+                    np.load(os.path.join(entry, name), mmap_mode='r')
+                    for name in sorted(os.listdir(entry))
+                    if name.endswith(".npy")})
+        except (OSError, ValueError):
+            return(None)
+
+    def put(self, key, arrays):
+        """Stores arrays under a key.
+
+        Parameters
+        ----------
+        key : str
+            The key, see key().
+        arrays : dict(str, numpy.array)
+            The arrays. Strings are stored as fixed-width unicode arrays,
+            which can be memory-mapped.
+
+        Returns
+        -------
+        None
+
+        """
+        temporary = tempfile.mkdtemp(dir=self.directory, suffix=".tmp")
+        for name, array in arrays.items():
+            array = np.asarray(array)
+            if array.dtype.kind == 'O':
+                array = array.astype(str)
+            np.save(os.path.join(temporary, name + ".npy"), array)
+        try:
+            os.rename(temporary, os.path.join(self.directory, key))
+        except OSError:
+            # Another process stored the same entry first.
+            shutil.rmtree(temporary)
+
+
+def cached_gis_arrays(cache, layers, parameters, compute):
+    """Returns arrays derived from GIS layers from the cache, or computes them.
+
+    Parameters
+    ----------
+    cache : GISCache
+        The cache.
+    layers : list(str)
+        The files of the layers the arrays are derived from.
+    parameters : dict
+        The preprocessing parameters.
+    compute : function
+        Called without arguments on a cache miss, returns a dict of arrays,
+        e.g., {"area": get_features_areas(layer)}.
+
+    Returns
+    -------
+    dict(str, numpy.array)
+        The arrays, memory-mapped from the cache.
+
+    """
+    key = cache.key(layers, parameters)
+    arrays = cache.get(key)
+    if arrays is None:
+        cache.put(key, compute())
+        arrays = cache.get(key)
+    return(arrays)
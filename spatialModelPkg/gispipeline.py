@@ -0,0 +1,286 @@
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from auxiliary import create_spatial_grid
+from stationtable import create_station_table
+from giscache import cached_gis_arrays
+
+# The open data sources of a worker process, set once by init_worker().
+workerLayers = {}
+
+def open_layer(source):
+    """Opens a layer given as a file name or a (file name, layer name or
+    index) pair, and returns it with its data source."""
+    from osgeo import ogr
+
+    fileName, layer = (source, 0) if isinstance(source, str) else source
+    dataSource = ogr.Open(fileName)
+    assert dataSource is not None, "could not open " + fileName + "."
+    return(dataSource, dataSource.GetLayer(layer))
+
+def init_worker(parkingSource,
+                stateSources,
+                inputCoordinateSystem,
+                outputCoordinateSystem):
+    """Opens the layers once per worker process."""
+    from osgeo import osr
+
+    workerLayers["parking"] = open_layer(parkingSource)
+    workerLayers["states"] = [open_layer(s) for s in stateSources]
+    workerLayers["transform"] = None
+    if inputCoordinateSystem is not None and outputCoordinateSystem is not None:
+        source = osr.SpatialReference()
+        source.ImportFromEPSG(inputCoordinateSystem)
+        target = osr.SpatialReference()
+        target.ImportFromEPSG(outputCoordinateSystem)
+        for reference in (source, target):
+            # Keep the x, y order of the coordinates with GDAL 3 and later.
+            if hasattr(reference, "SetAxisMappingStrategy"):
+                reference.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+        workerLayers["transform"] = osr.CoordinateTransformation(source, target)
+
+def process_tile(tile, idField = None, bufferDist = 0):
+    """Computes the areas and the state areas of the parking lots of a tile.
+
+    A parking feature belongs to the tile which contains a point on its
+    surface (PointOnSurface()), with tiles closed on their lower and open on
+    their upper edges, so every feature crossing tile borders is processed
+    by exactly one tile. The intersecting buildings are searched in the
+    whole state layers, not only in the tile.
+
+    Parameters
+    ----------
+    tile : list((float, float))
+        The vertices of the tile, as returned by create_spatial_grid().
+    idField : str, optional
+        The field holding the IDs of the parking lots. (the default is None,
+        the feature IDs)
+    bufferDist : float, optional
+        The buffer distance, in the units of the parking layer, like in
+        create_buffer_and_projectLayer(). (the default is 0)
+
+    Returns
+    -------
+    dict
+        The feature IDs (FID), the IDs, the areas of the parking lots and the
+        summed areas of the intersecting features of every state layer,
+        like get_floor_areas_of_intersecting_buildings().
+
+    """
+    parking = workerLayers["parking"][1]
+    states = [layer for (source, layer) in workerLayers["states"]]
+    transform = workerLayers["transform"]
+    minX, minY = tile[0]
+    maxX, maxY = tile[2]
+
+    FIDs, IDs, areas, stateAreas = [], [], [], []
+    parking.SetSpatialFilterRect(minX, minY, maxX, maxY)
+    for feature in parking:
+        geometry = feature.GetGeometryRef()
+        if geometry is None:
+            continue
+        point = geometry.PointOnSurface()
+        if point is None or not (minX <= point.GetX() < maxX and
+                                 minY <= point.GetY() < maxY):
+            continue
+        # The area and the intersections are those of the buffered and
+        # projected geometry, like in create_buffer_and_projectLayer().
+        buffered = geometry.Buffer(bufferDist)
+        if transform is not None:
+            buffered.Transform(transform)
+
+        rowAreas = []
+        for layer in states:
+            layer.SetSpatialFilter(buffered)
+            rowAreas.append(sum(building.GetGeometryRef().GetArea()
+                                for building in layer
+                                if building.GetGeometryRef() is not None))
+            layer.SetSpatialFilter(None)
+            layer.ResetReading()
+
+        FIDs.append(feature.GetFID())
+        IDs.append(feature.GetFID() if idField is None else
+                   feature.GetField(idField))
+        areas.append(buffered.GetArea())
+        stateAreas.append(rowAreas)
+    parking.SetSpatialFilter(None)
+    parking.ResetReading()
+
+    return({"FID": np.array(FIDs, dtype=np.int64),
+            "ID": IDs,
+            "area": np.array(areas, dtype=float),
+            "stateAreas": np.array(stateAreas, dtype=float).reshape(-1,
+                                                                    len(states))})
+
+def tile_region(extent, tileSize):
+    """Covers an extent with the square tiles of create_spatial_grid().
+
+    Parameters
+    ----------
+    extent : (float, float, float, float)
+        The extent (minX, maxX, minY, maxY), e.g., from Layer.GetExtent().
+    tileSize : float
+        The side of the tiles, in the units of the layer, e.g., a fraction
+        of a degree.
+
+    Returns
+    -------
+    list(list(float, float))
+        The vertices of every tile, aligned on multiples of tileSize. Every
+        point of the extent, including its upper edges, is inside one tile.
+
+    """
+    assert tileSize > 0, "tileSize should be positive."
+    minX, maxX, minY, maxY = extent
+    initialX = math.floor(minX / tileSize) * tileSize
+    initialY = math.floor(minY / tileSize) * tileSize
+    numberOfX = int(math.floor(maxX / tileSize) - math.floor(minX / tileSize)) + 1
+    numberOfY = int(math.floor(maxY / tileSize) - math.floor(minY / tileSize)) + 1
+    return(create_spatial_grid(initialX, initialY, tileSize, tileSize,
+                               numberOfX, numberOfY))
+
+def create_station_table_from_layers(parkingSource,
+                                     stateSources,
+                                     areaPerCar,
+                                     tileSize,
+                                     idField = None,
+                                     bufferDist = 0,
+                                     inputCoordinateSystem = None,
+                                     outputCoordinateSystem = None,
+                                     charging_status = True,
+                                     charging_power = 3.7,
+                                     processes = None,
+                                     cache = None):
+    """Creates a StationTable from the map layers of a city, tile by tile.
+
+    This runs the buffer, area and state percentage steps of
+    create_buffer_and_projectLayer(), get_features_areas() and
+    get_percentage_of_area_types() in one pass. The region of the parking
+    layer is split into the square tiles of create_spatial_grid(), and the
+    tiles are processed in parallel by a pool of processes, each opening the
+    layers once. The results are merged in the order of the parking features,
+    the percentages of the states are normalized like in
+    get_percentage_of_area_types(), and the table is built with
+    create_station_table().
+
+    Parameters
+    ----------
+    parkingSource : str or (str, str or int)
+        The file of the parking layer, or the file and the layer name or
+        index. (the first layer is used by default)
+    stateSources : list(str or (str, str or int))
+        The layer of every state, e.g., the buildings of homes, of workplaces
+        and of other places, in the coordinate system of the output.
+    areaPerCar : float or list(float)
+        The ground area needed to fit a car in a parking lot.
+    tileSize : float
+        The side of the tiles, in the units of the parking layer.
+    idField : str, optional
+        The field holding the IDs of the parking lots. (the default is None,
+        the feature IDs)
+    bufferDist : float, optional
+        The buffer distance around the parking lots, in the units of the
+        parking layer. (the default is 0)
+    inputCoordinateSystem : int, optional
+        The EPSG code of the parking layer. (the default is None, no
+        transformation)
+    outputCoordinateSystem : int, optional
+        The EPSG code of the state layers and of the areas. (the default is
+        None, no transformation)
+    charging_status : bool or list(bool), optional
+        True if charging is enabled, for all parcels or per parking feature
+        with a geometry, in the order of the layer. (the default is True)
+    charging_power : float or list(float), optional
+        The charging power, for all parcels or per parking feature with a
+        geometry. (the default is 3.7 kW)
+    processes : int, optional
+        The number of processes, 1 to run in this process. (the default is
+        None, one per CPU)
+    cache : GISCache, optional
+        If given, the areas and percentages of the parcels are loaded from
+        the cache when the layer files and the preprocessing parameters are
+        unchanged, and stored in it otherwise. (the default is None)
+
+    Returns
+    -------
+    StationTable
+        The table of parking lots. Parking features without geometry are
+        skipped.
+
+    """
+    def compute():
+        return(compute_parcels(parkingSource, stateSources, tileSize, idField,
+                               bufferDist, inputCoordinateSystem,
+                               outputCoordinateSystem, processes))
+
+    if cache is None:
+        parcels = compute()
+    else:
+        # The tiling and the number of processes do not change the results.
+        parameters = {"parking": parkingSource,
+                      "states": list(stateSources),
+                      "idField": idField,
+                      "bufferDist": bufferDist,
+                      "inputCoordinateSystem": inputCoordinateSystem,
+                      "outputCoordinateSystem": outputCoordinateSystem}
+        layers = [s if isinstance(s, str) else s[0]
+                  for s in [parkingSource] + list(stateSources)]
+        parcels = cached_gis_arrays(cache, layers, parameters, compute)
+    return(create_station_table(parcels["ID"],
+                                parcels["area"],
+                                parcels["percentageOfStates"],
+                                areaPerCar,
+                                charging_status,
+                                charging_power))
+
+def compute_parcels(parkingSource,
+                    stateSources,
+                    tileSize,
+                    idField,
+                    bufferDist,
+                    inputCoordinateSystem,
+                    outputCoordinateSystem,
+                    processes):
+    """Runs the tiles of create_station_table_from_layers().
+
+    Returns
+    -------
+    dict(str, numpy.array)
+        The IDs, the areas and the percentages of the states of the parcels,
+        in the order of the parking features.
+
+    """
+    initargs = (parkingSource, list(stateSources), inputCoordinateSystem,
+                outputCoordinateSystem)
+    dataSource, layer = open_layer(parkingSource)
+    tiles = tile_region(layer.GetExtent(), tileSize)
+    dataSource = None
+
+    if processes == 1:
+        init_worker(*initargs)
+        results = [process_tile(tile, idField, bufferDist) for tile in tiles]
+    else:
+        workers = processes or os.cpu_count() or 1
+        with ProcessPoolExecutor(processes, initializer = init_worker,
+                                 initargs = initargs) as pool:
+            # A few chunks per worker balance the unequal tiles.
+            results = list(pool.map(process_tile, tiles,
+                                    [idField] * len(tiles),
+                                    [bufferDist] * len(tiles),
+                                    chunksize = max(1, len(tiles) //
+                                                    (8 * workers))))
+
+    FIDs = np.concatenate([r["FID"] for r in results])
+    order = np.argsort(FIDs, kind='stable')
+    IDs = [ID for r in results for ID in r["ID"]]
+    areas = np.concatenate([r["area"] for r in results])[order]
+    stateAreas = np.concatenate([r["stateAreas"] for r in results])[order]
+
+    sumRows = stateAreas.sum(axis=1)
+    sumRows[sumRows == 0] = 1.0 # do not divide by zero
+    return({"ID": np.array([IDs[i] for i in order.tolist()]),
+            "area": areas,
+            "percentageOfStates": stateAreas / sumRows.reshape(-1,1)})
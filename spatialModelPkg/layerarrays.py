@@ -0,0 +1,210 @@
+# GDAL (osgeo) is imported inside the functions, like in auxiliary.py.
+import numpy as np
+
+GEOMETRY_COLUMNS = ("area", "envelope", "centroid")
+
+def geometry_columns(geometries, geometry):
+    """Computes the geometry columns of read_layer() from OGR geometries.
+
+    Parameters
+    ----------
+    geometries : list(ogr.Geometry)
+        The geometries of the features, None for empty ones.
+    geometry : list(str)
+        The columns to compute, among GEOMETRY_COLUMNS.
+
+    Returns
+    -------
+    dict(str, numpy.array(float))
+        The columns.
+
+    """
+    numberOfFeatures = len(geometries)
+    columns = {}
+    if "area" in geometry:
+        columns["area"] = np.fromiter((0.0 if g is None else g.GetArea()
+                                       for g in geometries), dtype=float,
+                                      count=numberOfFeatures)
+    if "envelope" in geometry:
+        columns["envelope"] = np.array([(np.nan,) * 4 if g is None
+                                        else g.GetEnvelope()
+                                        for g in geometries],
+                                       dtype=float).reshape(-1, 4)
+    if "centroid" in geometry:
+        centroids = [None if g is None else g.Centroid() for g in geometries]
+        columns["centroid"] = np.array([(np.nan,) * 2 if c is None
+                                        else (c.GetX(), c.GetY())
+                                        for c in centroids],
+                                       dtype=float).reshape(-1, 2)
+    return(columns)
+
+def geometry_columns_wkb(wkb, geometry):
+    """Computes the geometry columns of read_layer() from WKB geometries.
+
+    With shapely 2, the geometries are parsed and measured in vectorized
+    calls, else every geometry is parsed with OGR and measured by
+    geometry_columns().
+
+    Parameters
+    ----------
+    wkb : list(bytes)
+        The WKB geometries of the features, None for empty ones.
+    geometry : list(str)
+        The columns to compute, among GEOMETRY_COLUMNS.
+
+    Returns
+    -------
+    dict(str, numpy.array(float))
+        The columns.
+
+    """
+    try:
+        import shapely
+        vectorized = hasattr(shapely, "from_wkb")
+    except ImportError:
+        vectorized = False
+    if not vectorized:
+        from osgeo import ogr
+        return(geometry_columns([None if g is None
+                                 else ogr.CreateGeometryFromWkb(bytes(g))
+                                 for g in wkb], geometry))
+
+    geometries = shapely.from_wkb(np.array([None if g is None else bytes(g)
+                                            for g in wkb], dtype=object))
+    missing = shapely.is_missing(geometries) | shapely.is_empty(geometries)
+    columns = {}
+    if "area" in geometry:
+        columns["area"] = np.where(missing, 0.0, shapely.area(geometries))
+    if "envelope" in geometry:
+        # shapely gives (minX, minY, maxX, maxY), OGR (minX, maxX, minY, maxY).
+        bounds = shapely.bounds(geometries).reshape(-1, 4)[:, [0, 2, 1, 3]]
+        bounds[missing] = np.nan
+        columns["envelope"] = bounds
+    if "centroid" in geometry:
+        # The coordinates of missing centroids are NaN.
+        centroids = np.where(missing, None, shapely.centroid(geometries))
+        columns["centroid"] = np.stack((shapely.get_x(centroids),
+                                        shapely.get_y(centroids)),
+                                       axis=1).reshape(-1, 2)
+    return(columns)
+
+def field_column(values):
+    """Converts the values of a field into a NumPy array.
+
+    Strings returned as bytes by the Arrow interface are decoded, and masked
+    (null) values become None like with Feature.GetField().
+    """
+    mask = np.ma.getmaskarray(values) if np.ma.isMaskedArray(values) else None
+    values = np.ma.getdata(values)
+    if values.dtype.kind in "SO":
+        values = np.array([v.decode("utf-8") if isinstance(v, bytes) else v
+                           for v in values.tolist()], dtype=object)
+    if mask is not None and mask.any():
+        values = values.astype(object)
+        values[mask] = None
+    return(values)
+
+def layer_fields(layer):
+    """Returns the names of the fields of a layer."""
+    layerDefn = layer.GetLayerDefn()
+    return([layerDefn.GetFieldDefn(n).name
+            for n in range(layerDefn.GetFieldCount())])
+
+def read_layer_arrow(layer, fields, geometry, ignoredFields = ()):
+    """Reads a layer with the Arrow stream interface of GDAL 3.6 or later.
+
+    The unread fields are ignored during the read, and ignoredFields are set
+    back after it. Raises AttributeError or RuntimeError if the interface is
+    unavailable, e.g., if GDAL was built without its NumPy bindings.
+    """
+    # Only the requested columns are decoded.
+    ignored = [k for k in layer_fields(layer) if k not in fields]
+    layer.SetIgnoredFields(ignored if geometry else ignored + ["OGR_GEOMETRY"])
+    layer.ResetReading()
+    try:
+        stream = layer.GetArrowStreamAsNumPy(options=["INCLUDE_FID=NO"])
+        geometryName = layer.GetGeometryColumn() or "wkb_geometry"
+        batches = {k: [] for k in fields}
+        wkb = []
+        for batch in stream:
+            for k in fields:
+                batches[k].append(field_column(batch[k]))
+            if geometry:
+                wkb.extend(batch[geometryName].tolist())
+    finally:
+        layer.SetIgnoredFields(list(ignoredFields))
+        layer.ResetReading()
+
+    columns = {k: np.concatenate(v) if v else np.zeros(0)
+               for (k, v) in batches.items()}
+    if geometry:
+        columns.update(geometry_columns_wkb(wkb, geometry))
+    return(columns)
+
+def read_layer_features(layer, fields, geometry):
+    """Reads a layer by iterating its features, for any GDAL version."""
+    values = {k: [] for k in fields}
+    geometries = []
+    layer.ResetReading()
+    for feature in layer:
+        for k in fields:
+            values[k].append(feature.GetField(k))
+        if geometry:
+            g = feature.GetGeometryRef()
+            geometries.append(None if g is None else g.Clone())
+    layer.ResetReading()
+
+    columns = {}
+    for k, v in values.items():
+        column = np.array(v)
+        columns[k] = column if column.dtype.kind in "biuf" else \
+            np.array(v, dtype=object)
+    columns.update(geometry_columns(geometries, geometry))
+    return(columns)
+
+def read_layer(layer, fields = None, geometry = (), ignoredFields = ()):
+    """Reads the attributes and geometry measures of a layer into arrays.
+
+    The layer is read in one pass. Where the installed GDAL supports it
+    (version 3.6 or later, with NumPy bindings), the attributes are read in
+    batches through the Arrow stream interface, and the geometry measures
+    are computed with shapely 2 if it is installed, else every feature is
+    read in Python. Both give the same columns, in the order of the
+    features.
+
+    Parameters
+    ----------
+    layer : ogr layer
+        A layer from a spatial file. Use ogr.open().GetLayer(). Attribute
+        and spatial filters of the layer are respected.
+    fields : list(str), optional
+        The fields to read. (the default is None, all fields)
+    geometry : str or list(str), optional
+        The geometry measures to compute, among "area", "envelope" (minX,
+        maxX, minY, maxY like Geometry.GetEnvelope()) and "centroid" (x, y).
+        (the default is (), none)
+    ignoredFields : list(str), optional
+        The fields ignored by the caller with layer.SetIgnoredFields(). The
+        Arrow read ignores the unread fields, and as GDAL cannot report the
+        ignored fields of a layer, these are set back after the read. (the
+        default is (), none)
+
+    Returns
+    -------
+    dict(str, numpy.array)
+        One array per field and per geometry measure. Numeric fields are
+        NumPy arrays of numbers, others are object arrays, with None for
+        null values. Features without geometry have an area of 0 and NaN
+        envelopes and centroids.
+
+    """
+    fields = layer_fields(layer) if fields is None else list(fields)
+    geometry = [geometry] if isinstance(geometry, str) else list(geometry)
+    assert all(g in GEOMETRY_COLUMNS for g in geometry), "geometry should " \
+        + "be among " + ", ".join(GEOMETRY_COLUMNS) + "."
+    if hasattr(layer, "GetArrowStreamAsNumPy"):
+        try:
+            return(read_layer_arrow(layer, fields, geometry, ignoredFields))
+        except (AttributeError, RuntimeError):
+            pass
+    return(read_layer_features(layer, fields, geometry))
@@ -1,5 +1,27 @@
 import numpy as np
 
+def minutes_per_step(resolution):
+    '''Returns the number of minutes of a timestep of resolution hours.
+
+    The chains have one time step per minute of the day, so the timestep
+    should be a whole number of minutes, e.g., 1/60, 0.25 or 1 hour.
+
+    Parameters
+    ----------
+    resolution : float
+        The resolution of the timestep in hours.
+
+    Returns
+    -------
+    int
+        The number of minutes per timestep, used with Markov.coarsen().
+
+    '''
+    minutes = int(round(resolution * 60))
+    assert minutes >= 1 and abs(resolution * 60 - minutes) < 1e-9, \
+        "the resolution should be a positive whole number of minutes."
+    return(minutes)
+
 class Markov:
     '''Class for the Markov chain.
 
@@ -15,12 +37,217 @@ class Markov:
     dim : int, optional
         The dimention at which the sum of the transition matrix add to oneself.
         (the default is 1)
+
+    Consecutive time slices of an inhomogenous chain are often identical, e.g.,
+    during the night. Only the unique slices are stored in `slices` and
+    `cumulativeSlices`, of shape (unique slices, states, states), together with
+    `sliceIndex` which maps every time step to its slice. The full `chain` and
+    `cumulativeSum` are rebuilt once, on first access, and are read-only.
+    Assign a new array to `chain` to change the transition matrix.
     '''
     def __init__(self, chain, dim = 1):
-        self.chain = chain
-        assert (self.chain.shape[0] == self.chain.shape[1]), "the transition \
+        self.dim = dim
+        self.set_chain(chain)
+
+    def set_chain(self, chain):
+        '''Stores the unique slices of a full transition matrix.
+
+        Parameters
+        ----------
+        chain : np.array(floats)
+            The transition matrix, of shape (states, states) or (states,
+            states, time steps).
+
+        Returns
+        -------
+        None
+
+        '''
+        chain = np.asarray(chain)
+        assert (chain.shape[0] == chain.shape[1]), "the transition \
             matrix should be square in the first two dimensions"
-        self.cumulativeSum = np.cumsum(self.chain, axis = dim)
+        self.numberOfStates = chain.shape[0]
+        self.denseChain = None
+        self.denseCumulativeSum = None
+        if chain.ndim == 3:
+            changed = np.any(chain[:, :, 1:] != chain[:, :, :-1], axis=(0, 1))
+            runStart = np.concatenate(([True], changed))
+            self.sliceIndex = np.cumsum(runStart) - 1
+            self.slices = np.ascontiguousarray(
+                np.moveaxis(chain[:, :, runStart], 2, 0))
+        else:
+            self.sliceIndex = None
+            self.slices = chain[np.newaxis, :, :]
+        self.cumulativeSlices = np.cumsum(self.slices, axis = self.dim + 1)
+
+    @classmethod
+    def from_slices(cls, slices, cumulativeSlices, sliceIndex = None, dim = 1):
+        '''Wraps already computed unique slices without copying them.
+
+        Use it to build a Markov chain on arrays shared between processes,
+        the cumulative sums are not recomputed.
+
+        Parameters
+        ----------
+        slices : np.array(floats)
+            The unique slices, of shape (unique slices, states, states).
+        cumulativeSlices : np.array(floats)
+            The cumulative sums of the slices along dim.
+        sliceIndex : np.array(int), optional
+            The slice of every time step. (the default is None, for a
+            homogenous chain)
+        dim : int, optional
+            The dimention at which the sum of the transition matrix add to
+            oneself. (the default is 1)
+
+        Returns
+        -------
+        Markov
+            The Markov chain.
+
+        '''
+        markov = cls.__new__(cls)
+        markov.dim = dim
+        markov.numberOfStates = slices.shape[1]
+        markov.slices = slices
+        markov.cumulativeSlices = cumulativeSlices
+        markov.sliceIndex = sliceIndex
+        markov.denseChain = None
+        markov.denseCumulativeSum = None
+        return(markov)
+
+    def unstack(self, slices):
+        '''Rebuilds the full (states, states[, time steps]) array from unique
+        slices.'''
+        if self.sliceIndex is None:
+            return(slices[0])
+        return(np.moveaxis(slices[self.sliceIndex], 0, 2))
+
+    @property
+    def chain(self):
+        '''np.array(floats): The full transition matrix, read-only.'''
+        if self.denseChain is None:
+            self.denseChain = self.unstack(self.slices)
+            self.denseChain.flags.writeable = False
+        return(self.denseChain)
+
+    @chain.setter
+    def chain(self, chain):
+        self.set_chain(chain)
+
+    @property
+    def cumulativeSum(self):
+        '''np.array(floats): The cumulative sum of the full transition matrix
+        along dim, read-only.'''
+        if self.denseCumulativeSum is None:
+            self.denseCumulativeSum = self.unstack(self.cumulativeSlices)
+            self.denseCumulativeSum.flags.writeable = False
+        return(self.denseCumulativeSum)
+
+    def slice_of(self, time_step=None):
+        '''Returns the index of the unique slice used at a time step.'''
+        if self.sliceIndex is None or time_step is None:
+            return(0)
+        return(self.sliceIndex[time_step])
+
+    def transition_matrix(self, time_step=None):
+        '''Returns the (states, states) transition matrix at a time step.
+
+        Parameters
+        ----------
+        time_step : int, optional
+            The time step of the inhomegenous Markov chain. (the default is
+            None, for homogenous chains)
+
+        Returns
+        -------
+        np.array(float)
+            The transition matrix.
+
+        '''
+        return(self.slices[self.slice_of(time_step)])
+
+    def sampled_transition_matrix(self, time_step=None):
+        '''Returns the transition matrix effectively sampled by next_state().
+
+        next_state() picks the first state whose cumulative probability
+        reaches the random number. When the rows of the chain sum to more than
+        one, e.g., after the rounding in readMatrixfiles(), the states after
+        the cumulative sum reaches one are never picked. This matrix gives the
+        probabilities next_state() actually samples from, with rows summing to
+        one. Valid for chains with dim = 1.
+
+        Parameters
+        ----------
+        time_step : int, optional
+            The time step of the inhomegenous Markov chain. (the default is
+            None, for homogenous chains)
+
+        Returns
+        -------
+        np.array(float)
+            The (states, states) transition matrix.
+
+        '''
+        cumulative = np.minimum(
+            self.cumulativeSlices[self.slice_of(time_step)], 1.0)
+        cumulative[:, -1] = 1.0
+        return(np.diff(cumulative, axis=1, prepend=0.0))
+
+    def coarsen(self, k):
+        '''Composes the transition matrices over windows of k time steps.
+
+        The transition matrix of every window is the product of the k
+        matrices of the time steps in the window, i.e., the probability of
+        being in a state k time steps later. Use the coarse chain to simulate
+        with time steps k times longer, e.g., 5, 15 or 60 minutes instead of
+        one minute. The matrices composed are those sampled by next_state()
+        (see sampled_transition_matrix()), normalized, so that the rounding
+        of the rows does not add up over the window.
+
+        The coarse chain gives the right occupancy of the states at the end of
+        every window, but a car changes its state at most once per window.
+        Trips which leave and return to the same state within one window are
+        lost, and a chain of trips within a window is replaced by one trip.
+        The number of trips and the driven distance are therefore
+        underestimated, more so for larger k. Check the error against the
+        minute model with benchmarks/coarseTimestep.py.
+
+        Parameters
+        ----------
+        k : int
+            The number of time steps per window. It should divide the number
+            of time steps of the chain.
+
+        Returns
+        -------
+        Markov
+            A Markov chain with one time step per window.
+
+        '''
+        if self.dim == 1:
+            cumulative = np.minimum(self.cumulativeSlices, 1.0)
+            cumulative[:, :, -1] = 1.0
+            slices = np.diff(cumulative, axis=2, prepend=0.0)
+        else:
+            sums = self.slices.sum(axis=1, keepdims=True)
+            slices = self.slices / np.where(sums > 0, sums, 1.0)
+        if self.sliceIndex is None:
+            composed = np.linalg.matrix_power(slices[0], k)
+            return(Markov(composed, self.dim))
+
+        numberOfTimeSteps = self.sliceIndex.shape[0]
+        assert numberOfTimeSteps % k == 0, "k should divide the number of " \
+            + "time steps of the chain."
+        windows = slices[self.sliceIndex].reshape(
+            numberOfTimeSteps // k, k, self.numberOfStates, self.numberOfStates)
+        composed = windows[:, 0]
+        for i in range(1, k):
+            if self.dim == 1:
+                composed = np.matmul(composed, windows[:, i])
+            else:
+                composed = np.matmul(windows[:, i], composed)
+        return(Markov(np.moveaxis(composed, 0, 2), self.dim))
 
 
     def extract_transition_probability(self, currentState, time_step=None):
@@ -41,10 +268,10 @@ class Markov:
             and time.
 
         '''
-        if time_step is not None:
-            return( self.cumulativeSum[currentState, :, time_step] )
-        else:
+        if time_step is None and self.sliceIndex is not None:
+            # The rows of all the time steps, of shape (states, time steps).
             return( self.cumulativeSum[currentState, :] )
+        return( self.cumulativeSlices[self.slice_of(time_step), currentState, :] )
 
 
     def next_state(self, currentState, rnd, time_step = None):
@@ -0,0 +1,225 @@
+import numpy as np
+
+
+class MobilityTrace:
+    """A compact record of the mobility of a fleet.
+
+    The trace holds the parking lot every car starts in and one arrival event
+    per trip, as columnar arrays. A car departs from its parking lot at the
+    timestep of its next arrival. The trace is enough to recompute the
+    charging load for other charging parameters with replay_charging(),
+    without simulating the mobility again.
+
+    Attributes
+    ----------
+    initialStation : numpy.array(int32)
+        The index of the parking lot every car starts in.
+    car : numpy.array(int32)
+        The car of every arrival event.
+    step : numpy.array(int32)
+        The timestep of every arrival event.
+    station : numpy.array(int32)
+        The index of the parking lot the car arrives at.
+    distance : numpy.array(float32)
+        The distance of the trip before the arrival.
+    numberOfSteps : int
+        The number of timesteps of the simulation.
+    resolution : float
+        The resolution of the timestep in hours.
+    mpg : numpy.array(float)
+        The consumption of every car, in units of energy per distance.
+    batteryCharge : numpy.array(float)
+        The battery charge of every car at the start.
+    """
+
+    def __init__(self,
+                 initialStation,
+                 car,
+                 step,
+                 station,
+                 distance,
+                 numberOfSteps,
+                 resolution,
+                 mpg,
+                 batteryCharge):
+        self.initialStation = np.asarray(initialStation, dtype=np.int32)
+        self.car = np.asarray(car, dtype=np.int32)
+        self.step = np.asarray(step, dtype=np.int32)
+        self.station = np.asarray(station, dtype=np.int32)
+        self.distance = np.asarray(distance, dtype=np.float32)
+        self.numberOfSteps = int(numberOfSteps)
+        self.resolution = float(resolution)
+        self.mpg = np.asarray(mpg, dtype=float)
+        self.batteryCharge = np.asarray(batteryCharge, dtype=float)
+
+    def save(self, fileName):
+        """Saves the trace into a NumPy .npz file."""
+        np.savez(fileName,
+                 initialStation = self.initialStation,
+                 car = self.car,
+                 step = self.step,
+                 station = self.station,
+                 distance = self.distance,
+                 numberOfSteps = self.numberOfSteps,
+                 resolution = self.resolution,
+                 mpg = self.mpg,
+                 batteryCharge = self.batteryCharge)
+
+
+def load_trace(fileName):
+    """Loads a trace saved with MobilityTrace.save().
+
+    Parameters
+    ----------
+    fileName : str
+        The name of the .npz file.
+
+    Returns
+    -------
+    MobilityTrace
+        The trace.
+
+    """
+    with np.load(fileName) as data:
+        return(MobilityTrace(**{k: data[k] for k in data.files}))
+
+
+class MobilityTraceRecorder:
+    """Records the mobility trace of a Simulation.
+
+    Add it to the observers of a Simulation, the trace is available from
+    trace() after simulate_model().
+    """
+
+    def start(self, simulation):
+        self.previousStation = simulation.car_station_index()
+        self.previousDistance = np.array([x.distance for x in simulation.cars],
+                                         dtype=float)
+        self.initialStation = self.previousStation
+        self.mpg = np.array([x.mpg for x in simulation.cars], dtype=float)
+        self.batteryCharge = np.array([x.batteryCharge for x in
+                                       simulation.cars], dtype=float)
+        self.resolution = simulation.resolution
+        self.numberOfSteps = 0
+        self.events = []
+
+    def update(self, simulation, step, time, load):
+        station = simulation.car_station_index()
+        moved = np.nonzero(station != self.previousStation)[0]
+        if moved.shape[0]:
+            distance = np.array([simulation.cars[i].distance
+                                 for i in moved.tolist()], dtype=float)
+            self.events.append((moved,
+                                np.full(moved.shape[0], step),
+                                station[moved],
+                                distance - self.previousDistance[moved]))
+            self.previousDistance[moved] = distance
+        self.previousStation = station
+        self.numberOfSteps = step + 1
+
+    def trace(self):
+        """Returns the recorded MobilityTrace."""
+        if self.events:
+            columns = [np.concatenate(x) for x in zip(*self.events)]
+        else:
+            columns = [np.zeros(0)] * 4
+        return(MobilityTrace(self.initialStation,
+                             *columns,
+                             numberOfSteps = self.numberOfSteps,
+                             resolution = self.resolution,
+                             mpg = self.mpg,
+                             batteryCharge = self.batteryCharge))
+
+
+def replay_charging(trace,
+                    chargingPower,
+                    chargingStatus,
+                    batteryCapacity = 0.0,
+                    mpg = None,
+                    batteryCharge = None):
+    """Recomputes the charging load of a recorded mobility trace.
+
+    Every car charges like in EV.charge_EV(): from its arrival, at the power
+    of its parking lot, until the battery is full or the car leaves. The
+    parking stays are processed for all cars at once, one stay per car at a
+    time, and the load is accumulated with difference arrays, so the cost
+    scales with the number of trips instead of cars x timesteps.
+
+    Parameters
+    ----------
+    trace : MobilityTrace
+        The recorded mobility.
+    chargingPower : numpy.array(float)
+        The charging power of every parking lot, in the order of stations.
+    chargingStatus : numpy.array(bool)
+        True if charging is enabled in the parking lot.
+    batteryCapacity : float or numpy.array(float), optional
+        The battery capacity of every car, see the EV class. (the default is
+        0.0)
+    mpg : float or numpy.array(float), optional
+        The consumption of every car. (the default is None, the recorded one)
+    batteryCharge : float or numpy.array(float), optional
+        The battery charge of every car at the start. (the default is None,
+        the recorded one)
+
+    Returns
+    -------
+    numpy.array(float)
+        The load of every charging station, with one column per station with
+        chargingStatus True, like Simulation.simulate_model().
+
+    """
+    chargingPower = np.asarray(chargingPower, dtype=float)
+    chargingStatus = np.asarray(chargingStatus, dtype=bool)
+    numberOfCars = trace.initialStation.shape[0]
+    numberOfSteps = trace.numberOfSteps
+    dt = trace.resolution
+    mpg = trace.mpg if mpg is None else \
+        np.broadcast_to(np.asarray(mpg, dtype=float), (numberOfCars,))
+    charge = trace.batteryCharge if batteryCharge is None else \
+        np.broadcast_to(np.asarray(batteryCharge, dtype=float), (numberOfCars,))
+    capacity = np.broadcast_to(np.asarray(batteryCapacity, dtype=float),
+                               (numberOfCars,))
+
+    # One parking stay per row: the initial stays and one stay per arrival.
+    car = np.concatenate((np.arange(numberOfCars), trace.car))
+    start = np.concatenate((np.zeros(numberOfCars, dtype=int), trace.step))
+    station = np.concatenate((trace.initialStation, trace.station))
+    energy = np.concatenate((np.zeros(numberOfCars),
+                             trace.distance * mpg[trace.car]))
+    order = np.lexsort((start, car))
+    car, start, station, energy = car[order], start[order], station[order], \
+        energy[order]
+    end = np.full(car.shape[0], numberOfSteps)
+    sameCar = car[1:] == car[:-1]
+    end[:-1][sameCar] = start[1:][sameCar]
+    firstStay = np.ones(car.shape[0], dtype=bool)
+    firstStay[1:] = ~sameCar
+    rank = np.arange(car.shape[0]) - np.maximum.accumulate(
+        np.where(firstStay, np.arange(car.shape[0]), 0))
+
+    deficit = capacity - charge
+    difference = np.zeros((numberOfSteps + 2, chargingPower.shape[0]))
+    for k in range(rank.max() + 1 if rank.shape[0] else 0):
+        stay = np.nonzero(rank == k)[0]
+        c, s = car[stay], station[stay]
+        deficit[c] += energy[stay]
+        power = np.where(chargingStatus[s] & (deficit[c] > 0),
+                         chargingPower[s], 0.0)
+        stepEnergy = power * dt
+        length = end[stay] - start[stay]
+        fullSteps = np.minimum(np.floor(np.divide(deficit[c], stepEnergy,
+                                                  out=np.zeros(stay.shape[0]),
+                                                  where=stepEnergy > 0)),
+                               length).astype(int)
+        remainder = np.where(fullSteps < length,
+                             deficit[c] - fullSteps * stepEnergy, 0.0)
+        remainder = np.where(stepEnergy > 0, remainder, 0.0)
+
+        np.add.at(difference, (start[stay], s), power)
+        np.add.at(difference, (start[stay] + fullSteps, s), remainder / dt - power)
+        np.add.at(difference, (start[stay] + fullSteps + 1, s), -remainder / dt)
+        deficit[c] -= fullSteps * stepEnergy + remainder
+
+    load = np.cumsum(difference, axis=0)[:numberOfSteps]
+    return(load[:, chargingStatus])
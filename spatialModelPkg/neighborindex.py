@@ -0,0 +1,303 @@
+import math
+import random as rnd
+import numpy as np
+
+# The fractional part of the golden ratio, used to derive the next uniform
+# number of a rejected draw from the previous one.
+GOLDEN = (math.sqrt(5) - 1) / 2
+
+class GridIndex:
+    """A uniform grid over points in the plane, for nearest neighbor queries.
+
+    The points are sorted by grid cell, and every cell holds the range of its
+    points in that order. A query visits the cells in rings of growing size
+    around the query point, and stops as soon as no unvisited point can be
+    nearer than the neighbors found.
+
+    Attributes
+    ----------
+    points : numpy.array(float)
+        The coordinates of the points, of shape (points, 2).
+    cellSize : float, optional
+        The side of a grid cell. (the default is None, a size which holds
+        about 8 points per cell on average)
+    """
+
+    def __init__(self, points, cellSize = None):
+        self.points = np.asarray(points, dtype=float).reshape(-1, 2)
+        numberOfPoints = self.points.shape[0]
+        if cellSize is None:
+            extent = self.points.max(0) - self.points.min(0) \
+                if numberOfPoints else np.zeros(2)
+            area = max(float(extent[0] * extent[1]),
+                       float(extent.max())**2 / max(numberOfPoints, 1))
+            cellSize = math.sqrt(8 * area / max(numberOfPoints, 1)) or 1.0
+        self.cellSize = cellSize
+
+        cells = np.floor(self.points / self.cellSize).astype(np.int64)
+        self.order = np.lexsort((cells[:, 1], cells[:, 0]))
+        sortedCells = cells[self.order]
+        first = np.ones(numberOfPoints, dtype=bool)
+        first[1:] = np.any(sortedCells[1:] != sortedCells[:-1], axis=1)
+        starts = np.nonzero(first)[0]
+        ends = np.append(starts[1:], numberOfPoints)
+        self.cells = {tuple(c): (s, e) for (c, s, e) in
+                      zip(sortedCells[starts].tolist(), starts.tolist(),
+                          ends.tolist())}
+        self.minCell = cells.min(0) if numberOfPoints else np.zeros(2, dtype=int)
+        self.maxCell = cells.max(0) if numberOfPoints else np.zeros(2, dtype=int)
+
+    def ring(self, cell, radius):
+        """Returns the indices of the points in the cells at a Chebyshev
+        distance radius from cell."""
+        cx, cy = cell
+        if radius == 0:
+            keys = [(cx, cy)]
+        else:
+            side = range(-radius, radius + 1)
+            keys = [(cx + i, cy - radius) for i in side] \
+                + [(cx + i, cy + radius) for i in side] \
+                + [(cx - radius, cy + j) for j in side[1:-1]] \
+                + [(cx + radius, cy + j) for j in side[1:-1]]
+        ranges = [self.cells[k] for k in keys if k in self.cells]
+        if not ranges:
+            return(np.zeros(0, dtype=int))
+        return(np.concatenate([self.order[s:e] for (s, e) in ranges]))
+
+    def query(self, point, k, maxDistance = np.inf, minDistance = -1.0):
+        """Finds the nearest points.
+
+        Parameters
+        ----------
+        point : numpy.array(float)
+            The coordinates of the query point.
+        k : int
+            The maximum number of neighbors.
+        maxDistance : float, optional
+            The maximum distance of a neighbor. (the default is np.inf)
+        minDistance : float, optional
+            Points at this distance or nearer are skipped, e.g., 0.0 skips
+            the points at the query point. (the default is -1.0, none)
+
+        Returns
+        -------
+        (numpy.array(int), numpy.array(float))
+            The indices of the neighbors and their distances, nearest first.
+
+        """
+        point = np.asarray(point, dtype=float)
+        cell = np.floor(point / self.cellSize).astype(np.int64)
+        # Beyond this radius, the rings hold no more points.
+        lastRadius = int(max(np.max(np.abs(cell - self.minCell)),
+                             np.max(np.abs(cell - self.maxCell))))
+        found = []
+        numberFound = 0
+        kth = np.inf
+        for radius in range(lastRadius + 1):
+            # The points of this ring and beyond are at least this far.
+            bound = (radius - 1) * self.cellSize
+            if bound > maxDistance or (numberFound >= k and kth <= bound):
+                break
+            indices = self.ring(cell, radius)
+            if indices.shape[0]:
+                found.append(indices)
+                numberFound += indices.shape[0]
+                if numberFound >= k:
+                    candidates = np.concatenate(found)
+                    distances = np.hypot(*(self.points[candidates] - point).T)
+                    distances = distances[distances > minDistance]
+                    numberFound = distances.shape[0]
+                    if numberFound >= k:
+                        kth = np.partition(distances, k - 1)[k - 1]
+
+        if not found:
+            return(np.zeros(0, dtype=int), np.zeros(0))
+        candidates = np.concatenate(found)
+        distances = np.hypot(*(self.points[candidates] - point).T)
+        keep = np.nonzero((distances <= maxDistance)
+                          & (distances > minDistance))[0]
+        keep = keep[np.argsort(distances[keep], kind='stable')[:k]]
+        return(candidates[keep], distances[keep])
+
+
+class NeighborIndex:
+    """Samples the destination of trips with a distance-decay (gravity) model.
+
+    For every parking lot (origin) and every state, the nearest parking lots
+    of that state are found once with a GridIndex and stored as a truncated
+    neighbor list, with the cumulative weights
+
+        maximumOccupancy * exp(-distance / decayDistance)
+
+    of the destinations. A destination is then drawn by a binary search in
+    the cumulative weights of the origin, so a trip costs O(log
+    maxNeighbors) instead of O(stations). Destinations at minDistance or
+    nearer are left out of the lists, among them the parking lots of the
+    parcel of the origin, which share its coordinates, so trips have a
+    length. Full destinations are rejected and redrawn; after maxTries
+    rejections the destination is drawn among the free neighbors, and if none
+    is free, with up to maxTries uniform draws among all the parking lots of
+    the state like EV.change_location(). If these are full too, the car
+    stays, so a trip never costs O(stations).
+
+    Attributes
+    ----------
+    stations : OrderedDict(ParkingLot)
+        The parking lots of the city.
+    coordinates : numpy.array(float)
+        The coordinates of every parking lot, in the order of stations, of
+        shape (stations, 2), e.g., the centroids of their parcels (see
+        auxiliary.get_features_centroids()).
+    decayDistance : float, optional
+        The distance over which the attraction of a destination decreases by
+        a factor e, in units of trip distance. (the default is 2.0 km)
+    maxNeighbors : int, optional
+        The length of the neighbor lists. (the default is 64)
+    maxDistance : float, optional
+        The maximum distance of a trip, in units of trip distance. (the
+        default is np.inf)
+    scale : float, optional
+        Converts the distances between coordinates into trip distances, e.g.,
+        1/1000 from meters to kilometers. Multiply it by a detour factor to
+        account for the road network. (the default is 1/1000)
+    maxTries : int, optional
+        The number of draws before falling back to the free neighbors, and
+        of uniform draws after. (the default is 8)
+    minDistance : float, optional
+        Destinations at this trip distance or nearer are never drawn.
+        (the default is 0.0, the destinations at the origin)
+    """
+
+    def __init__(self,
+                 stations,
+                 coordinates,
+                 decayDistance = 2.0,
+                 maxNeighbors = 64,
+                 maxDistance = np.inf,
+                 scale = 1/1000,
+                 maxTries = 8,
+                 minDistance = 0.0):
+        self.keys = list(stations.keys())
+        self.stationIndex = {k: i for (i, k) in enumerate(self.keys)}
+        self.coordinates = np.asarray(coordinates, dtype=float)
+        assert self.coordinates.shape == (len(self.keys), 2), "coordinates " \
+            + "should have one row of (x, y) per parking lot."
+        self.scale = scale
+        self.maxTries = maxTries
+        self.minDistance = minDistance
+
+        state = np.array([v.state for v in stations.values()])
+        capacity = np.array([v.maximumOccupancy for v in stations.values()],
+                            dtype=float)
+        self.states = np.unique(state)
+        self.stateIndex = {s: i for (i, s) in enumerate(self.states.tolist())}
+        numberOfStates = self.states.shape[0]
+
+        # The parking lots of a parcel share their coordinates, so the
+        # neighbor lists are built once per location.
+        locations, self.locationOfStation = np.unique(self.coordinates, axis=0,
+                                                      return_inverse=True)
+        self.locationOfStation = self.locationOfStation.ravel()
+        neighbors = [[None] * numberOfStates for i in range(locations.shape[0])]
+        distances = [[None] * numberOfStates for i in range(locations.shape[0])]
+        # The parking lots of every state, for the uniform draws.
+        self.members = []
+        for j, s in enumerate(self.states.tolist()):
+            members = np.nonzero(state == s)[0]
+            self.members.append(members)
+            grid = GridIndex(self.coordinates[members])
+            for i, location in enumerate(locations):
+                found, d = grid.query(location, maxNeighbors, maxDistance / scale,
+                                      minDistance / scale)
+                neighbors[i][j] = members[found]
+                distances[i][j] = d * scale
+
+        # The neighbor lists in compressed sparse row format, one row per
+        # location and state.
+        rows = [n for row in neighbors for n in row]
+        self.rowStart = np.zeros(len(rows) + 1, dtype=np.int64)
+        self.rowStart[1:] = np.cumsum([n.shape[0] for n in rows])
+        self.neighbors = np.concatenate(rows).astype(np.int64)
+        self.distances = np.concatenate([d for row in distances for d in row])
+
+        weights = capacity[self.neighbors] * np.exp(-self.distances
+                                                    / decayDistance)
+        cumulative = np.cumsum(weights)
+        # Restart the cumulative sum on every row.
+        rowOffset = np.repeat(np.concatenate(([0.0], cumulative))[self.rowStart[:-1]],
+                              np.diff(self.rowStart))
+        self.cumulativeWeights = cumulative - rowOffset
+
+    def row(self, origin, state):
+        """Returns the slice of the neighbor list of an origin and a state."""
+        r = self.locationOfStation[self.stationIndex[origin]] \
+            * self.states.shape[0] + self.stateIndex[state]
+        return(slice(self.rowStart[r], self.rowStart[r + 1]))
+
+    def distance(self, origin, destination):
+        """Returns the trip distance between two parking lots."""
+        difference = self.coordinates[self.stationIndex[origin]] \
+            - self.coordinates[self.stationIndex[destination]]
+        return(float(np.hypot(*difference)) * self.scale)
+
+    def sample(self, origin, state, stations, rndStation = None):
+        """Draws a free destination and the distance to it.
+
+        Parameters
+        ----------
+        origin : -
+            The key of the parking lot the trip starts from.
+        state : int
+            The state of the destination.
+        stations : OrderedDict(ParkingLot)
+            The parking lots, with their current occupancy.
+        rndStation : float, optional
+            A uniform random number. Rejected draws use the next numbers of
+            the additive sequence rndStation + k * 0.618... modulo 1. (the
+            default is None, which uses the random module)
+
+        Returns
+        -------
+        (-, float) or None
+            The key of the destination and the trip distance, or None if no
+            free parking lot of the state was found.
+
+        """
+        u = rnd.random() if rndStation is None else rndStation
+        if state not in self.stateIndex:
+            return(None)
+        rows = self.row(origin, state)
+        cumulative = self.cumulativeWeights[rows]
+        neighbors = self.neighbors[rows]
+        if cumulative.shape[0]:
+            total = cumulative[-1]
+            for k in range(self.maxTries):
+                j = min(int(np.searchsorted(cumulative, ((u + k * GOLDEN) % 1.0)
+                                            * total, side='right')),
+                        cumulative.shape[0] - 1)
+                lot = stations[self.keys[neighbors[j]]]
+                if lot.currentOccupancy < lot.maximumOccupancy:
+                    return(self.keys[neighbors[j]], float(self.distances[rows][j]))
+
+            weights = np.diff(cumulative, prepend=0.0)
+            free = np.array([stations[self.keys[n]].currentOccupancy <
+                             stations[self.keys[n]].maximumOccupancy
+                             for n in neighbors.tolist()])
+            if free.any() and np.any(weights[free] > 0):
+                cumulativeFree = np.cumsum(np.where(free, weights, 0.0))
+                j = min(int(np.searchsorted(cumulativeFree,
+                                            u * cumulativeFree[-1],
+                                            side='right')),
+                        cumulative.shape[0] - 1)
+                return(self.keys[neighbors[j]], float(self.distances[rows][j]))
+
+        members = self.members[self.stateIndex[state]]
+        for k in range(self.maxTries):
+            destination = self.keys[members[int(((u + k * GOLDEN) % 1.0)
+                                                * members.shape[0])]]
+            lot = stations[destination]
+            distance = self.distance(origin, destination)
+            if lot.currentOccupancy < lot.maximumOccupancy and \
+                    distance > self.minDistance:
+                return(destination, distance)
+        return(None)
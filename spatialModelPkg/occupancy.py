@@ -0,0 +1,79 @@
+import numpy as np
+
+
+class OccupancyRecorder:
+    """Records the occupancy of the parking lots and the blocked moves.
+
+    Add it to the observers of a Simulation. After every timestep the cars
+    are counted per parking lot and per state with np.bincount over their
+    locations, and the moves blocked because no parking lot of the new state
+    was free are counted per new state. The counts are stored in integer
+    arrays preallocated for the whole horizon, with the smallest unsigned
+    type which fits the fleet.
+
+    Attributes
+    ----------
+    perStation : bool, optional
+        If False, only the occupancy per state and the peak occupancy of every
+        parking lot are kept, not the occupancy of every parking lot at every
+        timestep. (the default is True)
+    stationOccupancy : numpy.array(int)
+        The number of cars in every parking lot at every timestep, of shape
+        (timesteps, stations), if perStation.
+    stateOccupancy : numpy.array(int)
+        The number of cars in every state at every timestep, of shape
+        (timesteps, states).
+    blockedMoves : numpy.array(int)
+        The number of blocked moves towards every state at every timestep, of
+        shape (timesteps, states).
+    peakOccupancy : numpy.array(int)
+        The largest number of cars in every parking lot over the horizon.
+    """
+
+    def __init__(self, perStation = True):
+        self.perStation = perStation
+
+    def start(self, simulation):
+        numberOfSteps = simulation.timeSteps.shape[0]
+        self.stationState = np.array([v.state for v in
+                                      simulation.stations.values()], dtype=int)
+        self.maximumOccupancy = np.array([v.maximumOccupancy for v in
+                                          simulation.stations.values()])
+        numberOfStations = self.stationState.shape[0]
+        numberOfStates = self.stationState.max() + 1 if numberOfStations else 0
+        dtype = np.min_scalar_type(max(simulation.numCars, 1))
+        self.stationOccupancy = np.zeros((numberOfSteps if self.perStation
+                                          else 0, numberOfStations), dtype=dtype)
+        self.stateOccupancy = np.zeros((numberOfSteps, numberOfStates),
+                                       dtype=dtype)
+        self.blockedMoves = np.zeros((numberOfSteps, numberOfStates),
+                                     dtype=dtype)
+        self.peakOccupancy = np.zeros(numberOfStations, dtype=dtype)
+        self.carBlockedMoves = np.array([x.blockedMoves for x in
+                                         simulation.cars], dtype=np.int64)
+
+    def update(self, simulation, step, time, load):
+        occupancy = np.bincount(simulation.car_station_index(),
+                                minlength=self.stationState.shape[0])
+        if self.perStation:
+            self.stationOccupancy[step] = occupancy
+        np.maximum(self.peakOccupancy, occupancy, out=self.peakOccupancy,
+                   casting='unsafe')
+        self.stateOccupancy[step] = np.bincount(
+            self.stationState, weights=occupancy,
+            minlength=self.stateOccupancy.shape[1])
+
+        carBlockedMoves = np.fromiter((x.blockedMoves for x in simulation.cars),
+                                      dtype=np.int64, count=simulation.numCars)
+        blocked = np.nonzero(carBlockedMoves != self.carBlockedMoves)[0]
+        if blocked.shape[0]:
+            blockedState = [simulation.cars[i].blockedState
+                            for i in blocked.tolist()]
+            self.blockedMoves[step] = np.bincount(
+                blockedState, minlength=self.blockedMoves.shape[1])
+        self.carBlockedMoves = carBlockedMoves
+
+    def utilization(self):
+        """Returns the peak occupancy of every parking lot divided by its
+        capacity, e.g., to find undersized parking lots."""
+        return(self.peakOccupancy / np.maximum(self.maximumOccupancy, 1))
@@ -0,0 +1,354 @@
+import numpy as np
+
+LEVELS = ("station", "area", "total")
+
+# The width of the first bins of the histograms, relative to the capacity of
+# the series divided by the number of bins.
+FIRST_BIN_WIDTH = 2.0**-10
+
+def coarsen(histogram, binWidth, rows):
+    """Merges the pairs of bins of some rows of the histograms, which
+    doubles their width and range, in place."""
+    half = histogram.shape[1] // 2
+    merged = histogram[rows].reshape(-1, half, 2).sum(2)
+    histogram[rows] = np.concatenate((merged, np.zeros_like(merged)), axis=1)
+    binWidth[rows] *= 2
+
+
+class PeakStatistics:
+    """Streaming peak, top-k and load-duration statistics of the load.
+
+    Add it to the observers of a Simulation, with storeResults False to run
+    without the load matrix. Every timestep, the load of the charging
+    stations is summed per area and in total, and for every series (station,
+    area and total) the sink updates the peak and its timestep, the k largest
+    distinct peaks and their timesteps, and a histogram of the load over
+    numberOfBins bins, from which the load-duration curve is read.
+
+    The k largest peaks are declustered: a load within minSeparation
+    timesteps of a kept peak belongs to the same peak and only replaces it
+    if it is higher, so one broad peak is not counted at every timestep.
+    The bins of a histogram start at a fraction of the capacity of the
+    series (the charging power times the number of parking places), and
+    their width is doubled by merging pairs of bins whenever a load exceeds
+    the range, so the largest load is in the upper half of the bins, unless
+    all the loads are in the first range.
+
+    Statistics of replicates of the same scenario are combined with merge().
+    Statistics of shards of one run with disjoint stations, e.g., the tiles
+    of a city, are combined with merge_shard(), which needs the area and
+    total series kept with keepSeries.
+
+    Attributes
+    ----------
+    areaOfStation : numpy.array(int), optional
+        The area of every charging station, in the order of the columns of
+        the load. (the default is None, no areas)
+    numberOfAreas : int, optional
+        The number of areas. (the default is None, one more than the largest
+        area in areaOfStation)
+    k : int, optional
+        The number of largest peaks kept per series. (the default is 10)
+    numberOfBins : int, optional
+        The number of bins of the load-duration curves, even. (the default
+        is 100)
+    keepSeries : bool, optional
+        If True, the area and total load of every timestep are kept, for
+        merge_shard(). (the default is False)
+    minSeparation : int, optional
+        The number of timesteps between two distinct peaks. (the default is
+        60, one hour at a resolution of one minute)
+    """
+
+    def __init__(self,
+                 areaOfStation = None,
+                 numberOfAreas = None,
+                 k = 10,
+                 numberOfBins = 100,
+                 keepSeries = False,
+                 minSeparation = 60):
+        self.areaOfStation = None if areaOfStation is None else \
+            np.asarray(areaOfStation, dtype=int)
+        self.numberOfAreas = numberOfAreas
+        if self.numberOfAreas is None:
+            self.numberOfAreas = 0 if self.areaOfStation is None or \
+                self.areaOfStation.shape[0] == 0 else \
+                int(self.areaOfStation.max()) + 1
+        assert numberOfBins >= 2 and numberOfBins % 2 == 0, "numberOfBins " \
+            + "should be even."
+        self.k = k
+        self.numberOfBins = numberOfBins
+        self.keepSeries = keepSeries
+        self.minSeparation = minSeparation
+
+    def start(self, simulation):
+        capacity = np.array([v.chargingPower * v.maximumOccupancy for v in
+                             simulation.stations.values()
+                             if v.chargingStatus == True], dtype=float)
+        self.timeSteps = simulation.timeSteps
+        self.reset(capacity, simulation.timeSteps.shape[0])
+
+    def reset(self, capacity, numberOfSteps):
+        """Clears the statistics.
+
+        Parameters
+        ----------
+        capacity : numpy.array(float)
+            The largest possible load of every station.
+        numberOfSteps : int
+            The number of timesteps, for the series.
+
+        Returns
+        -------
+        None
+
+        """
+        self.numberOfStations = capacity.shape[0]
+        if self.areaOfStation is None:
+            self.areaOfStation = np.zeros(self.numberOfStations, dtype=int)
+        assert self.areaOfStation.shape[0] == self.numberOfStations, \
+            "areaOfStation should have one area per charging station."
+        self.capacity = np.concatenate((
+            capacity,
+            np.bincount(self.areaOfStation, weights=capacity,
+                        minlength=self.numberOfAreas)[:self.numberOfAreas],
+            [capacity.sum()]))
+        numberOfSeries = self.capacity.shape[0]
+        self.numberOfSteps = 0
+        self.replicates = 1
+        self.maximum = np.zeros(numberOfSeries)
+        self.maximumStep = np.zeros(numberOfSeries, dtype=np.int64)
+        self.peakSum = np.zeros(numberOfSeries)
+        self.topLoad = np.full((numberOfSeries, self.k), -np.inf)
+        self.topStep = np.full((numberOfSeries, self.k), -1, dtype=np.int64)
+        self.histogram = np.zeros((numberOfSeries, self.numberOfBins),
+                                  dtype=np.int64)
+        self.binWidth = np.where(self.capacity > 0, self.capacity, 1.0) \
+            / self.numberOfBins * FIRST_BIN_WIDTH
+        self.series = np.zeros((numberOfSteps if self.keepSeries else 0,
+                                self.numberOfAreas + 1))
+
+    def level(self, level):
+        """Returns the slice of the series of a level, among LEVELS."""
+        areas = self.numberOfStations + self.numberOfAreas
+        return({"station": slice(0, self.numberOfStations),
+                "area": slice(self.numberOfStations, areas),
+                "total": slice(areas, areas + 1)}[level])
+
+    def update(self, simulation, step, time, load):
+        self.add(load, step)
+
+    def add(self, load, step):
+        """Adds the load of the charging stations at one timestep."""
+        aggregated = np.concatenate((
+            np.bincount(self.areaOfStation, weights=load,
+                        minlength=self.numberOfAreas)[:self.numberOfAreas],
+            [load.sum()]))
+        if self.keepSeries:
+            self.series[step] = aggregated
+        self.add_series(np.concatenate((load, aggregated)), step,
+                        slice(None))
+
+    def add_series(self, values, step, series):
+        """Updates the statistics of some series with their value at one
+        timestep."""
+        maximum = self.maximum[series]
+        higher = values > maximum
+        maximum[higher] = values[higher]
+        self.maximum[series] = maximum
+        maximumStep = self.maximumStep[series]
+        maximumStep[higher] = step
+        self.maximumStep[series] = maximumStep
+        self.peakSum[series] = self.maximum[series]
+
+        # A kept peak within minSeparation timesteps is the same peak, and is
+        # replaced if exceeded. The kept peaks are further apart, so there is
+        # at most one. Else the smallest kept peak is replaced if exceeded.
+        topLoad = self.topLoad[series]
+        topStep = self.topStep[series]
+        near = (topStep >= 0) & (np.abs(step - topStep) < self.minSeparation)
+        replaced = np.where(near.any(1), near.argmax(1), topLoad.argmin(1))
+        rows = np.nonzero(values > topLoad[np.arange(topLoad.shape[0]),
+                                           replaced])[0]
+        topLoad[rows, replaced[rows]] = values[rows]
+        topStep[rows, replaced[rows]] = step
+        self.topLoad[series] = topLoad
+        self.topStep[series] = topStep
+
+        histogram = self.histogram[series]
+        binWidth = self.binWidth[series]
+        rows = np.nonzero(values >= binWidth * self.numberOfBins)[0]
+        while rows.shape[0]:
+            coarsen(histogram, binWidth, rows)
+            rows = rows[values[rows] >= binWidth[rows] * self.numberOfBins]
+        bins = np.clip((values / binWidth).astype(np.int64), 0,
+                       self.numberOfBins - 1)
+        histogram[np.arange(bins.shape[0]), bins] += 1
+        self.histogram[series] = histogram
+        self.binWidth[series] = binWidth
+        self.numberOfSteps = max(self.numberOfSteps, step + 1)
+
+    def peaks(self, level = "total"):
+        """Returns the peak load of every series of a level, averaged over
+        the merged replicates."""
+        return(self.peakSum[self.level(level)] / self.replicates)
+
+    def top_peaks(self, level = "total"):
+        """Returns the k largest distinct peaks of every series of a level
+        and their timesteps, largest first.
+
+        Returns
+        -------
+        (numpy.array(float), numpy.array(int))
+            The loads and the timesteps, of shape (series, k). Missing
+            entries have a load of -inf and a timestep of -1.
+
+        """
+        series = self.level(level)
+        order = np.argsort(-self.topLoad[series], axis=1, kind='stable')
+        return(np.take_along_axis(self.topLoad[series], order, 1),
+               np.take_along_axis(self.topStep[series], order, 1))
+
+    def coincidence_factors(self):
+        """Returns the coincidence factor of every area and of the total.
+
+        The coincidence factor is the peak of the summed load (coincident
+        peak) divided by the sum of the peaks of the stations (non-coincident
+        peak).
+
+        Returns
+        -------
+        (numpy.array(float), float)
+            The factors of the areas and of the total.
+
+        """
+        stationPeaks = self.peaks("station")
+        nonCoincident = np.bincount(self.areaOfStation, weights=stationPeaks,
+                                    minlength=self.numberOfAreas)[:self.numberOfAreas]
+        areaFactors = self.peaks("area") / np.where(nonCoincident > 0,
+                                                    nonCoincident, np.inf)
+        total = stationPeaks.sum()
+        return(areaFactors, float(self.peaks("total")[0] / total)
+               if total > 0 else 0.0)
+
+    def load_duration(self, level = "total", index = 0):
+        """Returns the load-duration curve of a series.
+
+        Parameters
+        ----------
+        level : str, optional
+            "station", "area" or "total". (the default is "total")
+        index : int, optional
+            The station or area. (the default is 0)
+
+        Returns
+        -------
+        (numpy.array(float), numpy.array(float))
+            The lower edges of the load bins and the fraction of the
+            timesteps with a load in or above every bin.
+
+        """
+        series = np.arange(self.capacity.shape[0])[self.level(level)][index]
+        counts = self.histogram[series]
+        exceeded = np.cumsum(counts[::-1])[::-1] / max(counts.sum(), 1)
+        edges = np.arange(self.numberOfBins) * self.binWidth[series]
+        return(edges, exceeded)
+
+    def merge(self, other):
+        """Combines the statistics of another replicate of the scenario.
+
+        The peaks are averaged over the replicates, the k largest peaks are
+        the largest of both, and the histograms are added, after merging the
+        bins of the finer one to the width of the other.
+
+        Parameters
+        ----------
+        other : PeakStatistics
+            The statistics of a replicate with the same stations and areas.
+
+        Returns
+        -------
+        PeakStatistics
+            self, with the merged statistics.
+
+        """
+        assert np.array_equal(self.capacity, other.capacity) and \
+            np.array_equal(self.areaOfStation, other.areaOfStation), \
+            "the replicates should have the same stations and areas."
+        higher = other.maximum > self.maximum
+        self.maximum[higher] = other.maximum[higher]
+        self.maximumStep[higher] = other.maximumStep[higher]
+        self.peakSum += other.peakSum
+        self.replicates += other.replicates
+        load = np.concatenate((self.topLoad, other.topLoad), axis=1)
+        step = np.concatenate((self.topStep, other.topStep), axis=1)
+        largest = np.argsort(-load, axis=1, kind='stable')[:, :self.k]
+        self.topLoad = np.take_along_axis(load, largest, 1)
+        self.topStep = np.take_along_axis(step, largest, 1)
+        histogram, binWidth = other.histogram.copy(), other.binWidth.copy()
+        for (h, w, target) in ((self.histogram, self.binWidth, binWidth),
+                               (histogram, binWidth, self.binWidth)):
+            rows = np.nonzero(w < target)[0]
+            while rows.shape[0]:
+                coarsen(h, w, rows)
+                rows = rows[w[rows] < target[rows]]
+        self.histogram += histogram
+        self.numberOfSteps = max(self.numberOfSteps, other.numberOfSteps)
+        self.series = np.zeros((0, self.numberOfAreas + 1))
+        return(self)
+
+    def merge_shard(self, other):
+        """Combines the statistics of another shard of the same run.
+
+        The shards hold disjoint stations over the same timesteps, and the
+        same numbering of the areas. The statistics of the stations are
+        joined, and those of the areas and the total are recomputed from the
+        summed series.
+
+        Parameters
+        ----------
+        other : PeakStatistics
+            The statistics of the other shard, with keepSeries.
+
+        Returns
+        -------
+        PeakStatistics
+            self, with the stations of other appended.
+
+        """
+        assert self.keepSeries and other.keepSeries, "merge_shard() needs " \
+            + "the series, set keepSeries."
+        assert self.replicates == other.replicates == 1, "merge shards " \
+            + "before merging replicates."
+        assert self.numberOfAreas == other.numberOfAreas and \
+            self.series.shape == other.series.shape, "the shards should " \
+            + "have the same areas and timesteps."
+        stations, otherStations = self.level("station"), other.level("station")
+        series = self.series + other.series
+
+        def join(x, y):
+            return(np.concatenate((x[stations], y[otherStations])))
+
+        merged = PeakStatistics(np.concatenate((self.areaOfStation,
+                                                other.areaOfStation)),
+                                self.numberOfAreas, self.k,
+                                self.numberOfBins, keepSeries = True,
+                                minSeparation = self.minSeparation)
+        merged.reset(join(self.capacity, other.capacity), series.shape[0])
+        stationSeries = merged.level("station")
+        merged.maximum[stationSeries] = join(self.maximum, other.maximum)
+        merged.maximumStep[stationSeries] = join(self.maximumStep,
+                                                 other.maximumStep)
+        merged.peakSum[stationSeries] = join(self.peakSum, other.peakSum)
+        merged.topLoad[stationSeries] = join(self.topLoad, other.topLoad)
+        merged.topStep[stationSeries] = join(self.topStep, other.topStep)
+        merged.histogram[stationSeries] = join(self.histogram, other.histogram)
+        merged.binWidth[stationSeries] = join(self.binWidth, other.binWidth)
+        merged.series = series
+        aggregated = slice(merged.numberOfStations, None)
+        for step in range(max(self.numberOfSteps, other.numberOfSteps)):
+            merged.add_series(series[step], step, aggregated)
+        if hasattr(self, "timeSteps"):
+            merged.timeSteps = self.timeSteps
+        self.__dict__.update(merged.__dict__)
+        return(self)
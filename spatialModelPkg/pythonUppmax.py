@@ -1,7 +1,6 @@
 import numpy as np
 import os
-from .parkinglot import ParkingLot
-from math import ceil
+from .stationtable import create_station_table
 
 
 def create_charging_stations(identitiesArray,
@@ -11,36 +10,19 @@ def create_charging_stations(identitiesArray,
                              charging_status = True,
                              charging_power = 3.7):
 
-    if type(charging_status) is bool:
-        charging_status = [charging_status for i in range(len(identitiesArray))]
-    if type(charging_power) is int or type(charging_power) is float:
-        charging_power = [charging_power for i in range(len(identitiesArray))]
-    if type(areaPerCar) is int or type(areaPerCar) is float:
-        areaPerCar = [areaPerCar for i in range(len(identitiesArray))]
-
-    ids = list(identitiesArray)
-    stations = []
-    for st in range(percentageOfStates.shape[1]):
-
-        stations_temp = [ParkingLot(ID = str(ids[i]) + "-" + str(st),
-                               state = st,
-                               chargingPower = charging_power[i],
-                               maximumOccupancy = ceil(
-                                   1.0/areaPerCar[i] * percentageOfStates[i,st]
-                                   * areas[i]),
-                               currentOccupancy = 0,
-                               chargingStatus = charging_status,
-                               currentLoad = 0.0)
-                    for i in range(len(identitiesArray)) if percentageOfStates[i,st] != 0]
-
-        stations.extend(stations_temp)
-    return(stations)
+    stationTable = create_station_table(identitiesArray,
+                                        areas,
+                                        percentageOfStates,
+                                        areaPerCar,
+                                        charging_status,
+                                        charging_power)
+    return(stationTable.to_parking_lots())
 
 def collect_stations_results(ID, results, stations):
     results_temp = np.copy(results)
     lengthOfSimulation = results_temp.shape[0]
     IDs = list(ID)
-    stationsIDs = [x.ID for x in stations]
+    stationsIDs = [v.ID for (k,v) in stations.items()]
     final_results = np.zeros((lengthOfSimulation,len(IDs)))
 
     for i, id in enumerate(IDs):
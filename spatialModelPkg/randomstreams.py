@@ -0,0 +1,191 @@
+import numpy as np
+
+# The purposes random numbers are drawn for. Every purpose has its own stream
+# so that, e.g., changing how stations are picked does not change the trips.
+STATE = 0
+DISTANCE = 1
+STATION = 2
+
+def splitmix64(x):
+    """The SplitMix64 finalizer, a bijective mixing function of uint64 arrays.
+
+    Parameters
+    ----------
+    x : numpy.array(uint64)
+        The values to mix.
+
+    Returns
+    -------
+    numpy.array(uint64)
+        The mixed values.
+
+    """
+    with np.errstate(over='ignore'):
+        z = x + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return(z ^ (z >> np.uint64(31)))
+
+class RandomStreams:
+    '''Random numbers of a simulation, drawn for all cars at once.
+
+    Two modes are available:
+
+    * "block": the random numbers are drawn from NumPy Generators in blocks of
+      (blockSize timesteps x carsPerChunk cars). Every block is seeded from
+      (seed, purpose, block number, chunk of cars), so blocks can be
+      regenerated in any order, and a process only draws the chunks of the
+      cars it simulates. The numbers of a car are drawn consecutively within
+      its chunk.
+    * "counter": every random number is a hash of (seed, purpose, step, car),
+      each hashed at its own level. No block is held in memory.
+
+    In both modes a car gets the same random numbers however the fleet is
+    split across processes or threads, as long as it keeps its car index.
+    Different seeds and purposes give different streams, see
+    streams_are_distinct().
+
+    Runs of several scenarios with streams of the same seed use common random
+    numbers: a car makes the same draws in every scenario. Streams with
+    antithetic True return 1 - u instead of every number u, so a replicate
+    with the same seed and the antithetic streams is negatively correlated
+    with the replicate of the plain streams.
+
+    Attributes
+    ----------
+    seed : int
+        The seed of the streams, a non-negative integer.
+    mode : str, optional
+        "block" or "counter". (the default is "block")
+    blockSize : int, optional
+        The number of timesteps drawn per block in the block mode. The memory
+        of the blocks is 3 * blockSize * carsPerChunk floats per chunk of the
+        simulated cars. (the default is 60)
+    antithetic : bool, optional
+        If True, every random number u is replaced by 1 - u, in [0, 1).
+        (the default is False)
+    carsPerChunk : int, optional
+        The number of cars per chunk in the block mode. (the default is 4096)
+    '''
+    def __init__(self, seed, mode = "block", blockSize = 60,
+                 antithetic = False, carsPerChunk = 4096):
+        assert mode in ("block", "counter"), "mode should be block or counter."
+        self.seed = seed
+        self.mode = mode
+        self.blockSize = blockSize
+        self.antithetic = antithetic
+        self.carsPerChunk = carsPerChunk
+        self.blocks = {}
+
+    def block(self, blockNumber, purpose, chunks):
+        '''Returns the blocks of random numbers of chunks of cars.
+
+        Parameters
+        ----------
+        blockNumber : int
+            The index of the block of timesteps.
+        purpose : int
+            STATE, DISTANCE or STATION.
+        chunks : numpy.array(int)
+            The sorted chunks of cars needed.
+
+        Returns
+        -------
+        (numpy.array(int), numpy.array(float))
+            The chunks held, sorted, and their random numbers, of shape
+            (chunks, blockSize, carsPerChunk).
+
+        '''
+        held = self.blocks.get(purpose)
+        if held is not None and held[0] == blockNumber:
+            missing = np.setdiff1d(chunks, held[1])
+            if missing.shape[0] == 0:
+                return(held[1], held[2])
+            chunks = np.union1d(chunks, held[1])
+        # Only the current block of every purpose is kept in memory.
+        numbers = np.stack([
+            np.random.Generator(np.random.PCG64(np.random.SeedSequence(
+                [self.seed, purpose, blockNumber, chunk]))).random(
+                    (self.carsPerChunk, self.blockSize)).T
+            for chunk in chunks.tolist()]) if chunks.shape[0] else \
+            np.zeros((0, self.blockSize, self.carsPerChunk))
+        self.blocks[purpose] = (blockNumber, chunks, numbers)
+        return(chunks, numbers)
+
+    def uniforms(self, carIndex, step, purpose):
+        '''Returns one uniform random number in [0, 1) per car.
+
+        Parameters
+        ----------
+        carIndex : numpy.array(int)
+            The indices of the cars in the fleet.
+        step : int
+            The index of the timestep.
+        purpose : int
+            What the random numbers are used for, STATE, DISTANCE or STATION.
+
+        Returns
+        -------
+        numpy.array(float)
+            The random numbers.
+
+        '''
+        carIndex = np.asarray(carIndex, dtype=np.int64)
+        if self.mode == "block":
+            chunkOfCar = carIndex // self.carsPerChunk
+            chunks, numbers = self.block(step // self.blockSize, purpose,
+                                         np.flatnonzero(np.bincount(chunkOfCar)))
+            rowOfChunk = np.zeros(int(chunks[-1]) + 1 if chunks.shape[0]
+                                  else 0, dtype=np.int64)
+            rowOfChunk[chunks] = np.arange(chunks.shape[0])
+            u = numbers[rowOfChunk[chunkOfCar], step % self.blockSize,
+                        carIndex % self.carsPerChunk]
+        else:
+            key = splitmix64(splitmix64(np.uint64(self.seed))
+                             ^ np.uint64(purpose))
+            key = splitmix64(key ^ np.uint64(step))
+            bits = splitmix64(key ^ carIndex.astype(np.uint64))
+            u = (bits >> np.uint64(11)) * (1.0 / 2**53)
+        if self.antithetic:
+            # Both generators return multiples of 2**-53, so this is exact
+            # and stays in [0, 1).
+            u = (1.0 - 2.0**-53) - u
+        return(u)
+
+
+def streams_are_distinct(seeds,
+                         mode = "counter",
+                         numberOfCars = 16,
+                         numberOfSteps = 4):
+    '''Checks that seeds and purposes give different random streams.
+
+    Draws the first numbers of a few cars for every seed and purpose and
+    checks that no two (seed, purpose) pairs share them, e.g., before using
+    consecutive seeds as independent replicates.
+
+    Parameters
+    ----------
+    seeds : list(int)
+        The seeds.
+    mode : str, optional
+        The mode of the RandomStreams. (the default is "counter")
+    numberOfCars : int, optional
+        The number of cars compared. (the default is 16)
+    numberOfSteps : int, optional
+        The number of timesteps compared. (the default is 4)
+
+    Returns
+    -------
+    bool
+        True if all the streams differ.
+
+    '''
+    cars = np.arange(numberOfCars)
+    draws = []
+    for seed in seeds:
+        streams = RandomStreams(seed, mode)
+        for purpose in (STATE, DISTANCE, STATION):
+            draws.append(np.concatenate([streams.uniforms(cars, step, purpose)
+                                         for step in range(numberOfSteps)]))
+    draws = np.array(draws)
+    return(np.unique(draws, axis=0).shape[0] == draws.shape[0])
@@ -0,0 +1,261 @@
+import hashlib
+import json
+import os
+import tempfile
+import zipfile
+import numpy as np
+
+def hash_file(fileName, blockSize = 1 << 20):
+    """Returns the SHA-256 hash of the content of a file.
+
+    Parameters
+    ----------
+    fileName : str
+        The name of the file.
+    blockSize : int, optional
+        The number of bytes read at once. (the default is 1 MiB)
+
+    Returns
+    -------
+    str
+        The hexadecimal hash.
+
+    """
+    digest = hashlib.sha256()
+    with open(fileName, 'rb') as ff:
+        for block in iter(lambda: ff.read(blockSize), b''):
+            digest.update(block)
+    return(digest.hexdigest())
+
+def update_hash(digest, value):
+    """Feeds a value into a hash in a stable way.
+
+    Dictionaries are hashed in the order of their sorted keys, NumPy
+    arrays by their dtype, shape and content, and NumPy scalars as the
+    Python numbers they hold, so equal inputs give the same hash in every
+    process, session and NumPy version.
+    """
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, dict):
+        digest.update(b'd%d' % len(value))
+        for k in sorted(value, key=repr):
+            update_hash(digest, k)
+            update_hash(digest, value[k])
+    elif isinstance(value, (list, tuple)):
+        digest.update(b'l%d' % len(value))
+        for v in value:
+            update_hash(digest, v)
+    elif isinstance(value, np.ndarray):
+        array = np.ascontiguousarray(value)
+        digest.update(('a' + array.dtype.str + repr(array.shape)).encode())
+        if array.dtype.kind in 'OUS':
+            update_hash(digest, array.tolist())
+        else:
+            digest.update(array.tobytes())
+    else:
+        digest.update(('v' + type(value).__name__ + repr(value)).encode())
+
+def scenario_key(scenario):
+    """Returns a stable key of the inputs of a simulation.
+
+    Parameters
+    ----------
+    scenario : dict
+        Everything the results depend on, e.g., the hashes of the chain and
+        distance files (hash_file()), maxTripDist and scale, the stations
+        (stations_description()), the fleet parameters, the first timestep and
+        the frequency of the horizon, and the seed. Leave the length of the
+        horizon out, so that shorter horizons reuse the results of longer ones.
+
+    Returns
+    -------
+    str
+        The hexadecimal key.
+
+    """
+    digest = hashlib.sha256()
+    update_hash(digest, scenario)
+    return(digest.hexdigest())
+
+def stations_description(stations):
+    """Describes the stations as arrays, for scenario_key().
+
+    Parameters
+    ----------
+    stations : OrderedDict(ParkingLot)
+        The parking lots.
+
+    Returns
+    -------
+    dict
+        The IDs, states, charging powers, capacities and charging statuses.
+
+    """
+    return({"ID": [str(k) for k in stations.keys()],
+            "state": np.array([v.state for v in stations.values()]),
+            "chargingPower": np.array([v.chargingPower for v in
+                                       stations.values()], dtype=float),
+            "maximumOccupancy": np.array([v.maximumOccupancy for v in
+                                          stations.values()]),
+            "chargingStatus": np.array([v.chargingStatus == True for v in
+                                        stations.values()])})
+
+
+class ResultCache:
+    """A content-addressed cache of simulation results on the local disk.
+
+    Every entry holds the compressed load matrix and a JSON summary of one
+    scenario, in a file named after the scenario key. Entries are evicted in
+    least recently used order when the cache grows over maxBytes. An entry
+    serves every request with the same key and a horizon up to its length, by
+    returning the first timesteps of the stored load, with a summary
+    recomputed for the shorter horizon.
+
+    Attributes
+    ----------
+    directory : str
+        The directory of the cache. It is created if needed.
+    maxBytes : int, optional
+        The maximum size of the cache on disk. (the default is 1 GiB)
+    """
+
+    def __init__(self, directory, maxBytes = 1 << 30):
+        self.directory = directory
+        self.maxBytes = maxBytes
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return(os.path.join(self.directory, key + ".npz"))
+
+    def get(self, key, numberOfSteps = None, summarize = None):
+        """Returns the cached results of a scenario.
+
+        Parameters
+        ----------
+        key : str
+            The scenario key, see scenario_key().
+        numberOfSteps : int, optional
+            The length of the requested horizon. (the default is None, the
+            whole stored horizon)
+        summarize : function, optional
+            Called with the load of a horizon shorter than the stored one,
+            returns its summary. (the default is None, shorter horizons are
+            not served)
+
+        Returns
+        -------
+        (numpy.array(float), dict) or None
+            The load and the summary of the requested horizon, or None if the
+            scenario is not cached for it, or if the cached entry is
+            unreadable.
+
+        """
+        fileName = self.path(key)
+        try:
+            with np.load(fileName) as data:
+                storedSteps = int(data["steps"])
+                if numberOfSteps is not None and numberOfSteps != storedSteps \
+                   and (storedSteps < numberOfSteps or summarize is None):
+                    return(None)
+                load = data["load"][:numberOfSteps]
+                summary = json.loads(str(data["summary"]))
+            # The modification time orders the entries for eviction.
+            os.utime(fileName)
+        except (OSError, EOFError, KeyError, ValueError, zipfile.BadZipFile):
+            return(None)
+        if load.shape[0] != storedSteps:
+            summary = summarize(load)
+        return(load, summary)
+
+    def stored_steps(self, key):
+        """Returns the length of the horizon stored for a scenario, 0 if none,
+        without reading the load."""
+        try:
+            with np.load(self.path(key)) as data:
+                return(int(data["steps"]))
+        except (OSError, EOFError, KeyError, ValueError, zipfile.BadZipFile):
+            return(0)
+
+    def put(self, key, load, summary = None):
+        """Stores the results of a scenario.
+
+        An entry is only replaced by results with a longer horizon.
+
+        Parameters
+        ----------
+        key : str
+            The scenario key, see scenario_key().
+        load : numpy.array(float)
+            The load matrix returned by simulate_model().
+        summary : dict, optional
+            JSON serializable statistics of the run. (the default is None)
+
+        Returns
+        -------
+        None
+
+        """
+        if self.stored_steps(key) >= load.shape[0]:
+            return
+        handle, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(handle, 'wb') as ff:
+            np.savez_compressed(ff, load=load, steps=load.shape[0],
+                                summary=json.dumps(summary or {}))
+        os.replace(temporary, self.path(key))
+        self.evict()
+
+    def evict(self):
+        """Deletes the least recently used entries until the cache fits in
+        maxBytes."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".npz"):
+                try:
+                    status = os.stat(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((status.st_mtime, status.st_size, name))
+        total = sum(x[1] for x in entries)
+        for mtime, size, name in sorted(entries):
+            if total <= self.maxBytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass # evicted by another process
+            total -= size
+
+
+def cached_simulation(cache, scenario, numberOfSteps, run, summarize = None):
+    """Returns the results of a scenario from the cache, or runs it.
+
+    Parameters
+    ----------
+    cache : ResultCache
+        The cache.
+    scenario : dict
+        The inputs of the simulation, see scenario_key().
+    numberOfSteps : int
+        The length of the horizon.
+    run : function
+        Called without arguments on a cache miss, returns the load matrix and
+        a summary dict.
+    summarize : function, optional
+        Returns the summary of a load matrix, to serve the first timesteps of
+        a longer cached horizon. (the default is None, only the same horizon
+        is served)
+
+    Returns
+    -------
+    (numpy.array(float), dict)
+        The load and the summary.
+
+    """
+    key = scenario_key(scenario)
+    cached = cache.get(key, numberOfSteps, summarize)
+    if cached is not None:
+        return(cached)
+    load, summary = run()
+    cache.put(key, load, summary)
+    return(load, summary)
@@ -0,0 +1,117 @@
+import math
+import numpy as np
+
+from randomstreams import RandomStreams, streams_are_distinct
+
+def replicates_needed(variance, halfWidth, z = 1.96):
+    """Returns the number of replicates giving a confidence interval of a
+    mean narrower than halfWidth, for the variance of one replicate."""
+    if halfWidth <= 0:
+        return(math.inf)
+    return(max(2, int(math.ceil(z**2 * variance / halfWidth**2))))
+
+def compare_scenarios(run,
+                      baseline,
+                      alternative,
+                      seeds,
+                      antithetic = False,
+                      mode = "counter",
+                      precision = 0.05,
+                      z = 1.96):
+    """Compares a metric of two scenarios with variance reduction.
+
+    Every replicate runs both scenarios with RandomStreams of the same seed,
+    so the cars make the same trips in both (common random numbers), and the
+    difference of the scenarios is estimated from the paired differences.
+    With antithetic, every replicate is an antithetic pair: the scenarios are
+    also run with the antithetic streams of the seed, and the two runs are
+    averaged.
+
+    The variance reduction is the variance of the difference of independent
+    replicates, estimated by the sum of the variances of the scenarios,
+    divided by the variance of the paired difference, both for the same
+    number of runs. The replicates needed for a confidence interval of the
+    difference of precision times the baseline are reported with and without
+    the variance reduction.
+
+    Parameters
+    ----------
+    run : function
+        Called as run(scenario, randomStreams), creates the stations and the
+        cars of the scenario, placed the same way for every call, runs a
+        Simulation with randomStreams and returns the metric, e.g., the peak
+        load.
+    baseline : -
+        The first scenario, passed to run.
+    alternative : -
+        The second scenario, passed to run.
+    seeds : list(int)
+        The seeds of the replicates, at least two, giving independent
+        streams (see randomstreams.streams_are_distinct()).
+    antithetic : bool, optional
+        If True, every replicate is an antithetic pair of runs. (the default
+        is False)
+    mode : str, optional
+        The mode of the RandomStreams. (the default is "counter")
+    precision : float, optional
+        The half width of the confidence interval of the difference used for
+        the number of replicates needed, relative to the baseline. (the
+        default is 0.05)
+    z : float, optional
+        The quantile of the normal distribution of the confidence intervals.
+        (the default is 1.96, for 95%)
+
+    Returns
+    -------
+    dict
+        The means of the scenarios, the mean difference, its standard error
+        and confidence interval, the variance reduction of the common random
+        numbers, of the antithetic pairs (None without antithetic) and in
+        total, and the replicates needed with independent runs and with the
+        variance reduction, counted in pairs with antithetic.
+
+    """
+    assert len(seeds) >= 2, "compare_scenarios() needs at least two seeds."
+    assert streams_are_distinct(seeds, mode), "the seeds should give " \
+        + "distinct random streams."
+    streams = [lambda seed: RandomStreams(seed, mode)]
+    if antithetic:
+        streams.append(lambda seed: RandomStreams(seed, mode,
+                                                  antithetic = True))
+    # The metric of every (replicate, stream, scenario).
+    values = np.array([[[run(scenario, s(seed))
+                         for scenario in (baseline, alternative)]
+                        for s in streams] for seed in seeds], dtype=float)
+
+    # The variances of single runs, pooled over the plain and antithetic runs.
+    single = values.reshape(-1, 2)
+    independent = float(np.var(single[:, 0], ddof=1)
+                        + np.var(single[:, 1], ddof=1))
+    paired = float(np.var(single[:, 1] - single[:, 0], ddof=1))
+
+    # One replicate costs len(streams) runs of every scenario.
+    runs = len(streams)
+    replicate = values.mean(1)
+    differences = replicate[:, 1] - replicate[:, 0]
+    variance = float(np.var(differences, ddof=1))
+    difference = float(differences.mean())
+    standardError = math.sqrt(variance / len(seeds))
+    baselineMean = float(replicate[:, 0].mean())
+    halfWidth = precision * abs(baselineMean)
+
+    def ratio(x, y):
+        return(x / y if y > 0 else math.inf)
+
+    return({"baseline": baselineMean,
+            "alternative": float(replicate[:, 1].mean()),
+            "difference": difference,
+            "standardError": standardError,
+            "confidenceInterval": (difference - z * standardError,
+                                   difference + z * standardError),
+            "crnReduction": ratio(independent, paired),
+            "antitheticReduction": ratio(paired / runs, variance)
+                                   if antithetic else None,
+            "varianceReduction": ratio(independent / runs, variance),
+            "replicatesIndependent": replicates_needed(independent / runs,
+                                                       halfWidth, z),
+            "replicatesNeeded": replicates_needed(variance, halfWidth, z)})
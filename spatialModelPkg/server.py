@@ -0,0 +1,232 @@
+import copy
+import itertools
+import json
+import random as rnd
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from ev import EV
+from markov import minutes_per_step
+from simulation import Simulation
+from randomstreams import RandomStreams
+from sharedinputs import SharedInputs, attach_inputs
+
+# The warm inputs of a worker process, set once by init_worker().
+workerInputs = {}
+
+def init_worker(handle, stations):
+    """Attaches a worker process to the shared inputs of the server."""
+    workerInputs["inputs"] = attach_inputs(handle)
+    workerInputs["stations"] = stations
+
+def run_scenario(scenario):
+    """Runs one scenario in a worker process.
+
+    Parameters
+    ----------
+    scenario : dict
+        The request, with the keys:
+        numberOfEVs (int), start (str, first timestep), periods (int, number of
+        timesteps), and optionally freq (default "min"), tz (default "CET"),
+        seed (default 0), mpg (default 0.2), batteryCapacity (default 0.0),
+        chargingPower (scalar or one value per station), initialState
+        (default 0) and aggregate (default False, True to return only the
+        total load).
+
+    Returns
+    -------
+    dict
+        The load (timesteps x charging stations, or the total if aggregate)
+        and a summary with the trips and distance per car.
+
+    """
+    import pandas as pd
+
+    inputs = workerInputs["inputs"]
+    stations = copy.deepcopy(workerInputs["stations"])
+    if "chargingPower" in scenario:
+        power = np.broadcast_to(np.asarray(scenario["chargingPower"],
+                                           dtype=float), (len(stations),))
+        for v, p in zip(stations.values(), power.tolist()):
+            v.chargingPower = p
+
+    seed = scenario.get("seed", 0)
+    rnd.seed(seed)
+    cars = [EV(currentLocation = None,
+               currentState = None,
+               mpg = scenario.get("mpg", 0.2),
+               batteryCapacity = scenario.get("batteryCapacity", 0.0))
+            for i in range(scenario["numberOfEVs"])]
+    [x.inital_conditions(stations, scenario.get("initialState", 0))
+     for x in cars]
+
+    freq = scenario.get("freq", "min")
+    timeSteps = pd.date_range(scenario["start"], periods=scenario["periods"],
+                              freq=freq, tz=scenario.get("tz", "CET"))
+    resolution = pd.Timedelta(timeSteps.freq).total_seconds() / 3600
+    chain = inputs.chain
+    if resolution > 1/60:
+        chain = {k: v.coarsen(minutes_per_step(resolution))
+                 for (k, v) in chain.items()}
+
+    simulation = Simulation(stations, cars, chain, inputs.distancesDictionary,
+                            timeSteps, resolution = resolution,
+                            randomStreams = RandomStreams(seed, "counter"))
+    load = simulation.simulate_model()
+    if scenario.get("aggregate", False):
+        load = load.sum(1)
+    days = len(timeSteps) * resolution / 24
+    return({"load": load.tolist(),
+            "summary": {"trips": float(np.mean([x.trips for x in cars]) / days),
+                        "distance": float(np.mean([x.distance for x in cars])
+                                          / days)}})
+
+
+class SimulationServer:
+    """A long-lived simulation service which keeps its inputs warm.
+
+    The Markov chains and trip distances are published once in shared memory
+    and attached by a pool of worker processes when they start, together with
+    the stations. Scenarios are queued on the pool, so a request only pays
+    for its simulation.
+
+    Attributes
+    ----------
+    chain : dict[Markov]
+        The Markov chains, keyed by True for weekdays and False for weekends.
+    distancesDictionary : dict
+        The distances of trips, keyed like chain.
+    stations : OrderedDict(ParkingLot)
+        The parking lots of the city.
+    processes : int, optional
+        The number of worker processes. (the default is None, one per CPU)
+    """
+
+    def __init__(self, chain, distancesDictionary, stations, processes = None):
+        self.sharedInputs = SharedInputs(chain, distancesDictionary)
+        self.pool = ProcessPoolExecutor(processes,
+                                        initializer = init_worker,
+                                        initargs = (self.sharedInputs.handle,
+                                                    stations))
+        self.jobs = {}
+        self.jobIDs = itertools.count()
+        self.lock = threading.Lock()
+
+    def submit(self, scenario):
+        """Queues a scenario and returns its job ID."""
+        with self.lock:
+            jobID = str(next(self.jobIDs))
+            self.jobs[jobID] = self.pool.submit(run_scenario, scenario)
+        return(jobID)
+
+    def status(self, jobID, remove = True):
+        """Returns the status of a job, and its result once done.
+
+        The result of a finished job is forgotten after it is returned, unless
+        remove is False.
+        """
+        future = self.jobs.get(jobID)
+        if future is None:
+            return({"status": "unknown"})
+        if not future.done():
+            return({"status": "running" if future.running() else "queued"})
+        if remove:
+            with self.lock:
+                self.jobs.pop(jobID, None)
+        if future.exception() is not None:
+            return({"status": "failed", "error": repr(future.exception())})
+        return(dict(status = "done", **future.result()))
+
+    def run(self, scenario):
+        """Runs a scenario and waits for its result."""
+        jobID = self.submit(scenario)
+        self.jobs[jobID].exception()
+        return(self.status(jobID))
+
+    def serve(self, host = "127.0.0.1", port = 8080):
+        """Serves HTTP requests until interrupted.
+
+        POST /jobs with a JSON scenario (see run_scenario()) queues it and
+        returns {"job": ID}. GET /jobs/ID returns its status and result.
+        POST /simulate runs a scenario and returns the result directly.
+        """
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def reply(self, code, body):
+                data = json.dumps(body).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    scenario = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError as error:
+                    return(self.reply(400, {"error": str(error)}))
+                if self.path == "/jobs":
+                    return(self.reply(202, {"job": server.submit(scenario)}))
+                if self.path == "/simulate":
+                    result = server.run(scenario)
+                    return(self.reply(200 if result["status"] == "done" else 500,
+                                      result))
+                self.reply(404, {"error": "unknown path"})
+
+            def do_GET(self):
+                if self.path.startswith("/jobs/"):
+                    result = server.status(self.path[len("/jobs/"):])
+                    return(self.reply(404 if result["status"] == "unknown"
+                                      else 200, result))
+                self.reply(404, {"error": "unknown path"})
+
+        self.httpServer = ThreadingHTTPServer((host, port), Handler)
+        try:
+            self.httpServer.serve_forever()
+        finally:
+            self.httpServer.server_close()
+
+    def close(self):
+        """Stops the workers and frees the shared inputs."""
+        self.pool.shutdown()
+        self.sharedInputs.close()
+        self.sharedInputs.unlink()
+
+
+if __name__ == "__main__":
+    """Starts a simulation server on localhost.
+
+    Example
+    -------
+        $ python3 -m spatialModelPkg.server ./TransitionMatrix ./distanceData stations.npz 8080
+
+    where stations.npz is a StationTable saved with StationTable.save().
+    """
+    import os
+    import sys
+    from markov import Markov
+    from extractFiles import readMatrixfiles
+    from extractDistances import extractDistances
+    from stationtable import load_station_table
+
+    matrices, distances, stationsFile = sys.argv[1:4]
+    port = int(sys.argv[4]) if len(sys.argv) > 4 else 8080
+    chain = {True: Markov(readMatrixfiles(os.path.join(matrices, "*weekday*.txt"))),
+             False: Markov(readMatrixfiles(os.path.join(matrices, "*weekend*.txt")))}
+    dist = {True: extractDistances(os.path.join(distances, "*day*.txt"), 200),
+            False: extractDistances(os.path.join(distances, "*end*.txt"), 200)}
+    stations = load_station_table(stationsFile).to_parking_lots()
+
+    server = SimulationServer(chain, dist, stations)
+    print("Serving on http://127.0.0.1:{}".format(port))
+    try:
+        server.serve(port = port)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
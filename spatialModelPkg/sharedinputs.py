@@ -0,0 +1,235 @@
+import json
+import numpy as np
+from multiprocessing import shared_memory
+from markov import Markov
+
+# Every array starts at a multiple of ALIGNMENT bytes in the shared buffer.
+ALIGNMENT = 64
+
+# The shared memory blocks created by this process.
+publishedNames = set()
+
+def input_arrays(chain, distancesDictionary):
+    """Lists the read-only input arrays of a simulation.
+
+    Parameters
+    ----------
+    chain : dict[Markov]
+        The Markov chains, keyed by True for weekdays and False for weekends.
+    distancesDictionary : dict
+        The distances of trips, keyed by True and False like chain.
+
+    Returns
+    -------
+    list((list, numpy.array))
+        The key path and the array of every input, e.g.,
+        (["chain", True, "slices"], array).
+
+    """
+    arrays = []
+    for day, markov in chain.items():
+        arrays.append((["chain", day, "slices"], markov.slices))
+        arrays.append((["chain", day, "cumulativeSlices"],
+                       markov.cumulativeSlices))
+        if markov.sliceIndex is not None:
+            arrays.append((["chain", day, "sliceIndex"], markov.sliceIndex))
+    for day, distances in distancesDictionary.items():
+        for transition, values in distances.items():
+            arrays.append((["distances", day, transition], np.asarray(values)))
+    return(arrays)
+
+def layout_arrays(arrays):
+    """Returns the layout of arrays packed in one buffer, and its size."""
+    layout = []
+    offset = 0
+    for path, array in arrays:
+        layout.append({"path": path,
+                       "dtype": array.dtype.str,
+                       "shape": list(array.shape),
+                       "offset": offset})
+        offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+    return(layout, max(offset, 1))
+
+def pack_arrays(arrays, layout, buffer):
+    """Copies the arrays into the buffer at the offsets of the layout."""
+    for (path, array), entry in zip(arrays, layout):
+        view = np.ndarray(array.shape, dtype=array.dtype, buffer=buffer,
+                          offset=entry["offset"])
+        view[...] = array
+
+def unpack_arrays(handle, buffer):
+    """Rebuilds the chains and the distances as read-only views of a buffer.
+
+    Parameters
+    ----------
+    handle : dict
+        The handle returned by SharedInputs or save_inputs().
+    buffer : buffer
+        The shared memory or memory-mapped buffer.
+
+    Returns
+    -------
+    (dict[Markov], dict)
+        The chain and distancesDictionary arguments of Simulation.
+
+    """
+    chainArrays = {}
+    distancesDictionary = {}
+    for entry in handle["layout"]:
+        view = np.ndarray(tuple(entry["shape"]), dtype=np.dtype(entry["dtype"]),
+                          buffer=buffer, offset=entry["offset"])
+        view.flags.writeable = False
+        kind, day, name = entry["path"]
+        target = chainArrays if kind == "chain" else distancesDictionary
+        target.setdefault(day, {})[name] = view
+
+    chain = {day: Markov.from_slices(arrays["slices"],
+                                     arrays["cumulativeSlices"],
+                                     arrays.get("sliceIndex"),
+                                     handle["dim"][str(day)])
+             for (day, arrays) in chainArrays.items()}
+    return(chain, distancesDictionary)
+
+def make_handle(chain, layout, size, **kwargs):
+    handle = {"layout": layout,
+              "size": size,
+              "dim": {str(day): markov.dim for (day, markov) in chain.items()}}
+    handle.update(kwargs)
+    return(handle)
+
+
+class SharedInputs:
+    """Publishes the Markov chains and trip distances in shared memory.
+
+    The inputs are copied once into one multiprocessing.shared_memory block.
+    Pass the picklable `handle` to the workers, which get zero-copy, read-only
+    views with attach_inputs(). Call close() and unlink() in the publishing
+    process when the workers are done.
+
+    Parameters
+    ----------
+    chain : dict[Markov]
+        The Markov chains, keyed by True for weekdays and False for weekends.
+    distancesDictionary : dict
+        The distances of trips, keyed by True and False like chain.
+
+    Attributes
+    ----------
+    handle : dict
+        The picklable description of the shared block, for attach_inputs().
+    memory : multiprocessing.shared_memory.SharedMemory
+        The shared block.
+    """
+
+    def __init__(self, chain, distancesDictionary):
+        arrays = input_arrays(chain, distancesDictionary)
+        layout, size = layout_arrays(arrays)
+        self.memory = shared_memory.SharedMemory(create=True, size=size)
+        pack_arrays(arrays, layout, self.memory.buf)
+        self.handle = make_handle(chain, layout, size, name=self.memory.name)
+        publishedNames.add(self.memory.name)
+
+    def close(self):
+        self.memory.close()
+
+    def unlink(self):
+        publishedNames.discard(self.memory.name)
+        self.memory.unlink()
+
+
+class AttachedInputs:
+    """Read-only inputs attached from shared memory or from a file.
+
+    Attributes
+    ----------
+    chain : dict[Markov]
+        The Markov chains.
+    distancesDictionary : dict
+        The distances of trips.
+    """
+
+    def __init__(self, chain, distancesDictionary, buffer):
+        self.chain = chain
+        self.distancesDictionary = distancesDictionary
+        # Keeps the shared memory or the memory map open while in use.
+        self.buffer = buffer
+
+
+def attach_inputs(handle):
+    """Attaches to inputs published by SharedInputs.
+
+    Parameters
+    ----------
+    handle : dict
+        The handle of the SharedInputs.
+
+    Returns
+    -------
+    AttachedInputs
+        The chains and distances as zero-copy views of the shared memory.
+
+    """
+    try:
+        memory = shared_memory.SharedMemory(name=handle["name"], track=False)
+    except TypeError:
+        # Before Python 3.13 the attaching process registers the block with
+        # its resource tracker, which would unlink it when the worker exits.
+        from multiprocessing import resource_tracker
+        memory = shared_memory.SharedMemory(name=handle["name"])
+        if handle["name"] not in publishedNames:
+            resource_tracker.unregister(memory._name, "shared_memory")
+    chain, distancesDictionary = unpack_arrays(handle, memory.buf)
+    return(AttachedInputs(chain, distancesDictionary, memory))
+
+def save_inputs(fileName, chain, distancesDictionary):
+    """Saves the inputs into a file which can be memory-mapped by workers.
+
+    Two files are written: fileName with the packed arrays and
+    fileName + ".json" with the handle.
+
+    Parameters
+    ----------
+    fileName : str
+        The name of the file.
+    chain : dict[Markov]
+        The Markov chains.
+    distancesDictionary : dict
+        The distances of trips.
+
+    Returns
+    -------
+    dict
+        The handle, also saved in fileName + ".json".
+
+    """
+    arrays = input_arrays(chain, distancesDictionary)
+    layout, size = layout_arrays(arrays)
+    memoryMap = np.memmap(fileName, dtype=np.uint8, mode='w+', shape=(size,))
+    pack_arrays(arrays, layout, memoryMap)
+    memoryMap.flush()
+    del memoryMap
+    handle = make_handle(chain, layout, size, fileName=fileName)
+    with open(fileName + ".json", 'w') as ff:
+        json.dump(handle, ff)
+    return(handle)
+
+def load_inputs(fileName):
+    """Memory-maps inputs saved with save_inputs(), read-only.
+
+    Parameters
+    ----------
+    fileName : str
+        The name of the file given to save_inputs().
+
+    Returns
+    -------
+    AttachedInputs
+        The chains and distances as views of the memory-mapped file.
+
+    """
+    with open(fileName + ".json", 'r') as ff:
+        handle = json.load(ff)
+    memoryMap = np.memmap(fileName, dtype=np.uint8, mode='r',
+                          shape=(handle["size"],))
+    chain, distancesDictionary = unpack_arrays(handle, memoryMap)
+    return(AttachedInputs(chain, distancesDictionary, memoryMap))
@@ -1,5 +1,7 @@
 import numpy as np
-import pandas as pd
+import randomstreams
+from chargingcontroller import ChargingController
+from markov import minutes_per_step
 
 class Simulation:
     """A class representing the simulation model.
@@ -25,8 +27,56 @@ class Simulation:
         A pandas.date_range containing the timesteps through which the simulation
         is to be run.
     resolution : float
-        The resolution of the timestep. Used to charge the EV class. (the
-        default is 1/60). OTHER VALUES ARE YET NOT FULLY TESTED YET.
+        The resolution of the timestep in hours. Used to charge the EV class.
+        (the default is 1/60). It should be a whole number of minutes. For
+        coarser timesteps, e.g., 15 minutes, use a chain from Markov.coarsen()
+        with the same number of minutes per step, and timeSteps with the same
+        frequency.
+    chargingController : ChargingController, optional
+        If given, the charging power of all the charging cars is allocated in
+        one vectorized call to the controller every timestep, instead of
+        every car charging at the power of its station. Use it to study
+        load-management policies. (the default is None)
+    randomStreams : RandomStreams, optional
+        If given, all the random numbers of the simulation (state transitions,
+        trip distances and parking lots) are drawn from these streams for the
+        whole fleet at once, instead of the global random and numpy.random
+        modules. (the default is None)
+    carIDs : numpy.array(int), optional
+        The index of every car in the whole fleet, used as the key of the
+        random streams. Give the same indices to a car in every partition of
+        the fleet to get the same draws. (the default is 0 to numCars - 1)
+    observers : list, optional
+        Objects which follow the simulation, e.g., a MobilityTraceRecorder.
+        Every observer has a start(simulation) method, called before the first
+        timestep, and an update(simulation, step, time, load) method, called
+        after every timestep with the load of the charging stations.
+        (the default is None)
+    fleet : Fleet, optional
+        If given, the vehicle parameters and the battery charge of the cars
+        are held in the arrays of the fleet, which may mix several vehicle
+        classes with real capacities and a charging taper. The batteries are
+        discharged and charged for the whole fleet at once, through
+        chargingController or an uncapped ChargingController, and the battery
+        charge is copied to the cars after every timestep. The parameters of
+        the cars are overwritten with those of the fleet. The trips are still
+        simulated per EV object, so the fleet makes the battery work of a
+        mixed fleet as cheap as that of a uniform one, but does not remove
+        the per-car cost of a timestep. (the default is None)
+    neighborIndex : NeighborIndex, optional
+        If given, the destinations of the trips are drawn with the
+        distance-decay model of the index, and the trip distances are the
+        distances between the parking lots instead of samples from
+        distancesDictionary. (the default is None)
+    carWeights : numpy.array(float), optional
+        If given, the number of cars of the population every simulated car
+        stands for, e.g., from a WeightedSample. The power of every car is
+        multiplied by its weight in the load of the stations, and the cars
+        are charged through chargingController or an uncapped
+        ChargingController. (the default is None, a weight of one)
+    carPower : numpy.array(float)
+        The unweighted charging power of every car in the last timestep, set
+        when the cars are charged through a charging controller.
     """
 
     def __init__(self,
@@ -35,48 +85,214 @@ class Simulation:
                  chain,
                  distancesDictionary,
                  timeSteps,
-                 resolution = 1/60):
+                 resolution = 1/60,
+                 chargingController = None,
+                 randomStreams = None,
+                 carIDs = None,
+                 observers = None,
+                 fleet = None,
+                 neighborIndex = None,
+                 carWeights = None):
         self.stations = stations
         self.cars = cars
         self.numCars = len(self.cars)
         self.chain = chain
         self.resolution = resolution
+        self.minutesPerStep = minutes_per_step(resolution)
         self.distancesDictionary = distancesDictionary
         self.timeSteps = timeSteps
+        self.chargingController = chargingController
+        self.randomStreams = randomStreams
+        self.carIDs = np.arange(self.numCars) if carIDs is None else \
+            np.asarray(carIDs)
+        self.observers = [] if observers is None else list(observers)
+        self.fleet = fleet
+        self.neighborIndex = neighborIndex
+        self.carWeights = None if carWeights is None else \
+            np.asarray(carWeights, dtype=float)
+        self.carPower = np.zeros(self.numCars)
+        if self.carWeights is not None:
+            assert self.carWeights.shape == (self.numCars,), "carWeights " \
+                + "should have one weight per car."
+            if self.chargingController is None:
+                self.chargingController = ChargingController()
+        if self.fleet is not None:
+            self.fleet.update_cars(self.cars)
+            self.carDistance = np.array([x.distance for x in self.cars],
+                                        dtype=float)
+            if self.chargingController is None:
+                self.chargingController = ChargingController()
 
-    def model_function(self, timestep, isWeekday):
+        self.stationKeys = list(self.stations.keys())
+        self.stationIndex = {k: i for (i, k) in enumerate(self.stationKeys)}
+        self.stationPower = np.array([v.chargingPower for (k,v) in
+                                      self.stations.items()], dtype=float)
+        self.stationCharging = np.array([v.chargingStatus == True for (k,v) in
+                                         self.stations.items()], dtype=bool)
+
+    def car_station_index(self):
+        """Returns the index of the station of every car.
+
+        Returns
+        -------
+        numpy.array(int)
+            The position in stations of the parking lot every car is parked in.
+
+        """
+        return(np.array([self.stationIndex[x.currentLocation]
+                         for x in self.cars], dtype=int))
+
+    def charge_cars(self, timestep):
+        """Charges all the cars in one vectorized call to the charging
+        controller, and updates the load of the stations.
+
+        Parameters
+        ----------
+        timestep : int
+            The time of the day, the same index used for the Markov chain.
+
+        With a fleet, the deficits given to the controller are limited to the
+        energy every car accepts in the timestep at its tapered power, so the
+        controller never requests more than the car can take. With carWeights,
+        the load of a station is the weighted sum of the power of its cars.
+
+        Returns
+        -------
+        None
+            Mutates the battery charge of the cars and the load of the stations.
+
+        """
+        carStation = self.car_station_index()
+        if self.fleet is None:
+            batteryCharge = np.array([x.batteryCharge for x in self.cars])
+            batteryCapacity = np.array([x.batteryCapacity for x in self.cars])
+        else:
+            batteryCharge = self.fleet.batteryCharge
+            batteryCapacity = self.fleet.carCapacity
+
+        charging = np.nonzero((batteryCharge < batteryCapacity) &
+                              self.stationCharging[carStation])[0]
+        deficits = batteryCapacity[charging] - batteryCharge[charging]
+        if self.fleet is not None:
+            accepted = self.fleet.accepted_power(
+                charging, self.stationPower[carStation[charging]])
+            deficits = np.minimum(deficits, accepted * self.resolution)
+        power = self.chargingController.allocate(
+                    charging,
+                    carStation[charging],
+                    deficits,
+                    self.stationPower,
+                    self.resolution,
+                    timestep)
+
+        if self.fleet is None:
+            newCharge = batteryCharge[charging] + power * self.resolution
+            for i, charge in zip(charging.tolist(), newCharge.tolist()):
+                self.cars[i].batteryCharge = charge
+        else:
+            self.fleet.charge(charging, power, self.resolution)
+
+        self.carPower = np.zeros(self.numCars)
+        self.carPower[charging] = power
+        if self.carWeights is not None:
+            power = power * self.carWeights[charging]
+        stationLoad = np.bincount(carStation[charging], weights=power,
+                                  minlength=len(self.stationKeys))
+        for k, load in zip(self.stationKeys, stationLoad.tolist()):
+            self.stations[k].currentLoad = load
+
+    def drive_fleet(self):
+        """Discharges the batteries of the fleet by the distance every car
+        drove in the timestep."""
+        distance = np.fromiter((x.distance for x in self.cars), dtype=float,
+                               count=self.numCars)
+        self.fleet.drive(distance - self.carDistance)
+        self.carDistance = distance
+
+    def model_function(self, timestep, isWeekday, step = 0):
         def reset_load_new_timestep(x):
             x.currentLoad = 0.0
             return(x)
 
         [reset_load_new_timestep(v) for (k,v) in self.stations.items()]
 
-        def do_on_car(self, x, timestep, isWeekday):
+        def do_on_car(self, x, timestep, isWeekday, rndDistance, rndStation):
             x.find_state(self.chain[isWeekday],
                          timestep,
                          self.stations,
-                         self.distancesDictionary[isWeekday])
+                         self.distancesDictionary[isWeekday],
+                         rndDistance,
+                         rndStation,
+                         self.neighborIndex)
+
+            if self.chargingController is None:
+                x.charge_EV(self.resolution, self.stations)
+
+        if self.randomStreams is None:
+            [do_on_car(self, x, timestep, isWeekday, None, None)
+             for x in self.cars]
+        else:
+            streams = self.randomStreams
+            rndState = streams.uniforms(self.carIDs, step, randomstreams.STATE)
+            rndDistance = streams.uniforms(self.carIDs, step,
+                                           randomstreams.DISTANCE)
+            rndStation = streams.uniforms(self.carIDs, step,
+                                          randomstreams.STATION)
+            for x, u in zip(self.cars, rndState.tolist()):
+                x.rnd = u
+            [do_on_car(self, x, timestep, isWeekday, d, s) for (x, d, s) in
+             zip(self.cars, rndDistance.tolist(), rndStation.tolist())]
 
-            x.charge_EV(self.resolution, self.stations)
+        if self.fleet is not None:
+            self.drive_fleet()
 
-        [do_on_car(self, x, timestep, isWeekday) for x in self.cars]
+        if self.chargingController is not None:
+            self.charge_cars(timestep)
 
-        rndmNums = np.random.random(self.numCars)
-        for i in range(self.numCars):
-            self.cars[i].rnd = rndmNums[i]
+        if self.fleet is not None:
+            for x, charge in zip(self.cars, self.fleet.batteryCharge.tolist()):
+                x.batteryCharge = charge
+
+        if self.randomStreams is None:
+            rndmNums = np.random.random(self.numCars)
+            for i in range(self.numCars):
+                self.cars[i].rnd = rndmNums[i]
 
         chargingStationsFiltered = [v for (k,v) in self.stations.items() if
                                     v.chargingStatus == True]
         return([x.currentLoad for x in chargingStationsFiltered])
 
-    def simulate_model(self):
+    def simulate_model(self, storeResults = True):
+        """Runs the simulation over all the timesteps.
+
+        Parameters
+        ----------
+        storeResults : bool, optional
+            If False, the dense load matrix is not kept and the load is only
+            passed to the observers, e.g., a SparseLoadRecorder. (the default
+            is True)
+
+        Returns
+        -------
+        numpy.array(float) or None
+            The load of every charging station at every timestep, one column
+            per station with chargingStatus True, or None if storeResults is
+            False.
+
+        """
+        numberOfColumns = len([k for (k,v) in self.stations.items()
+                               if v.chargingStatus == True])
+        resultsMatrix = np.zeros((self.timeSteps.shape[0] if storeResults
+                                  else 1, numberOfColumns))
 
-        resultsMatrix = np.zeros((self.timeSteps.shape[0],
-        len([k for (k,v) in self.stations.items() if v.chargingStatus == True])))
+        [x.start(self) for x in self.observers]
 
         for i, time in enumerate(self.timeSteps):
             weekday = True if time.weekday() < 5 else False
             minute = time.minute + 60 * time.hour
-            resultsMatrix[i,::] = self.model_function(minute, weekday)
+            row = i if storeResults else 0
+            resultsMatrix[row,::] = self.model_function(
+                                    minute // self.minutesPerStep, weekday, i)
+            [x.update(self, i, time, resultsMatrix[row]) for x in self.observers]
 
-        return(resultsMatrix)
+        return(resultsMatrix if storeResults else None)
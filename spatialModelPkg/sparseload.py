@@ -0,0 +1,214 @@
+import numpy as np
+from auxiliary import aggregate_time_series
+
+
+class SparseLoad:
+    """The load of the charging stations, with only the non-zero entries.
+
+    The entries are stored row by row like a compressed sparse row (CSR)
+    matrix of shape (timesteps, stations): the non-zero entries of timestep i
+    are station[stepStart[i]:stepStart[i+1]] and power[...]. With 32 bit
+    station indices and powers, an entry costs 8 bytes, the same as one
+    float64 of the dense matrix, so memory and disk shrink with the share of
+    idle stations.
+
+    Attributes
+    ----------
+    stepStart : numpy.array(int)
+        The index of the first entry of every timestep, of length
+        timesteps + 1.
+    station : numpy.array(int32)
+        The column (charging station) of every entry, in the order of the
+        columns of Simulation.simulate_model().
+    power : numpy.array(float32)
+        The load of every entry.
+    numberOfStations : int
+        The number of columns.
+    """
+
+    def __init__(self, stepStart, station, power, numberOfStations):
+        self.stepStart = np.asarray(stepStart, dtype=np.int64)
+        self.station = np.asarray(station, dtype=np.int32)
+        self.power = np.asarray(power, dtype=np.float32)
+        self.numberOfStations = numberOfStations
+
+    @property
+    def numberOfSteps(self):
+        """int: The number of timesteps."""
+        return(self.stepStart.shape[0] - 1)
+
+    @property
+    def shape(self):
+        """tuple(int): The shape of the dense load matrix."""
+        return((self.numberOfSteps, self.numberOfStations))
+
+    @property
+    def step(self):
+        """numpy.array(int): The timestep of every entry, i.e., the row
+        indices in coordinate (COO) format."""
+        return(np.repeat(np.arange(self.numberOfSteps), np.diff(self.stepStart)))
+
+    def nbytes(self):
+        """Returns the memory used by the entries in bytes."""
+        return(self.stepStart.nbytes + self.station.nbytes + self.power.nbytes)
+
+    def to_dense(self, start = 0, stop = None, stations = None):
+        """Returns a dense slice of the load matrix.
+
+        Parameters
+        ----------
+        start : int, optional
+            The first timestep. (the default is 0)
+        stop : int, optional
+            The timestep after the last one. (the default is None, the end)
+        stations : numpy.array(int), optional
+            The columns to return. (the default is None, all columns)
+
+        Returns
+        -------
+        numpy.array(float)
+            The load, of shape (stop - start, stations).
+
+        """
+        stop = self.numberOfSteps if stop is None else stop
+        first, last = self.stepStart[start], self.stepStart[stop]
+        rows = np.repeat(np.arange(stop - start),
+                         np.diff(self.stepStart[start:stop + 1]))
+        columns = self.station[first:last]
+        dense = np.zeros((stop - start, self.numberOfStations))
+        dense[rows, columns] = self.power[first:last]
+        if stations is not None:
+            dense = dense[:, stations]
+        return(dense)
+
+    def station_load(self, station):
+        """Returns the load time series of one station."""
+        select = self.station == station
+        series = np.zeros(self.numberOfSteps)
+        series[self.step[select]] = self.power[select]
+        return(series)
+
+    def total_load(self):
+        """Returns the total load of all the stations at every timestep."""
+        return(np.bincount(self.step, weights=self.power,
+                           minlength=self.numberOfSteps))
+
+    def aggregate(self, timeStep, aggrFunc, station = None):
+        """Aggregates the load of a station or the total load with
+        auxiliary.aggregate_time_series().
+
+        Parameters
+        ----------
+        timeStep : int
+            The number of timesteps aggregated together.
+        aggrFunc : function
+            The aggregation function, e.g., lambda x: np.max(x, axis=1).
+        station : int, optional
+            The column of the station. (the default is None, the total load)
+
+        Returns
+        -------
+        numpy.array(float)
+            The aggregated time series.
+
+        """
+        series = self.total_load() if station is None else \
+            self.station_load(station)
+        return(aggregate_time_series(series, timeStep, aggrFunc))
+
+    def resample(self, timeStep):
+        """Averages the load of every station over blocks of timesteps.
+
+        Parameters
+        ----------
+        timeStep : int
+            The number of timesteps averaged together. The number of
+            timesteps must be divisible by it.
+
+        Returns
+        -------
+        SparseLoad
+            The mean load over every block, still sparse.
+
+        """
+        assert self.numberOfSteps % timeStep == 0, "The number of timesteps " \
+            + "must be divisible by the timeStep."
+        numberOfBlocks = self.numberOfSteps // timeStep
+        key = (self.step // timeStep).astype(np.int64) * self.numberOfStations \
+            + self.station
+        keys, inverse = np.unique(key, return_inverse=True)
+        energy = np.bincount(inverse.ravel(), weights=self.power)
+        block = keys // self.numberOfStations
+        stepStart = np.searchsorted(block, np.arange(numberOfBlocks + 1))
+        return(SparseLoad(stepStart, keys % self.numberOfStations,
+                          energy / timeStep, self.numberOfStations))
+
+    def save(self, fileName):
+        """Saves the load into a compressed NumPy .npz file."""
+        np.savez_compressed(fileName,
+                            stepStart = self.stepStart,
+                            station = self.station,
+                            power = self.power,
+                            numberOfStations = self.numberOfStations)
+
+
+def load_sparse_load(fileName):
+    """Loads a load saved with SparseLoad.save().
+
+    Parameters
+    ----------
+    fileName : str
+        The name of the .npz file.
+
+    Returns
+    -------
+    SparseLoad
+        The load.
+
+    """
+    with np.load(fileName) as data:
+        return(SparseLoad(data["stepStart"], data["station"], data["power"],
+                          int(data["numberOfStations"])))
+
+def sparse_from_dense(load):
+    """Converts a dense load matrix from Simulation.simulate_model()."""
+    steps, stations = np.nonzero(load)
+    stepStart = np.searchsorted(steps, np.arange(load.shape[0] + 1))
+    return(SparseLoad(stepStart, stations, load[steps, stations],
+                      load.shape[1]))
+
+
+class SparseLoadRecorder:
+    """Records the non-zero load of the charging stations during a simulation.
+
+    Add it to the observers of a Simulation, with storeResults False to
+    skip the dense load matrix. The entries of every timestep are appended to
+    lists of chunks, which are joined once by result().
+    """
+
+    def __init__(self):
+        self.stepStart = [0]
+        self.stations = []
+        self.powers = []
+        self.numberOfStations = 0
+
+    def start(self, simulation):
+        self.stepStart = [0]
+        self.stations = []
+        self.powers = []
+        self.numberOfStations = int(simulation.stationCharging.sum())
+
+    def update(self, simulation, step, time, load):
+        nonzero = np.flatnonzero(load)
+        self.stations.append(nonzero.astype(np.int32))
+        self.powers.append(load[nonzero].astype(np.float32))
+        self.stepStart.append(self.stepStart[-1] + nonzero.shape[0])
+
+    def result(self):
+        """Returns the recorded SparseLoad."""
+        return(SparseLoad(self.stepStart,
+                          np.concatenate(self.stations) if self.stations
+                          else np.zeros(0),
+                          np.concatenate(self.powers) if self.powers
+                          else np.zeros(0),
+                          self.numberOfStations))
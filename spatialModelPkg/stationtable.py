@@ -0,0 +1,171 @@
+import numpy as np
+from collections import OrderedDict
+from parkinglot import ParkingLot
+
+
+class StationTable:
+    """An array-backed table of parking lots.
+
+    Each row of the table is one parking lot, i.e., the subset of a parcel
+    (charging station) dedicated to one state. The table holds the same
+    information as an OrderedDict of ParkingLot objects, but as NumPy arrays,
+    which keeps large cities cheap to build and to store.
+
+    Attributes
+    ----------
+    parcelIDs : numpy.array(str)
+        The unique names (IDs) of the parcels the table was built from.
+    parcelIndex : numpy.array(int)
+        The index into parcelIDs of the parcel every parking lot belongs to.
+    state : numpy.array(int)
+        The state of every parking lot.
+    chargingPower : numpy.array(float)
+        The charging power of every parking lot.
+    maximumOccupancy : numpy.array(int)
+        The number of parking places in every parking lot.
+    chargingStatus : numpy.array(bool)
+        True if charging is enabled in the parking lot.
+    """
+
+    def __init__(self,
+                 parcelIDs,
+                 parcelIndex,
+                 state,
+                 chargingPower,
+                 maximumOccupancy,
+                 chargingStatus):
+        self.parcelIDs = np.asarray(parcelIDs)
+        self.parcelIndex = np.asarray(parcelIndex)
+        self.state = np.asarray(state)
+        self.chargingPower = np.asarray(chargingPower, dtype=float)
+        self.maximumOccupancy = np.asarray(maximumOccupancy)
+        self.chargingStatus = np.asarray(chargingStatus, dtype=bool)
+
+    def __len__(self):
+        return(self.state.shape[0])
+
+    @property
+    def IDs(self):
+        """numpy.array(str): The IDs of the parking lots, formatted as
+        "<parcel ID>-<state>" like in create_charging_stations()."""
+        return(np.char.add(np.char.add(self.parcelIDs[self.parcelIndex], "-"),
+                           self.state.astype(str)))
+
+    def to_parking_lots(self):
+        """Materialises the table into ParkingLot objects.
+
+        Returns
+        -------
+        OrderedDict(ParkingLot)
+            An OrderedDict of parking lots keyed by their IDs, in the order of
+            the table.
+
+        """
+        stations = [(ID, ParkingLot(ID = ID,
+                                    state = state,
+                                    chargingPower = power,
+                                    maximumOccupancy = occupancy,
+                                    currentOccupancy = 0,
+                                    chargingStatus = status,
+                                    currentLoad = 0.0))
+                    for (ID, state, power, occupancy, status) in
+                    zip(self.IDs.tolist(),
+                        self.state.tolist(),
+                        self.chargingPower.tolist(),
+                        self.maximumOccupancy.tolist(),
+                        self.chargingStatus.tolist())]
+        return(OrderedDict(stations))
+
+    def save(self, fileName):
+        """Saves the table into a NumPy .npz file."""
+        np.savez(fileName,
+                 parcelIDs = self.parcelIDs,
+                 parcelIndex = self.parcelIndex,
+                 state = self.state,
+                 chargingPower = self.chargingPower,
+                 maximumOccupancy = self.maximumOccupancy,
+                 chargingStatus = self.chargingStatus)
+
+
+def load_station_table(fileName):
+    """Loads a table saved with StationTable.save().
+
+    Parameters
+    ----------
+    fileName : str
+        The name of the .npz file.
+
+    Returns
+    -------
+    StationTable
+        The table of parking lots.
+
+    """
+    with np.load(fileName) as data:
+        return(StationTable(**{k: data[k] for k in data.files}))
+
+
+def create_station_table(identitiesArray,
+                         areas,
+                         percentageOfStates,
+                         areaPerCar,
+                         charging_status = True,
+                         charging_power = 3.7):
+    """Creates a StationTable from the parcels of a city.
+
+    Every parcel is divided into several parking lots based on the percentages
+    of areas dedicated to each state. The capacities of all parking lots are
+    computed in one shot, parking lots with a zero percentage are dropped. The
+    rows are ordered by state first and parcel second, which is the order
+    used by create_charging_stations().
+
+    Parameters
+    ----------
+    identitiesArray : list(-)
+        A list of unique names (IDs) for each parcel.
+    areas : list(float)
+        A list containing the areas of each parcel.
+    percentageOfStates : numpy.array(float)
+        A numpy array of shape (parcels, states) containing the percentage of
+        the area of each parcel dedicated to each state.
+    areaPerCar : float or list(float)
+        The ground area needed to fit a car in a parking lot, for all parcels
+        or per parcel.
+    charging_status : bool or list(bool), optional
+        True if charging is enabled, for all parcels or per parcel.
+        (the default is True)
+    charging_power : float or list(float), optional
+        The charging power, for all parcels or per parcel. (the default is
+        3.7 kW)
+
+    Returns
+    -------
+    StationTable
+        The table of parking lots.
+
+    """
+    percentageOfStates = np.asarray(percentageOfStates, dtype=float)
+    numberOfParcels = percentageOfStates.shape[0]
+    areas = np.asarray(areas, dtype=float)
+    assert areas.shape == (numberOfParcels,), "areas and percentageOfStates " \
+        + "should have the same number of parcels."
+
+    def per_parcel(x, dtype):
+        return(np.broadcast_to(np.asarray(x, dtype=dtype), (numberOfParcels,)))
+
+    areaPerCar = per_parcel(areaPerCar, float)
+    chargingPower = per_parcel(charging_power, float)
+    chargingStatus = per_parcel(charging_status, bool)
+
+    # np.nonzero on the transpose orders the lots by state, then by parcel.
+    state, parcelIndex = np.nonzero(percentageOfStates.T)
+    maximumOccupancy = np.ceil(1.0/areaPerCar[parcelIndex]
+                               * percentageOfStates[parcelIndex, state]
+                               * areas[parcelIndex]).astype(int)
+
+    return(StationTable(parcelIDs = np.asarray(identitiesArray).astype(str),
+                        parcelIndex = parcelIndex,
+                        state = state,
+                        chargingPower = chargingPower[parcelIndex],
+                        maximumOccupancy = maximumOccupancy,
+                        chargingStatus = chargingStatus[parcelIndex]))
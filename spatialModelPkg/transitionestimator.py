@@ -0,0 +1,344 @@
+import os
+import numpy as np
+
+from markov import Markov
+
+# The names of the day types in the file names, indexed by weekday.
+DAY_TYPES = {True: "weekday", False: "weekend"}
+DISTANCE_PREFIX = {True: "Weekday", False: "Weekend"}
+
+# The columns of trip logs read by estimate_from_csv().
+TRIP_COLUMNS = ("personDay", "weekday", "fromState", "toState", "departure",
+                "distance")
+
+class TransitionEstimator:
+    """Estimates inhomogenous transition matrices from trip or state logs.
+
+    The logs are added in chunks. Every transition of a car from a state at
+    step t of the day to a state at step t + 1 is counted, per day type,
+    with one np.bincount over (day type, step, from, to), and the trip
+    distances are appended to the distance files as they come, so the
+    memory only depends on the size of the chunks. The matrices are written
+    in the format read by readMatrixfiles() and Markov, and the distances in
+    the format read by extractDistances().
+
+    Attributes
+    ----------
+    directory : str
+        The directory of the output files. It is created if needed.
+    numberOfStates : int, optional
+        The number of states. (the default is 3, e.g., home, work and other)
+    stepsPerDay : int, optional
+        The number of timesteps of a day. (the default is 1440, one per
+        minute)
+    counts : numpy.array(int)
+        The number of transitions, of shape (2, stepsPerDay, numberOfStates,
+        numberOfStates), the first index being 1 for weekdays.
+    """
+
+    def __init__(self, directory, numberOfStates = 3, stepsPerDay = 1440):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.numberOfStates = numberOfStates
+        self.stepsPerDay = stepsPerDay
+        self.counts = np.zeros((2, stepsPerDay, numberOfStates,
+                                numberOfStates), dtype=np.int64)
+        self.distanceFiles = set()
+
+    def add_states(self, states, weekday):
+        """Counts the transitions of state logs.
+
+        Parameters
+        ----------
+        states : numpy.array(int)
+            The state of every car-day (rows) at every step of the day
+            (columns), from step 0 to stepsPerDay - 1, or to stepsPerDay, the
+            first step of the next day, to count the last transition.
+        weekday : bool or numpy.array(bool)
+            True for weekdays, for all the rows or per row.
+
+        Returns
+        -------
+        None
+
+        """
+        states = np.asarray(states, dtype=np.int64)
+        steps = states.shape[1] - 1
+        assert steps <= self.stepsPerDay, "states should have at most " \
+            + "stepsPerDay + 1 columns."
+        weekday = np.broadcast_to(np.asarray(weekday, dtype=np.int64),
+                                  (states.shape[0],))
+        S = self.numberOfStates
+        index = ((weekday.reshape(-1, 1) * self.stepsPerDay
+                  + np.arange(steps)) * S + states[:, :-1]) * S + states[:, 1:]
+        self.counts += np.bincount(index.ravel(),
+                                   minlength=self.counts.size).reshape(
+                                       self.counts.shape)
+
+    def add_trips(self,
+                  personDay,
+                  weekday,
+                  fromState,
+                  toState,
+                  departure,
+                  distance = None):
+        """Counts the transitions of trip logs.
+
+        The trips of every car-day give its states over the day: the car is
+        in the state of departure of its first trip until then, and in the
+        state of arrival of every trip from the step after its departure.
+        The changes of state are counted at the departures, and the stays
+        from the number of car-days in every state at every step, so the cost
+        is O(trips + states * steps), without an array of the states of every
+        car-day. All the trips of a car-day have to be in the same chunk.
+        Car-days without any trip are not in trip logs, add them with
+        add_states() so the probabilities of staying are not underestimated.
+
+        Parameters
+        ----------
+        personDay : numpy.array(int)
+            The car-day, e.g., person and date, of every trip.
+        weekday : numpy.array(bool)
+            True if the trip is on a weekday.
+        fromState : numpy.array(int)
+            The state of departure of every trip.
+        toState : numpy.array(int)
+            The state of arrival of every trip.
+        departure : numpy.array(int)
+            The step of the day of the departure of every trip.
+        distance : numpy.array(float), optional
+            The distance of every trip, appended to the distance file of its
+            day type and states. (the default is None, no distances)
+
+        Returns
+        -------
+        None
+
+        """
+        personDay = np.asarray(personDay)
+        departure = np.asarray(departure, dtype=np.int64)
+        order = np.lexsort((departure, personDay))
+        days, first, row = np.unique(personDay[order], return_index=True,
+                                     return_inverse=True)
+        row = row.ravel()
+        fromState = np.asarray(fromState, dtype=np.int64)[order]
+        toState = np.asarray(toState, dtype=np.int64)[order]
+        departure = departure[order]
+        weekday = np.asarray(weekday, dtype=bool)[order]
+        assert np.all((departure >= 0) & (departure < self.stepsPerDay)), \
+            "departure should be a step of the day."
+        S, P = self.numberOfStates, self.stepsPerDay
+        numberOfTrips = order.shape[0]
+
+        # The state of a car-day changes after the last of its trips leaving
+        # at a step, from the state before, the state of arrival of the
+        # previous change or the state of departure of its first trip.
+        newRow = np.ones(numberOfTrips, dtype=bool)
+        newRow[1:] = row[1:] != row[:-1]
+        last = np.ones(numberOfTrips, dtype=bool)
+        last[:-1] = newRow[1:] | (departure[1:] != departure[:-1])
+        changeRow = row[last]
+        changeStep = departure[last]
+        after = toState[last]
+        firstChange = np.ones(changeRow.shape[0], dtype=bool)
+        firstChange[1:] = changeRow[1:] != changeRow[:-1]
+        initial = fromState[first]
+        before = np.where(firstChange, initial[changeRow],
+                          np.concatenate(([0], after[:-1])))
+        rowDay = weekday[first].astype(np.int64)
+        changeDay = rowDay[changeRow]
+        leaving = (changeDay * P + changeStep) * S + before
+        self.counts += np.bincount(leaving * S + after,
+                                   minlength=self.counts.size).reshape(
+                                       self.counts.shape)
+
+        # The number of car-days in every state at every step, from +1 and -1
+        # at the steps where they enter and leave it. The car-days which do
+        # not change state at a step stay in it.
+        lastChange = np.concatenate((~firstChange[1:], [False]))
+        state = np.concatenate((initial, after))
+        enter = np.concatenate((np.zeros(days.shape[0], dtype=np.int64),
+                                changeStep + 1))
+        leave = np.concatenate((changeStep[firstChange] + 1,
+                                np.where(lastChange,
+                                         np.roll(changeStep, -1) + 1, P)))
+        stateDay = np.concatenate((rowDay, changeDay)) * S + state
+        size = 2 * S * (P + 1)
+        change = np.bincount(stateDay * (P + 1) + enter, minlength=size) \
+            - np.bincount(stateDay * (P + 1) + leave, minlength=size)
+        occupancy = np.cumsum(change.reshape(2, S, P + 1), axis=2)[:, :, :P]
+        stays = np.moveaxis(occupancy, 1, 2) - np.bincount(
+            leaving, minlength=2 * P * S).reshape(2, P, S)
+        diagonal = np.arange(S)
+        self.counts[:, :, diagonal, diagonal] += stays
+
+        if distance is not None:
+            distance = np.asarray(distance, dtype=float)[order]
+            self.add_distances(weekday, fromState, toState, distance)
+
+    def add_distances(self, weekday, fromState, toState, distance):
+        """Appends trip distances to the files of their day type and states,
+        e.g., Weekdaydistance01.txt. Trips within a state are skipped."""
+        S = self.numberOfStates
+        # extractDistances() reads the states as the two digits of the name.
+        assert S <= 10, "distance files need at most 10 states."
+        key = (np.asarray(weekday, dtype=np.int64) * S + fromState) * S \
+            + toState
+        valid = (fromState != toState) & ~np.isnan(distance)
+        order = np.argsort(key[valid], kind='stable')
+        keys, starts = np.unique(key[valid][order], return_index=True)
+        groups = np.split(distance[valid][order], starts[1:])
+        for k, values in zip(keys.tolist(), groups):
+            isWeekday, pair = bool(k // (S * S)), k % (S * S)
+            name = os.path.join(self.directory, DISTANCE_PREFIX[isWeekday]
+                                + "distance" + str(pair // S)
+                                + str(pair % S) + ".txt")
+            # Overwrite the files of a previous estimate, then append.
+            with open(name, 'a' if name in self.distanceFiles else 'w') as ff:
+                np.savetxt(ff, values, fmt='%16.7e', delimiter='')
+            self.distanceFiles.add(name)
+
+    def matrices(self, weekday, smoothing = 0, prior = 0.0):
+        """Returns the estimated transition matrices of a day type.
+
+        Parameters
+        ----------
+        weekday : bool
+            True for weekdays.
+        smoothing : int, optional
+            The transitions are counted over a window of 2 * smoothing + 1
+            steps around every step, wrapping around midnight. (the default
+            is 0, no smoothing)
+        prior : float, optional
+            A count added to every transition of the rows with observations.
+            (the default is 0.0)
+
+        Returns
+        -------
+        numpy.array(float)
+            The matrices, of shape (numberOfStates, numberOfStates,
+            stepsPerDay) like readMatrixfiles(). Rows without any
+            observation stay in their state.
+
+        """
+        counts = self.counts[int(bool(weekday))].astype(float)
+        if smoothing > 0:
+            width = 2 * smoothing + 1
+            padded = np.concatenate((counts[-smoothing:], counts,
+                                     counts[:smoothing]))
+            cumulative = np.concatenate((np.zeros((1,) + counts.shape[1:]),
+                                         np.cumsum(padded, axis=0)))
+            counts = cumulative[width:] - cumulative[:-width]
+        rowSums = counts.sum(axis=2, keepdims=True)
+        observed = rowSums > 0
+        counts = counts + prior * observed
+        rowSums = counts.sum(axis=2, keepdims=True)
+        identity = np.broadcast_to(np.eye(self.numberOfStates), counts.shape)
+        probabilities = np.where(observed, counts / np.where(observed, rowSums,
+                                                             1.0), identity)
+        return(np.moveaxis(probabilities, 0, 2))
+
+    def markov(self, weekday, smoothing = 0, prior = 0.0):
+        """Returns the estimated Markov chain of a day type, see matrices()."""
+        return(Markov(self.matrices(weekday, smoothing, prior)))
+
+    def write(self, smoothing = 0, prior = 0.0):
+        """Writes the matrices of both day types to the directory.
+
+        The files are named like in TransitionMatrix, e.g.,
+        tranistionMatrixweekday0001.txt for the first step of weekdays, and
+        read with readMatrixfiles(os.path.join(directory, "*weekday*.txt")).
+
+        Returns
+        -------
+        None
+
+        """
+        for isWeekday, dayType in DAY_TYPES.items():
+            matrices = self.matrices(isWeekday, smoothing, prior)
+            for step in range(self.stepsPerDay):
+                name = os.path.join(self.directory, "tranistionMatrix"
+                                    + dayType + "%04d" % (step + 1) + ".txt")
+                np.savetxt(name, matrices[:, :, step], fmt='%16.7e',
+                           delimiter='')
+
+
+def estimate_from_csv(fileName,
+                      directory,
+                      numberOfStates = 3,
+                      stepsPerDay = 1440,
+                      chunkSize = 1000000,
+                      smoothing = 0,
+                      prior = 0.0,
+                      columns = TRIP_COLUMNS):
+    """Estimates and writes transition matrices and distances from a trip log.
+
+    The log is read with pandas in chunks of chunkSize rows. It has to be
+    sorted by car-day, and the trips of the last car-day of a chunk are
+    carried over to the next chunk.
+
+    Parameters
+    ----------
+    fileName : str
+        The CSV file of the trips.
+    directory : str
+        The directory of the output files.
+    numberOfStates : int, optional
+        The number of states. (the default is 3)
+    stepsPerDay : int, optional
+        The number of timesteps of a day. (the default is 1440)
+    chunkSize : int, optional
+        The number of rows read at once. (the default is 1000000)
+    smoothing : int, optional
+        The half width of the smoothing window, see
+        TransitionEstimator.matrices(). (the default is 0)
+    prior : float, optional
+        The count added to every observed transition. (the default is 0.0)
+    columns : tuple(str), optional
+        The names of the car-day, weekday, departure state, arrival state,
+        departure step and distance columns. (the default is TRIP_COLUMNS)
+
+    Returns
+    -------
+    TransitionEstimator
+        The estimator, with the counts of the whole log.
+
+    """
+    import pandas as pd
+
+    estimator = TransitionEstimator(directory, numberOfStates, stepsPerDay)
+    carried = None
+    for chunk in pd.read_csv(fileName, usecols=list(columns),
+                             chunksize=chunkSize):
+        chunk = chunk[list(columns)]
+        if carried is not None:
+            chunk = pd.concat((carried, chunk))
+        personDay = chunk[columns[0]].to_numpy()
+        assert np.all(personDay[1:] >= personDay[:-1]), "the log should be " \
+            + "sorted by car-day."
+        last = personDay[-1]
+        complete = personDay != last
+        carried = chunk[~complete]
+        if complete.any():
+            estimator.add_trips(*[chunk[c].to_numpy()[complete]
+                                  for c in columns])
+    if carried is not None and carried.shape[0]:
+        estimator.add_trips(*[carried[c].to_numpy() for c in columns])
+    estimator.write(smoothing, prior)
+    return(estimator)
+
+
+if __name__ == "__main__":
+    """Estimates transition matrices and trip distances from a trip log.
+
+    Example
+    -------
+        $ python3 transitionestimator.py ./trips.csv ./TransitionMatrix 3 5
+    """
+    import sys
+    fileName = sys.argv[1]
+    directory = sys.argv[2]
+    numberOfStates = int(sys.argv[3])
+    smoothing = int(sys.argv[4])
+    estimate_from_csv(fileName, directory, numberOfStates,
+                      smoothing = smoothing)
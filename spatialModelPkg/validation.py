@@ -0,0 +1,272 @@
+import math
+import numpy as np
+
+# The fewest replicates of the reference accepted by the comparisons.
+MINIMUM_REPLICATES = 10
+
+def normal_sf(z):
+    """The survival function of the standard normal distribution."""
+    return(0.5 * math.erfc(z / math.sqrt(2)))
+
+def kolmogorov_sf(x):
+    """The survival function of the Kolmogorov distribution."""
+    if x < 0.2:
+        return(1.0)
+    k = np.arange(1, 101)
+    return(float(min(1.0, max(0.0, 2 * np.sum((-1.0) ** (k - 1)
+                                              * np.exp(-2 * k**2 * x**2))))))
+
+def ks_2samp(sample1, sample2):
+    """Two-sample Kolmogorov-Smirnov test.
+
+    Parameters
+    ----------
+    sample1 : numpy.array(float)
+        The first sample.
+    sample2 : numpy.array(float)
+        The second sample.
+
+    Returns
+    -------
+    (float, float)
+        The statistic D, the largest distance between the two empirical
+        distribution functions, and its asymptotic p-value.
+
+    """
+    sample1 = np.sort(np.asarray(sample1, dtype=float).ravel())
+    sample2 = np.sort(np.asarray(sample2, dtype=float).ravel())
+    n1, n2 = sample1.shape[0], sample2.shape[0]
+    values = np.concatenate((sample1, sample2))
+    cdf1 = np.searchsorted(sample1, values, side='right') / n1
+    cdf2 = np.searchsorted(sample2, values, side='right') / n2
+    D = float(np.max(np.abs(cdf1 - cdf2)))
+    effectiveN = math.sqrt(n1 * n2 / (n1 + n2))
+    return(D, kolmogorov_sf((effectiveN + 0.12 + 0.11 / effectiveN) * D))
+
+def welch_test(sample1, sample2):
+    """Welch's test of equal means, with a normal approximation.
+
+    If sample2 holds a single value, e.g., from a deterministic model, the
+    mean of sample1 is tested against it. The normal approximation of the t
+    distribution is fine from about 20 replicates per sample.
+
+    Parameters
+    ----------
+    sample1 : numpy.array(float)
+        The first sample.
+    sample2 : numpy.array(float)
+        The second sample.
+
+    Returns
+    -------
+    (float, float)
+        The statistic and its two-sided p-value.
+
+    """
+    sample1 = np.asarray(sample1, dtype=float).ravel()
+    sample2 = np.asarray(sample2, dtype=float).ravel()
+    variance = np.var(sample1, ddof=1) / sample1.shape[0]
+    if sample2.shape[0] > 1:
+        variance += np.var(sample2, ddof=1) / sample2.shape[0]
+    difference = np.mean(sample1) - np.mean(sample2)
+    if variance == 0:
+        return(0.0 if difference == 0 else math.inf,
+               1.0 if difference == 0 else 0.0)
+    z = float(difference / math.sqrt(variance))
+    return(z, 2 * normal_sf(abs(z)))
+
+def compare_samples(reference,
+                    candidate,
+                    alpha = 0.01,
+                    tolerance = 0.05,
+                    minimumReplicates = MINIMUM_REPLICATES,
+                    noiseFactor = 3.0,
+                    paired = False):
+    """Compares a metric of a candidate engine with the reference.
+
+    Without paired, the replicates of the candidate should use other seeds
+    than those of the reference, so that the samples are independent as the
+    tests assume. With paired, the candidate is evaluated on the same
+    scenarios as the reference, e.g., a deterministic model on the station
+    layout of every seed, and the tests are on the differences of the pairs.
+
+    The accepted difference is the largest of tolerance and noiseFactor
+    times the standard error of the difference, so that the sampling noise
+    of few replicates does not fail an unbiased engine. More replicates are
+    needed to show equivalence within tolerance.
+
+    Parameters
+    ----------
+    reference : numpy.array(float)
+        The metric of the reference, one value per replicate.
+    candidate : numpy.array(float)
+        The metric of the candidate, one value per replicate.
+    alpha : float, optional
+        The significance level of the tests. (the default is 0.01)
+    tolerance : float, optional
+        The accepted relative difference of the means. (the default is 0.05)
+    minimumReplicates : int, optional
+        The fewest replicates of the reference, and of a stochastic
+        candidate. (the default is MINIMUM_REPLICATES)
+    noiseFactor : float, optional
+        The accepted difference in standard errors. (the default is 3.0)
+    paired : bool, optional
+        If True, candidate[i] and reference[i] are of the same scenario.
+        (the default is False)
+
+    Returns
+    -------
+    dict
+        The means, the relative difference, the relative standard error of
+        the difference (noise), the p-values of Welch's (or the paired) test
+        and of the Kolmogorov-Smirnov test (NaN if paired), significant: True
+        if a test rejects the equality at alpha, e.g., a bias of a faster
+        approximation, and passed: True if the relative difference is within
+        the accepted difference and is not significant.
+
+    """
+    reference = np.asarray(reference, dtype=float).ravel()
+    candidate = np.asarray(candidate, dtype=float).ravel()
+    assert reference.shape[0] >= minimumReplicates and \
+        (candidate.shape[0] == 1 or candidate.shape[0] >= minimumReplicates), \
+        "compare at least {} replicates.".format(minimumReplicates)
+    assert not paired or candidate.shape == reference.shape, "paired " \
+        + "samples should have the same replicates."
+    meanReference = float(np.mean(reference))
+    meanCandidate = float(np.mean(candidate))
+    scale = max(abs(meanReference), 1e-12)
+    relative = abs(meanCandidate - meanReference) / scale
+    if paired:
+        differences = candidate - reference
+        standardError = math.sqrt(np.var(differences, ddof=1)
+                                  / differences.shape[0])
+        welchP = welch_test(differences, [0.0])[1]
+        ksP = math.nan
+    else:
+        variance = np.var(reference, ddof=1) / reference.shape[0]
+        if candidate.shape[0] > 1:
+            variance += np.var(candidate, ddof=1) / candidate.shape[0]
+        standardError = math.sqrt(variance)
+        welchP = welch_test(reference, candidate)[1]
+        ksP = ks_2samp(reference, candidate)[1] if candidate.shape[0] > 1 \
+            else math.nan
+    noise = standardError / scale
+    significant = bool(welchP < alpha or ksP < alpha)
+    return({"reference": meanReference,
+            "candidate": meanCandidate,
+            "relativeDifference": relative,
+            "noise": noise,
+            "welchP": welchP,
+            "ksP": ksP,
+            "significant": significant,
+            "passed": bool(relative <= max(tolerance, noiseFactor * noise)
+                           and not significant)})
+
+def compare_profiles(reference,
+                     candidate,
+                     alpha = 0.01,
+                     tolerance = 0.05,
+                     minimumReplicates = MINIMUM_REPLICATES,
+                     noiseFactor = 3.0,
+                     paired = False):
+    """Compares a profile, e.g., the hourly load, of a candidate engine with
+    the reference.
+
+    Like in compare_samples(), the candidate should use other seeds than the
+    reference, or be paired with it, and the accepted difference grows with
+    the sampling noise.
+
+    Parameters
+    ----------
+    reference : numpy.array(float)
+        The profiles of the reference, of shape (replicates, points).
+    candidate : numpy.array(float)
+        The profiles of the candidate, of shape (replicates, points).
+    alpha : float, optional
+        The significance level of the tests, corrected for the number of
+        points with Bonferroni's method. (the default is 0.01)
+    tolerance : float, optional
+        The accepted normalized root-mean-square difference of the mean
+        profiles. (the default is 0.05)
+    minimumReplicates : int, optional
+        The fewest replicates of the reference, and of a stochastic
+        candidate. (the default is MINIMUM_REPLICATES)
+    noiseFactor : float, optional
+        The accepted difference in multiples of the noise. (the default is
+        3.0)
+    paired : bool, optional
+        If True, candidate[i] and reference[i] are of the same scenario.
+        (the default is False)
+
+    Returns
+    -------
+    dict
+        The normalized RMS difference of the mean profiles, the normalized RMS
+        difference expected from the sampling noise of the replicates alone,
+        the fraction of points where the means differ significantly, and
+        passed: True if the difference is within the largest of tolerance
+        and noiseFactor times the noise, and no point differs significantly.
+
+    """
+    reference = np.asarray(reference, dtype=float)
+    candidate = np.asarray(candidate, dtype=float)
+    assert reference.shape[0] >= minimumReplicates and \
+        (candidate.shape[0] == 1 or candidate.shape[0] >= minimumReplicates), \
+        "compare at least {} replicates.".format(minimumReplicates)
+    assert not paired or candidate.shape == reference.shape, "paired " \
+        + "profiles should have the same replicates."
+    meanReference = reference.mean(0)
+    meanCandidate = candidate.mean(0)
+    scale = max(float(np.abs(meanReference).mean()), 1e-12)
+    rms = float(np.sqrt(np.mean((meanCandidate - meanReference)**2))) / scale
+    points = reference.shape[1]
+    if paired:
+        differences = candidate - reference
+        standardError = differences.var(0, ddof=1) / differences.shape[0]
+        pValues = np.array([welch_test(differences[:, i], [0.0])[1]
+                            for i in range(points)])
+    else:
+        standardError = reference.var(0, ddof=1) / reference.shape[0]
+        if candidate.shape[0] > 1:
+            standardError += candidate.var(0, ddof=1) / candidate.shape[0]
+        pValues = np.array([welch_test(reference[:, i], candidate[:, i])[1]
+                            for i in range(points)])
+    noise = float(np.sqrt(np.mean(standardError))) / scale
+    significant = float(np.mean(pValues < alpha / points))
+    return({"normalizedRMS": rms,
+            "noiseRMS": noise,
+            "significantPoints": significant,
+            "passed": bool(rms <= max(tolerance, noiseFactor * noise)
+                           and significant == 0)})
+
+def compare_exact(reference, candidate, rtol = 1e-9, atol = 1e-9):
+    """Compares a metric of a candidate engine which should give the same
+    results as the reference on the same seeds, e.g., the same computation
+    vectorized.
+
+    Parameters
+    ----------
+    reference : numpy.array(float)
+        The metric or profiles of the reference, one row per seed.
+    candidate : numpy.array(float)
+        The metric or profiles of the candidate, on the same seeds.
+    rtol : float, optional
+        The relative tolerance of numpy.allclose(). (the default is 1e-9)
+    atol : float, optional
+        The absolute tolerance of numpy.allclose(). (the default is 1e-9)
+
+    Returns
+    -------
+    dict
+        The largest absolute difference, and passed: True if all the values
+        agree within the tolerances.
+
+    """
+    reference = np.asarray(reference, dtype=float)
+    candidate = np.asarray(candidate, dtype=float)
+    assert reference.shape == candidate.shape, "run the candidate on the " \
+        + "seeds of the reference."
+    return({"maximumDifference": float(np.max(np.abs(candidate - reference)))
+            if reference.size else 0.0,
+            "passed": bool(np.allclose(candidate, reference, rtol=rtol,
+                                       atol=atol))})
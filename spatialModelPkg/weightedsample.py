@@ -0,0 +1,252 @@
+import copy
+import math
+from collections import OrderedDict
+
+import numpy as np
+
+from fleet import Fleet
+
+
+def stratum_index(*columns):
+    """Numbers the strata given by combinations of car attributes.
+
+    Parameters
+    ----------
+    *columns : numpy.array
+        One value per car for every attribute, e.g., the initial state, the
+        vehicle class and the home area.
+
+    Returns
+    -------
+    (numpy.array(int), int)
+        The stratum of every car and the number of strata.
+
+    """
+    keys = np.stack([np.unique(np.asarray(c), return_inverse=True)[1].ravel()
+                     for c in columns], axis=1)
+    unique, strata = np.unique(keys, axis=0, return_inverse=True)
+    return(strata.ravel(), unique.shape[0])
+
+
+class WeightedSample:
+    """A stratified sample of the cars of a large fleet.
+
+    Every stratum of the population is sampled without replacement with a
+    share of its cars equal to sampleSize divided by the number of cars, and
+    at least minimumPerStratum cars, or all of them in small strata. Every
+    sampled car carries the weight N_h / n_h of its stratum, the number of
+    population cars it stands for. Running a Simulation with the sampled
+    cars, the scaled stations and carWeights then estimates the load of the
+    whole fleet at the cost of the sample, and the StratifiedLoadEstimator
+    gives the variance of the estimate. A larger sample makes it more
+    accurate.
+
+    Attributes
+    ----------
+    strata : numpy.array(int)
+        The stratum of every car of the population, see stratum_index().
+    sampleSize : int
+        The targeted number of sampled cars.
+    minimumPerStratum : int, optional
+        The minimum number of sampled cars per stratum, two to estimate the
+        variance of every stratum. (the default is 2)
+    rng : numpy.random.Generator, optional
+        The generator drawing the sample. (the default is None, a generator
+        seeded from the operating system)
+    sampleIndex : numpy.array(int)
+        The index of the sampled cars in the population, sorted.
+    weights : numpy.array(float)
+        The weight of every sampled car.
+    populationCounts : numpy.array(int)
+        The number of cars of every stratum in the population.
+    sampleCounts : numpy.array(int)
+        The number of sampled cars of every stratum.
+    """
+
+    def __init__(self,
+                 strata,
+                 sampleSize,
+                 minimumPerStratum = 2,
+                 rng = None):
+        self.strata = np.asarray(strata, dtype=int)
+        rng = np.random.default_rng() if rng is None else rng
+        self.populationCounts = np.bincount(self.strata)
+        fraction = min(sampleSize / max(self.strata.shape[0], 1), 1.0)
+        self.sampleCounts = np.minimum(
+            np.maximum(np.round(self.populationCounts * fraction).astype(int),
+                       minimumPerStratum),
+            self.populationCounts)
+
+        # Shuffle the cars and take the first ones of every stratum.
+        order = rng.permutation(self.strata.shape[0])
+        order = order[np.argsort(self.strata[order], kind='stable')]
+        starts = np.cumsum(self.populationCounts) - self.populationCounts
+        rank = np.arange(order.shape[0]) - np.repeat(starts,
+                                                     self.populationCounts)
+        chosen = order[rank < np.repeat(self.sampleCounts,
+                                        self.populationCounts)]
+        self.sampleIndex = np.sort(chosen)
+        sampleStrata = self.strata[self.sampleIndex]
+        self.weights = (self.populationCounts[sampleStrata]
+                        / self.sampleCounts[sampleStrata])
+        self.sampleSize = self.sampleIndex.shape[0]
+
+    def sample_strata(self):
+        """Returns the stratum of every sampled car."""
+        return(self.strata[self.sampleIndex])
+
+    def sample_cars(self, cars):
+        """Returns the sampled cars of a list of the population cars."""
+        return([cars[i] for i in self.sampleIndex.tolist()])
+
+    def sample_fleet(self, fleet):
+        """Returns the Fleet of the sampled cars of a population Fleet."""
+        return(Fleet(vehicleClass = fleet.vehicleClass[self.sampleIndex],
+                     mpg = fleet.mpg,
+                     batteryCapacity = fleet.batteryCapacity,
+                     maxPower = fleet.maxPower,
+                     taperStart = fleet.taperStart,
+                     taperPower = fleet.taperPower,
+                     batteryCharge = fleet.batteryCharge[self.sampleIndex]))
+
+    def scale_stations(self, stations, sampleCars):
+        """Copies the stations with capacities scaled to the sample.
+
+        The number of places of every parking lot is multiplied by the
+        sampled share of the cars parked in it, the number of sampled cars
+        divided by the sum of their weights, and rounded up, so the sampled
+        cars find free places as often as the population, and the occupancy
+        is the number of sampled cars parked in the lot. Lots without
+        sampled cars are scaled by the sampled share of the fleet.
+
+        Parameters
+        ----------
+        stations : OrderedDict(ParkingLot)
+            The stations of the population, left unchanged.
+        sampleCars : list(EV)
+            The sampled cars, placed in the stations, in the order of
+            sample_cars().
+
+        Returns
+        -------
+        OrderedDict(ParkingLot)
+            The scaled stations.
+
+        """
+        assert len(sampleCars) == self.sampleSize, "sampleCars should be " \
+            + "the sampled cars."
+        fraction = self.sampleSize / max(self.strata.shape[0], 1)
+        occupancy = {}
+        represented = {}
+        for x, w in zip(sampleCars, self.weights.tolist()):
+            occupancy[x.currentLocation] = occupancy.get(x.currentLocation,
+                                                         0) + 1
+            represented[x.currentLocation] = represented.get(
+                x.currentLocation, 0.0) + w
+        scaled = OrderedDict()
+        for k, v in stations.items():
+            lot = copy.copy(v)
+            lot.currentOccupancy = occupancy.get(k, 0)
+            share = lot.currentOccupancy / represented[k] if \
+                lot.currentOccupancy else fraction
+            lot.maximumOccupancy = max(math.ceil(v.maximumOccupancy * share),
+                                       lot.currentOccupancy)
+            scaled[k] = lot
+        return(scaled)
+
+
+class StratifiedLoadEstimator:
+    """Estimates the population load and its variance from a weighted sample.
+
+    Add it to the observers of a Simulation run with the cars and the weights
+    of a WeightedSample. Every timestep, the load of every group of charging
+    stations (e.g., areas, or the whole city) is estimated by the weighted
+    sum of the power of the sampled cars, and its variance by the stratified
+    sampling formula
+
+        sum over strata h of N_h^2 s_h^2 / n_h
+
+    where s_h^2 is the sample variance of the power drawn in the group by the
+    sampled cars of the stratum, counting the cars charging elsewhere as
+    zero. The trips of the sampled cars are drawn anew, not taken from a run
+    of the population, so there is no finite population correction and the
+    estimate is of the expected load of the fleet. Strata with a single
+    sampled car, or none, are not counted in the variance.
+
+    Attributes
+    ----------
+    sample : WeightedSample
+        The sample of the simulated cars.
+    groupOfStation : numpy.array(int), optional
+        The group of every charging station, in the order of the columns of
+        the load. (the default is None, one group of all the stations)
+    estimate : numpy.array(float)
+        The estimated load of every group at every timestep, of shape
+        (timesteps, groups).
+    variance : numpy.array(float)
+        The variance of the estimates, of the same shape.
+    """
+
+    def __init__(self, sample, groupOfStation = None):
+        self.sample = sample
+        self.groupOfStation = None if groupOfStation is None else \
+            np.asarray(groupOfStation, dtype=int)
+
+    def start(self, simulation):
+        assert simulation.numCars == self.sample.sampleSize, "simulate the " \
+            + "sampled cars."
+        numberOfColumns = int(simulation.stationCharging.sum())
+        groupOfStation = np.zeros(numberOfColumns, dtype=int) if \
+            self.groupOfStation is None else self.groupOfStation
+        assert groupOfStation.shape[0] == numberOfColumns, "groupOfStation " \
+            + "should have one group per charging station."
+        self.numberOfGroups = int(groupOfStation.max()) + 1 if \
+            numberOfColumns else 1
+        # The group of every station, -1 for stations without charging.
+        self.stationGroup = np.full(simulation.stationCharging.shape[0], -1)
+        self.stationGroup[simulation.stationCharging] = groupOfStation
+        self.carStrata = self.sample.sample_strata()
+        numberOfSteps = simulation.timeSteps.shape[0]
+        self.estimate = np.zeros((numberOfSteps, self.numberOfGroups))
+        self.variance = np.zeros((numberOfSteps, self.numberOfGroups))
+
+        populationCounts = self.sample.populationCounts.astype(float)
+        sampleCounts = self.sample.sampleCounts.astype(float)
+        usable = sampleCounts > 1
+        # The factor of s_h^2 in the variance of every stratum.
+        self.stratumFactor = np.zeros(populationCounts.shape[0])
+        self.stratumFactor[usable] = (populationCounts[usable] ** 2
+                                      / sampleCounts[usable])
+
+    def update(self, simulation, step, time, load):
+        group = self.stationGroup[simulation.car_station_index()]
+        charging = np.nonzero((simulation.carPower > 0) & (group >= 0))[0]
+        power = simulation.carPower[charging]
+        numberOfStrata = self.stratumFactor.shape[0]
+        cell = self.carStrata[charging] * self.numberOfGroups + group[charging]
+        size = numberOfStrata * self.numberOfGroups
+        total = np.bincount(cell, weights=power, minlength=size).reshape(
+            numberOfStrata, self.numberOfGroups)
+        squares = np.bincount(cell, weights=power ** 2, minlength=size).reshape(
+            numberOfStrata, self.numberOfGroups)
+
+        sampleCounts = self.sample.sampleCounts.reshape(-1, 1).astype(float)
+        # Strata without cars have no sums, and a factor of zero.
+        stratumVariance = (squares - total ** 2
+                           / np.maximum(sampleCounts, 1.0)) \
+            / np.maximum(sampleCounts - 1.0, 1.0)
+        self.estimate[step] = np.bincount(
+            group[charging], weights=power * self.sample.weights[charging],
+            minlength=self.numberOfGroups)
+        self.variance[step] = self.stratumFactor @ np.maximum(stratumVariance,
+                                                              0.0)
+
+    def standard_error(self):
+        """Returns the standard error of the estimates."""
+        return(np.sqrt(self.variance))
+
+    def confidence_interval(self, z = 1.96):
+        """Returns the lower and upper bounds of the estimates, by default
+        for a confidence of 95%."""
+        error = z * self.standard_error()
+        return(self.estimate - error, self.estimate + error)
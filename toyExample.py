@@ -5,12 +5,8 @@ rnd.seed(10) # for reproducibility
 from collections import OrderedDict
 
 import pandas as pd
-from pandas.plotting import register_matplotlib_converters
-register_matplotlib_converters()
 import numpy as np
 np.random.seed(1) # for reproducibility
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
 
 from spatialModelPkg.ev import EV
 from spatialModelPkg.markov import Markov
@@ -99,18 +95,30 @@ def main(numberOfEVs, numberOfparkingloc):
     print("Average distance traveled per car per day (km/day/car):",
           np.mean(np.asarray([x.distance  for x in EVs]))/numberOfDays)
 
+    plot_load(minutes, load)
+
+
+def plot_load(minutes, load):
+    # matplotlib is only needed for the figure, import it after the simulation
+    # so that it does not slow down the start of the run.
+    from pandas.plotting import register_matplotlib_converters
+    register_matplotlib_converters()
+    import matplotlib.pyplot as plt
+    from spatialModelPkg.auxiliary import decimate_min_max
+
+    totalLoad = np.sum(load,1)
+    # Keep the minimum and maximum of every bucket of samples, long runs
+    # plot fast and keep their peaks.
+    selected = decimate_min_max(totalLoad)
     fig = plt.figure(figsize = (10,10))
-    plt.plot(minutes, np.sum(load,1))
+    plt.plot(minutes[selected], totalLoad[selected])
     plt.xticks(rotation = 'vertical')
-    # xfrmt = mdates.DateFormatter('%d %H:%M')
-    # plt.gca().xaxis.set_major_formatter(xfrmt)
     plt.xlabel("Date")
     plt.ylabel("Power (kWh/h)")
     plt.rcParams.update({'font.size': 35})
     fig.savefig("resultLoad.pdf")
 
 
-
 if __name__ == "__main__":
 
         numberOfEVs = 1000